@@ -1,20 +1,28 @@
 import os
 import re
+import json
+import shutil
 import zipfile
 import sys
-import requests
-import urllib.request
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
+import subprocess
+import tempfile
 from logzero import logger
 import common
 
+# requests・Selenium などの重いモジュールは、更新が必要な場合のみ使用する関数内で読み込む
+
 # --- 定数 ---
 CHROMEDRIVER_PATH = 'chromedriver.exe'
-DOWNLOAD_ZIP_PATH = 'download_webdriver.zip'
 EXTRACT_DRIVER_PATH = 'chromedriver-win32/chromedriver.exe'
+PLATFORM = 'win32'
+VERSION_CACHE_PATH = 'webdriver_version_cache.json'
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+VERSION_PATTERN = re.compile(r'\d+\.\d+\.\d+\.\d+')
+CHROME_REGISTRY_KEYS = [
+    r'Software\Google\Chrome\BLBeacon',
+    r'Software\Wow6432Node\Google\Chrome\BLBeacon',
+]
+CHROME_BINARIES = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser']
 
 
 def check_webdriver_launch(chromedriver_path=CHROMEDRIVER_PATH):
@@ -27,6 +35,10 @@ def check_webdriver_launch(chromedriver_path=CHROMEDRIVER_PATH):
     Returns:
         bool or Exception: 起動成功時はTrue、失敗時は発生した例外オブジェクト。
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
+
     service = Service(executable_path=chromedriver_path)
     try:
         driver = webdriver.Chrome(service=service)
@@ -38,127 +50,367 @@ def check_webdriver_launch(chromedriver_path=CHROMEDRIVER_PATH):
         return e
 
 
-def get_latest_webdriver_version(latest_version_url):
+def get_chromedriver_version(chromedriver_path=CHROMEDRIVER_PATH):
+    """
+    インストール済みのWebDriverのバージョンを、WebDriver自身の --version 出力から取得します。
+
+    Args:
+        chromedriver_path (str, optional): WebDriverのパス。
+
+    Returns:
+        str or None: バージョン番号。取得できない場合はNone。
+    """
+    try:
+        result = subprocess.run([chromedriver_path, '--version'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = VERSION_PATTERN.search(result.stdout)
+    return match.group() if match else None
+
+
+def get_registry_chrome_version():
+    """
+    Windowsのレジストリから、インストール済みのChromeブラウザのバージョンを取得します。
+
+    Returns:
+        str or None: バージョン番号。Windows以外の環境や取得できない場合はNone。
+    """
+    try:
+        import winreg
+    except ImportError:
+        return None
+
+    for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+        for key_path in CHROME_REGISTRY_KEYS:
+            try:
+                with winreg.OpenKey(root, key_path) as key:
+                    return winreg.QueryValueEx(key, 'version')[0]
+            except OSError:
+                continue
+    return None
+
+
+def find_chrome_binary():
+    """
+    Windows以外の環境で、PATHからChromeブラウザの実行ファイルを探します。
+
+    Returns:
+        str or None: 実行ファイルのパス。見つからない場合はNone。
+    """
+    for binary in CHROME_BINARIES:
+        path = shutil.which(binary)
+        if path:
+            return os.path.realpath(path)
+    return None
+
+
+def get_chrome_version():
+    """
+    インストール済みのChromeブラウザのバージョンを取得します。
+    Windowsではレジストリから、それ以外の環境ではChromeの --version 出力から取得します。
+
+    Returns:
+        str or None: バージョン番号。取得できない場合はNone。
+    """
+    if sys.platform == 'win32':
+        return get_registry_chrome_version()
+
+    binary = find_chrome_binary()
+    if binary is None:
+        return None
+    try:
+        result = subprocess.run([binary, '--version'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = VERSION_PATTERN.search(result.stdout)
+    return match.group() if match else None
+
+
+def get_file_stamp(path):
+    """
+    ファイルが変更されたかを判定するための、パス・更新日時・サイズを返します。
+
+    Args:
+        path (str or None): ファイルのパス
+
+    Returns:
+        list or None: [絶対パス, 更新日時 (ns), サイズ]。ファイルがない場合はNone。
+    """
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def get_version_cache_key(chromedriver_path=CHROMEDRIVER_PATH):
+    """
+    バージョン確認のキャッシュキーを、サブプロセスを起動せずに求めます。
+    WebDriverは実行ファイルのパス・更新日時・サイズ、ChromeはWindowsではレジストリのバージョン、
+    それ以外の環境では実行ファイルのパス・更新日時・サイズを使用します。
+
+    Args:
+        chromedriver_path (str, optional): WebDriverのパス。
+
+    Returns:
+        dict or None: キャッシュキー。WebDriverまたはChromeが見つからない場合はNone。
+    """
+    chromedriver = get_file_stamp(chromedriver_path)
+    chrome = get_registry_chrome_version() if sys.platform == 'win32' else get_file_stamp(find_chrome_binary())
+    if chromedriver is None or chrome is None:
+        return None
+    return {'chromedriver': chromedriver, 'chrome': chrome}
+
+
+def major_version(version):
+    """
+    バージョン番号からメジャーバージョンを取り出します。
+
+    Args:
+        version (str or None): バージョン番号
+
+    Returns:
+        str or None: メジャーバージョン
+    """
+    return version.split('.')[0] if version else None
+
+
+def load_version_cache(cache_path=VERSION_CACHE_PATH):
     """
-    最新の安定版WebDriverのバージョン番号を取得します。
+    前回確認済みのバージョンの組み合わせと、確認時のキャッシュキーを読み込みます。
 
     Args:
-        latest_version_url (str): 最新バージョン情報が記載されたURL。
+        cache_path (str, optional): キャッシュファイルのパス。
 
     Returns:
-        str or None: バージョン番号。取得失敗時はNone。
+        dict: キャッシュの内容。存在しない場合は空の辞書。
     """
     try:
-        response = requests.get(latest_version_url)
-        response.raise_for_status()  # HTTPエラーの場合は例外を発生
-        soup = BeautifulSoup(response.content, 'html.parser')
+        with open(cache_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_version_cache(chrome_version, driver_version, cache_key, cache_path=VERSION_CACHE_PATH):
+    """
+    動作確認済みのChromeとWebDriverのバージョンの組み合わせを、確認時のキャッシュキーとともに保存します。
+
+    Args:
+        chrome_version (str): Chromeのバージョン
+        driver_version (str): WebDriverのバージョン
+        cache_key (dict or None): get_version_cache_keyで求めたキャッシュキー (Noneの場合は保存しません)
+        cache_path (str, optional): キャッシュファイルのパス。
+    """
+    if cache_key is None:
+        return
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({'chrome_version': chrome_version, 'driver_version': driver_version, 'key': cache_key}, f)
+
+
+def get_latest_webdriver_version(latest_version_url, chrome_version=None):
+    """
+    バージョン情報のJSONエンドポイントから、ダウンロードするWebDriverのバージョンとURLを取得します。
+    Stable版のメジャーバージョンがChromeと異なる場合は、Chromeと同じバージョンを返します。
+
+    Args:
+        latest_version_url (str): 最新バージョン情報のJSONエンドポイントのURL。
+        chrome_version (str, optional): インストール済みのChromeのバージョン。
+
+    Returns:
+        tuple or None: (バージョン番号, ダウンロードURL or None)。取得失敗時はNone。
+    """
+    import requests
 
-        # "Stable" の文字列が含まれるtd要素からバージョン番号を取得
-        td_element = soup.find(string="Stable").find_next('td')
-        stable_version = td_element.find("code").text
+    try:
+        response = requests.get(latest_version_url, timeout=30)
+        response.raise_for_status()
+        stable = response.json()["channels"]["Stable"]
+        stable_version = stable["version"]
         logger.info(f"Latest stable WebDriver version: {stable_version}")
-        return stable_version
     except requests.exceptions.RequestException as e:
         logger.error(f"Error while fetching latest WebDriver version: {e}")
         return None
-    except AttributeError:
-        logger.error("Could not find the version number. The HTML structure of the page may have changed.")
+    except (KeyError, ValueError):
+        logger.error("Could not find the version number. The format of the version endpoint may have changed.")
         return None
 
+    if chrome_version and major_version(chrome_version) != major_version(stable_version):
+        logger.info(f"Stable version does not match Chrome {chrome_version}. Using the Chrome version instead.")
+        return chrome_version, None
+
+    download_url = next(
+        (d["url"] for d in stable.get("downloads", {}).get("chromedriver", []) if d.get("platform") == PLATFORM),
+        None,
+    )
+    return stable_version, download_url
+
 
-def download_webdriver(version, webdriver_base_url):
+def download_webdriver(version, webdriver_base_url, download_url=None, chromedriver_path=CHROMEDRIVER_PATH):
     """
     指定されたバージョンのWebDriverをダウンロードし、展開します。
+    zipファイルは一定サイズずつ一時ファイルに書き込み、展開したWebDriverは一時ファイルから置き換えます。
 
     Args:
         version (str): ダウンロードするWebDriverのバージョン。
         webdriver_base_url (str): WebDriverのダウンロード元ベースURL。
+        download_url (str, optional): ダウンロードURL。省略時はベースURLとバージョンから組み立てます。
+        chromedriver_path (str, optional): WebDriverの配置先パス。
 
     Returns:
         bool: 成功した場合はTrue、失敗した場合はFalse。
     """
-    # file_url = f"{webdriver_base_url}/{version}/win32/chromedriver-win32.zip"
-    file_url = f"https://edgedl.me.gvt1.com/edgedl/chrome/chrome-for-testing/{version}/win32/chromedriver-win32.zip"
+    import urllib.request
+
+    file_url = download_url or f"{webdriver_base_url}/{version}/{PLATFORM}/chromedriver-{PLATFORM}.zip"
     logger.info(f'Downloading WebDriver version {version}.')
+    target_dir = os.path.dirname(os.path.abspath(chromedriver_path))
+    zip_path = None
+    driver_tmp_path = None
     try:
-        # zipファイルをダウンロード
-        with urllib.request.urlopen(file_url) as download_file:
-            with open(DOWNLOAD_ZIP_PATH, mode='wb') as save_file:
-                save_file.write(download_file.read())
-        
-        # zipファイルを展開してchromedriver.exeを取得
-        with zipfile.ZipFile(DOWNLOAD_ZIP_PATH) as obj_zip:
-            with obj_zip.open(EXTRACT_DRIVER_PATH) as src, open(CHROMEDRIVER_PATH, 'wb') as dst:
-                dst.write(src.read())
-        
+        # zipファイルを一時ファイルへストリーミングでダウンロード
+        with urllib.request.urlopen(file_url) as download_file, \
+                tempfile.NamedTemporaryFile(dir=target_dir, suffix='.zip', delete=False) as save_file:
+            zip_path = save_file.name
+            shutil.copyfileobj(download_file, save_file, DOWNLOAD_CHUNK_SIZE)
+
+        # zipファイルを展開して一時ファイルに書き込み、既存のWebDriverと置き換え
+        with zipfile.ZipFile(zip_path) as obj_zip:
+            with obj_zip.open(EXTRACT_DRIVER_PATH) as src, \
+                    tempfile.NamedTemporaryFile(dir=target_dir, delete=False) as dst:
+                driver_tmp_path = dst.name
+                shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK_SIZE)
+        os.chmod(driver_tmp_path, 0o755)
+        os.replace(driver_tmp_path, chromedriver_path)
+        driver_tmp_path = None
+
         logger.info("WebDriver download and extraction completed.")
         return True
     except Exception as e:
         logger.error(f"Error during WebDriver download or extraction: {e}")
         return False
     finally:
-        # zipファイルを削除
-        if os.path.exists(DOWNLOAD_ZIP_PATH):
-            os.remove(DOWNLOAD_ZIP_PATH)
+        # 一時ファイルを削除
+        for path in (zip_path, driver_tmp_path):
+            if path and os.path.exists(path):
+                os.remove(path)
 
 
-def update_and_relaunch_webdriver(error_obj, latest_version_url, webdriver_base_url):
+def update_and_relaunch_webdriver(error_obj, latest_version_url, webdriver_base_url, chrome_version=None):
     """
-    エラー情報から適切なWebDriverをダウンロードし、再起動を試みます。
+    Chromeのバージョン、またはエラー情報から適切なWebDriverをダウンロードし、再起動を試みます。
 
     Args:
-        error_obj (Exception): WebDriver起動時に発生した例外。
-        latest_version_url (str): 最新バージョン情報が記載されたURL。
+        error_obj (Exception or None): WebDriver起動時に発生した例外。
+        latest_version_url (str): 最新バージョン情報のJSONエンドポイントのURL。
         webdriver_base_url (str): WebDriverのダウンロード元ベースURL。
+        chrome_version (str, optional): インストール済みのChromeのバージョン。
+
+    Returns:
+        bool: 更新後のWebDriverが起動できた場合はTrue
     """
-    # エラーメッセージから現在のChromeバージョンを正規表現で抽出
-    match = re.search(r'(?<=\bchrome=)\d+', str(error_obj))
-    if match:
-        current_version = match.group()
-        logger.info(f"Detected Chrome version from error message: {current_version}")
-    else:
-        logger.warning("Could not get Chrome version from error message. Fetching latest version.")
-        current_version = get_latest_webdriver_version(latest_version_url)
-        if not current_version:
-            logger.error("Could not get the latest WebDriver version. Exiting process.")
-            return
+    if not chrome_version and error_obj is not None:
+        # エラーメッセージから現在のChromeバージョンを正規表現で抽出
+        match = re.search(r'(?<=\bchrome=)[\d.]+', str(error_obj))
+        if match:
+            chrome_version = match.group()
+            logger.info(f"Detected Chrome version from error message: {chrome_version}")
+
+    resolved = get_latest_webdriver_version(latest_version_url, chrome_version)
+    if not resolved:
+        logger.error("Could not get the latest WebDriver version. Exiting process.")
+        return False
+    version, download_url = resolved
 
     # 新しいWebDriverをダウンロードして起動確認
-    if download_webdriver(current_version, webdriver_base_url):
-        if check_webdriver_launch():
+    with common.timer('webdriver_download'):
+        downloaded = download_webdriver(version, webdriver_base_url, download_url)
+    if downloaded:
+        common.increment('webdriver_updates')
+        if check_webdriver_launch() is True:
             logger.info("WebDriver updated and launched successfully.")
-        else:
-            logger.error("Failed to launch WebDriver after update.")
+            return True
+        logger.error("Failed to launch WebDriver after update.")
     else:
         logger.error("WebDriver download failed, not attempting to launch.")
+    return False
+
+
+def run(config):
+    """
+    WebDriverの起動確認を行い、必要に応じて最新化します。
+    ChromeとWebDriverのバージョンが一致している場合は、Chromeを起動せずに終了します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Raises:
+        RuntimeError: WebDriverの更新、または更新後の起動確認に失敗した場合
+    """
+    webdriver_base_url = config["WEBDRIVER"]["webdriver_base_url"]
+    latest_version_url = config["WEBDRIVER"]["latest_version_url"]
+
+    # --- キャッシュ確認 (バイナリが前回の確認から変わっていなければ、バージョンを取得しない) ---
+    cache_key = get_version_cache_key()
+    cache = load_version_cache()
+    if cache_key is not None and cache.get('key') == cache_key:
+        logger.info(f"WebDriver version is up to date (cached). Chrome version: {cache.get('chrome_version')}, "
+                    f"WebDriver version: {cache.get('driver_version')}")
+        return
+
+    # --- バージョン確認 (Chromeを起動せずにバイナリから取得) ---
+    chrome_version = get_chrome_version()
+    driver_version = get_chromedriver_version()
+    logger.info(f"Chrome version: {chrome_version}, WebDriver version: {driver_version}")
+
+    if chrome_version and major_version(chrome_version) == major_version(driver_version):
+        logger.info('WebDriver version matches Chrome. No issues.')
+        save_version_cache(chrome_version, driver_version, cache_key)
+        return
+
+    if chrome_version:
+        # --- バージョンが異なる場合のみ更新 ---
+        if not update_and_relaunch_webdriver(None, latest_version_url, webdriver_base_url, chrome_version):
+            raise RuntimeError('WebDriver update failed.')
+        save_version_cache(chrome_version, get_chromedriver_version(), get_version_cache_key())
+        return
+
+    # --- Chromeのバージョンが取得できない場合は、起動確認のエラー内容に応じて更新 ---
+    from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
+
+    error = check_webdriver_launch()
+    if error is True:
+        return
+    if not isinstance(error, (SessionNotCreatedException, FileNotFoundError, WebDriverException)):
+        raise RuntimeError(f'Unexpected result from WebDriver launch check: {error}')
+    if not update_and_relaunch_webdriver(error, latest_version_url, webdriver_base_url):
+        raise RuntimeError('WebDriver update failed.')
 
 
 def main():
     """
     メイン処理
     """
+    config = None
+    succeeded = False
     try:
         # --- 初期設定 ---
         config = common.load_config()
         common.setup_logger(config["LOG"]["path"])
-        webdriver_base_url = config["WEBDRIVER"]["webdriver_base_url"]
-        latest_version_url = config["WEBDRIVER"]["latest_version_url"]
 
         logger.info('*** 00 updateWebDriver START ***')
 
-        # --- WebDriver起動確認 ---
-        error = check_webdriver_launch()
-
-        # --- エラー内容に応じて更新処理を実行 ---
-        if isinstance(error, (SessionNotCreatedException, FileNotFoundError, WebDriverException)):
-            update_and_relaunch_webdriver(error, latest_version_url, webdriver_base_url)
-        elif error is not True:
-            logger.error(f"An unexpected error occurred: {error}")
+        run(config)
+        succeeded = True
 
     except Exception as e:
         logger.error(f'An unexpected error occurred in main process: {e}')
         sys.exit(1)
     finally:
+        if config is not None:
+            common.write_run_report(config, '00updateWebDriver', succeeded)
         logger.info('*** 00 updateWebDriver END ***')
 
 if __name__ == "__main__":
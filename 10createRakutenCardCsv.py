@@ -3,14 +3,42 @@ import glob
 import sys
 import time
 import traceback
+from types import SimpleNamespace
 from logzero import logger
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
+from urllib.parse import urljoin
 import common
+from download_watcher import DownloadWatcher
+
+# Selenium・requests などの重いモジュールは、起動を速くするため使用する関数内で読み込む (Seleniumは load_selenium で読み込む)
+
+# --- 定数 ---
+STATEMENT_URL = "https://www.rakuten-card.co.jp/e-navi/members/statement/index.xhtml?tabNo={tab_no}"
+CSV_BUTTON_SELECTOR = ".stmt-c-btn-dl.stmt-csv-btn"
+DOWNLOAD_WORK_DIR = '_download'
+DOWNLOAD_TIMEOUT = 30
+FETCH_MODE_BROWSER = 'browser'
+FETCH_MODE_HTTP = 'http'
+SESSION_PROBE_URL = "https://www.rakuten-card.co.jp/e-navi/members/index.xhtml"
+LOGGED_IN_URL_PART = "/e-navi/members/"
+
+
+def load_selenium():
+    """
+    このモジュールで使用するSeleniumのモジュール・クラスを読み込みます。
+    HTTP取得で保存済みのセッションを使用する場合など、ブラウザを起動しない実行では読み込みません。
+
+    Returns:
+        types.SimpleNamespace: webdriver, Service, By, Keys, EC (expected_conditions), WebDriverWait
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support import expected_conditions
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    return SimpleNamespace(webdriver=webdriver, Service=Service, By=By, Keys=Keys, EC=expected_conditions,
+                           WebDriverWait=WebDriverWait)
 
 
 def create_driver(config):
@@ -23,11 +51,13 @@ def create_driver(config):
     Returns:
         webdriver.Chrome: 生成されたWebDriverインスタンス
     """
+    selenium = load_selenium()
+
     chromedriver_path = config["WEBDRIVER"]["chrome_driver"]
     output_dir = config["OUTPUT"]["dir"]
     
-    service = Service(executable_path=chromedriver_path)
-    options = webdriver.ChromeOptions()
+    service = selenium.Service(executable_path=chromedriver_path)
+    options = selenium.webdriver.ChromeOptions()
     # 必要なオプションを追加
     options.add_argument("--headless")
     options.add_argument("--no-sandbox")
@@ -38,7 +68,7 @@ def create_driver(config):
         "download.directory_upgrade": True,
     })
     
-    return webdriver.Chrome(service=service, options=options)
+    return selenium.webdriver.Chrome(service=service, options=options)
 
 
 def prepare_output_directory(output_dir, file_prefix):
@@ -69,6 +99,9 @@ def login_to_rakuten(driver, wait, url, user, password):
         user (str): ユーザーID
         password (str): パスワード
     """
+    selenium = load_selenium()
+    EC, By, Keys = selenium.EC, selenium.By, selenium.Keys
+
     logger.info('Logging in to Rakuten e-NAVI.')
     driver.get(url)
 
@@ -87,12 +120,165 @@ def login_to_rakuten(driver, wait, url, user, password):
     password_field.send_keys(Keys.TAB)
     password_field.send_keys(Keys.ENTER)
 
-    # ログイン処理の完了を待つ
-    time.sleep(5)
+    # ログイン後のページが表示されるまで待つ
+    wait_for_logged_in_page(wait)
     logger.info('Login successful.')
 
 
-def download_and_rename_csv(driver, wait, output_dir, file_prefix, tab_no):
+def wait_for_logged_in_page(wait):
+    """
+    ログイン後のページ (e-NAVI会員ページ) の読み込みが完了するまで待機します。
+
+    Args:
+        wait (WebDriverWait): WebDriverWaitインスタンス
+    """
+    EC = load_selenium().EC
+
+    wait.until(EC.url_contains(LOGGED_IN_URL_PART))
+    wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
+
+
+def get_valid_cached_session(cache_path, cache_key, probe_url):
+    """
+    保存済みのログインセッションを読み込み、有効な場合のみ返します。
+    無効なセッションは削除します。
+
+    Args:
+        cache_path (str or None): セッションの保存先ファイルのパス。Noneの場合は使用しない
+        cache_key (str): 暗号化に使用するパスフレーズ
+        probe_url (str): セッションの有効性を確認するページのURL
+
+    Returns:
+        tuple or None: (Cookieのリスト, User-Agent)。有効なセッションがない場合はNone
+    """
+    if not cache_path:
+        return None
+
+    import session_cache
+
+    cached = session_cache.load_session(cache_path, cache_key)
+    if cached is None:
+        return None
+
+    cookies, user_agent = cached
+    if not session_cache.is_session_valid(cookies, probe_url, user_agent):
+        logger.info('Saved login session has expired.')
+        session_cache.clear_session(cache_path)
+        return None
+
+    logger.info('Reusing saved login session.')
+    return cached
+
+
+def restore_login_session(driver, wait, cookies, probe_url):
+    """
+    保存済みのCookieをブラウザに設定し、ログイン済みの状態を復元します。
+
+    Args:
+        driver (webdriver.Chrome): WebDriverインスタンス
+        wait (WebDriverWait): WebDriverWaitインスタンス
+        cookies (list): Cookieのリスト
+        probe_url (str): ログイン後にのみ表示できるページのURL
+
+    Returns:
+        bool: ログイン済みの状態を復元できた場合はTrue
+    """
+    try:
+        # Cookieを設定するため、同じドメインの軽量なページを開く
+        driver.get(urljoin(probe_url, '/robots.txt'))
+        for cookie in cookies:
+            driver.add_cookie(cookie)
+
+        driver.get(probe_url)
+        wait_for_logged_in_page(wait)
+    except Exception as e:
+        # 期限切れ・ドメイン違いのCookie (InvalidCookieDomainExceptionなど) の場合は、通常のログインに切り替える
+        logger.warning(f'Could not restore saved login session: {e}')
+        try:
+            driver.delete_all_cookies()
+        except Exception:
+            pass
+        return False
+    logger.info('Login session restored.')
+    return True
+
+
+def get_tab_download_dir(output_dir, tab_no):
+    """
+    タブごとのダウンロード先ディレクトリのパスを返します。
+
+    Args:
+        output_dir (str): 出力ディレクトリ
+        tab_no (int): タブ番号
+
+    Returns:
+        str: ダウンロード先ディレクトリの絶対パス
+    """
+    return os.path.abspath(os.path.join(output_dir, DOWNLOAD_WORK_DIR, f'tab{tab_no}'))
+
+
+def set_tab_download_dir(driver, output_dir, tab_no):
+    """
+    ブラウザのダウンロード先を、タブ専用の空のディレクトリに設定します。
+    タブごとにダウンロード先を分けることで、同時にダウンロードしてもファイルとタブを確実に対応付けます。
+    ダウンロード先はブラウザのセッション全体に適用されるため、前のタブのダウンロードが開始されてから切り替えてください。
+
+    Args:
+        driver (webdriver.Chrome): WebDriverインスタンス
+        output_dir (str): 出力ディレクトリ
+        tab_no (int): タブ番号
+
+    Returns:
+        str: ダウンロード先ディレクトリの絶対パス
+    """
+    download_dir = get_tab_download_dir(output_dir, tab_no)
+    os.makedirs(download_dir, exist_ok=True)
+    for f in os.listdir(download_dir):
+        os.remove(os.path.join(download_dir, f))
+
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {
+        "behavior": "allow",
+        "downloadPath": download_dir,
+    })
+    return download_dir
+
+
+def click_csv_download(wait, tab_no):
+    """
+    現在のウィンドウに表示している明細ページのCSVダウンロードボタンをクリックします。
+
+    Args:
+        wait (WebDriverWait): WebDriverWaitインスタンス
+        tab_no (int): タブ番号
+    """
+    selenium = load_selenium()
+    EC, By = selenium.EC, selenium.By
+
+    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, CSV_BUTTON_SELECTOR))).click()
+    logger.info(f'CSV download initiated for tabNo={tab_no}')
+
+
+def rename_downloaded_csv(downloaded_path, output_dir, file_prefix, tab_no):
+    """
+    ダウンロードしたCSVファイルを出力ディレクトリへ移動し、リネームします。
+
+    Args:
+        downloaded_path (str): ダウンロードしたCSVファイルのパス
+        output_dir (str): 出力ディレクトリ
+        file_prefix (str): ファイル名の接頭辞
+        tab_no (int): タブ番号
+
+    Returns:
+        str: リネーム後のファイルのパス
+    """
+    new_output_file = os.path.join(output_dir, f"{file_prefix}_tab{tab_no}.csv")
+    os.replace(downloaded_path, new_output_file)
+    logger.info(f'Successfully downloaded and renamed to: {new_output_file}')
+    return new_output_file
+
+
+def download_and_rename_csv(driver, wait, output_dir, file_prefix, tab_no, statement_url=STATEMENT_URL,
+                            on_downloaded=None):
     """
     指定されたタブの明細CSVをダウンロードし、リネームします。
 
@@ -102,74 +288,216 @@ def download_and_rename_csv(driver, wait, output_dir, file_prefix, tab_no):
         output_dir (str): 出力ディレクトリ
         file_prefix (str): ファイル名の接頭辞
         tab_no (int): ダウンロード対象のタブ番号
+        statement_url (str, optional): 明細ページのURL ({tab_no} をタブ番号に置換します)
+        on_downloaded (callable, optional): ダウンロード完了時に (タブ番号, ファイルのパス) で呼び出す関数
     """
-    download_url = f"https://www.rakuten-card.co.jp/e-navi/members/statement/index.xhtml?tabNo={tab_no}"
+    download_url = statement_url.format(tab_no=tab_no)
     logger.info(f'Navigating to download page for tabNo={tab_no}')
-    driver.get(download_url)
-    
-    # ダウンロード前のファイルリストを取得
-    before_files = set(os.listdir(output_dir))
+    with common.timer('download', tab_no=tab_no):
+        driver.get(download_url)
 
-    # CSVダウンロードボタンをクリック
-    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, ".stmt-c-btn-dl.stmt-csv-btn"))).click()
-    logger.info(f'CSV download initiated for tabNo={tab_no}')
+        # ダウンロード先をタブ専用のディレクトリに設定し、監視を開始してからCSVダウンロードボタンをクリック
+        download_dir = set_tab_download_dir(driver, output_dir, tab_no)
+        with DownloadWatcher(download_dir) as watcher:
+            click_csv_download(wait, tab_no)
 
-    # ファイルのダウンロード完了を待機 (最大30秒)
-    try:
-        WebDriverWait(driver, 30).until(
-            lambda d: any(f.startswith('enavi') and f.endswith('.csv') for f in os.listdir(output_dir) if f not in before_files)
-        )
-        after_files = set(os.listdir(output_dir))
-        new_file_name = (after_files - before_files).pop()
-        downloaded_path = os.path.join(output_dir, new_file_name)
-        
-        # ファイルをリネーム
-        new_output_file = os.path.join(output_dir, f"{file_prefix}_tab{tab_no}.csv")
-        os.rename(downloaded_path, new_output_file)
-        logger.info(f'Successfully downloaded and renamed to: {new_output_file}')
-
-    except Exception: # TimeoutExceptionだけでなく、他の例外も考慮
+            # ファイルのダウンロード完了を待機 (最大30秒)
+            downloaded_path = watcher.wait(DOWNLOAD_TIMEOUT)
+
+    if downloaded_path:
+        output_file = rename_downloaded_csv(downloaded_path, output_dir, file_prefix, tab_no)
+        common.increment('downloaded_files', tab_no=tab_no)
+        if on_downloaded:
+            on_downloaded(tab_no, output_file)
+    else:
         logger.warning(f"Could not find downloaded CSV file for tabNo={tab_no}.")
+        common.increment('download_failures', tab_no=tab_no)
+
+
+def download_tabs_concurrently(driver, wait, output_dir, file_prefix, tab_nos, statement_url=STATEMENT_URL,
+                               on_downloaded=None):
+    """
+    ログイン済みのセッションで各タブの明細ページを別ウィンドウで同時に開き、CSVを並行してダウンロードします。
+
+    ダウンロード先 (Page.setDownloadBehavior) はウィンドウ単位ではなくブラウザのセッション全体に適用されるため、
+    各タブのダウンロードが自身のディレクトリで開始されたことを確認してから、次のタブのダウンロード先に切り替えます。
+    開始を確認できなかった場合は、ファイルが別のタブのディレクトリに保存されないよう、以降のタブのダウンロードを中止します。
+
+    Args:
+        driver (webdriver.Chrome): WebDriverインスタンス
+        wait (WebDriverWait): WebDriverWaitインスタンス
+        output_dir (str): 出力ディレクトリ
+        file_prefix (str): ファイル名の接頭辞
+        tab_nos (list): ダウンロード対象のタブ番号のリスト
+        statement_url (str, optional): 明細ページのURL ({tab_no} をタブ番号に置換します)
+        on_downloaded (callable, optional): ダウンロード完了時に (タブ番号, ファイルのパス) で呼び出す関数
+    """
+    main_handle = driver.current_window_handle
+    start_time = time.perf_counter()
+
+    # --- 各タブの明細ページを別ウィンドウで開く (ページの読み込みは並行して行われる) ---
+    handles = {}
+    for tab_no in tab_nos:
+        before_handles = set(driver.window_handles)
+        driver.execute_script("window.open(arguments[0], '_blank');", statement_url.format(tab_no=tab_no))
+        handles[tab_no] = (set(driver.window_handles) - before_handles).pop()
+        logger.info(f'Opened download page for tabNo={tab_no}')
+
+    # --- 各ウィンドウでダウンロードを開始 ---
+    watchers = {}
+    try:
+        pending_tab_nos = list(handles)
+        while pending_tab_nos:
+            tab_no = pending_tab_nos.pop(0)
+            driver.switch_to.window(handles[tab_no])
+            watcher = DownloadWatcher(set_tab_download_dir(driver, output_dir, tab_no))
+            try:
+                click_csv_download(wait, tab_no)
+            except Exception:
+                watcher.close()
+                logger.warning(f"Could not initiate CSV download for tabNo={tab_no}.")
+                continue
+            watchers[tab_no] = watcher
+
+            if pending_tab_nos and not watcher.wait_started(DOWNLOAD_TIMEOUT):
+                logger.warning(f"CSV download for tabNo={tab_no} did not start. "
+                               f"Skipping tabNo={', '.join(map(str, pending_tab_nos))}.")
+                for skipped_tab_no in pending_tab_nos:
+                    common.increment('download_failures', tab_no=skipped_tab_no)
+                break
+
+        # --- 全タブのダウンロード完了を待機 (全体で最大30秒) ---
+        deadline = time.monotonic() + DOWNLOAD_TIMEOUT
+        for tab_no, watcher in watchers.items():
+            downloaded_path = watcher.wait(max(deadline - time.monotonic(), 0))
+            if downloaded_path:
+                # 各タブの所要時間は、明細ページを開き始めてからダウンロードが完了するまでの時間とする
+                common.record_time('download', time.perf_counter() - start_time, tab_no=tab_no)
+                output_file = rename_downloaded_csv(downloaded_path, output_dir, file_prefix, tab_no)
+                common.increment('downloaded_files', tab_no=tab_no)
+                if on_downloaded:
+                    on_downloaded(tab_no, output_file)
+            else:
+                logger.warning(f"Could not find downloaded CSV file for tabNo={tab_no}.")
+                common.increment('download_failures', tab_no=tab_no)
+    finally:
+        for watcher in watchers.values():
+            watcher.close()
+        for handle in handles.values():
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(main_handle)
+
+
+def run(config, on_downloaded=None):
+    """
+    楽天e-NAVIにログインし、各タブの明細CSVをダウンロードします。
+    ダウンロード先は設定オブジェクトのアカウントの出力ディレクトリです。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        on_downloaded (callable, optional): 各タブのダウンロード完了時に (タブ番号, ファイルのパス) で呼び出す関数。
+            全タブの完了を待たずに取込を開始する場合に使用します。
+    """
+    rakuten_url = config["RAKUTEN"]["url"]
+    rakuten_user = config["RAKUTEN"]["user"]
+    rakuten_password = config["RAKUTEN"]["password"]
+    csv_prefix = config["RAKUTEN"]["csv_file_nm_prefix"]
+    output_dir = config["OUTPUT"]["dir"]
+    tab_nos = common.get_tab_nos(config)
+    concurrent_download = config.getboolean("RAKUTEN", "concurrent_download", fallback=False)
+    fetch_mode = config.get("RAKUTEN", "fetch_mode", fallback=FETCH_MODE_BROWSER)
+    statement_url = config.get("RAKUTEN", "statement_url", fallback=STATEMENT_URL)
+
+    session_cache_path = config.get("RAKUTEN", "session_cache", fallback=None)
+    session_cache_key = config.get("RAKUTEN", "session_cache_key", fallback=rakuten_password)
+    probe_url = config.get("RAKUTEN", "session_probe_url", fallback=SESSION_PROBE_URL)
+
+    driver = None
+    try:
+        # --- ディレクトリ準備と保存済みセッションの確認 ---
+        prepare_output_directory(output_dir, csv_prefix)
+        cached = get_valid_cached_session(session_cache_path, session_cache_key, probe_url)
+
+        # --- WebDriver生成と楽天e-NAVIへのログイン (HTTP取得で有効なセッションがある場合は不要) ---
+        if fetch_mode == FETCH_MODE_HTTP and cached:
+            cookies, user_agent = cached
+            common.increment('session_restored')
+        else:
+            driver = create_driver(config)
+            wait = load_selenium().WebDriverWait(driver, 20)
+
+            with common.timer('login'):
+                restored = cached and restore_login_session(driver, wait, cached[0], probe_url)
+                if not restored:
+                    login_to_rakuten(driver, wait, rakuten_url, rakuten_user, rakuten_password)
+            common.increment('session_restored' if restored else 'logins')
+            if not restored and session_cache_path:
+                import session_cache
+                session_cache.save_session(session_cache_path, session_cache_key,
+                                           driver.get_cookies(), driver.execute_script("return navigator.userAgent;"))
+
+            cookies = driver.get_cookies()
+            user_agent = driver.execute_script("return navigator.userAgent;")
+
+        # --- 各タブの明細をダウンロード ---
+        if fetch_mode == FETCH_MODE_HTTP:
+            # ログイン済みのCookieをHTTPセッションへ引き継ぎ、ブラウザはすぐに終了する
+            import statement_fetcher
+
+            if driver:
+                driver.quit()
+                driver = None
+            with statement_fetcher.create_http_session(cookies, user_agent, len(tab_nos)) as session:
+                statement_fetcher.fetch_statement_csvs(session, statement_url, output_dir, csv_prefix, tab_nos,
+                                                       on_downloaded)
+        elif concurrent_download:
+            download_tabs_concurrently(driver, wait, output_dir, csv_prefix, tab_nos, statement_url, on_downloaded)
+        else:
+            for tab_no in tab_nos:
+                download_and_rename_csv(driver, wait, output_dir, csv_prefix, tab_no, statement_url, on_downloaded)
+    finally:
+        if driver:
+            driver.quit()
 
 
 def main():
     """
     メイン処理
     """
-    driver = None
+    config = None
+    succeeded = False
+    failed_accounts = []
     try:
         # --- 初期設定 ---
         config = common.load_config()
         common.setup_logger(config["LOG"]["path"])
-        
-        rakuten_url = config["RAKUTEN"]["url"]
-        rakuten_user = config["RAKUTEN"]["user"]
-        rakuten_password = config["RAKUTEN"]["password"]
-        csv_prefix = config["RAKUTEN"]["csv_file_nm_prefix"]
-        output_dir = config["OUTPUT"]["dir"]
 
         logger.info('*** 10 createRakutenCardCsv START ***')
 
-        # --- WebDriver生成とディレクトリ準備 ---
-        driver = create_driver(config)
-        wait = WebDriverWait(driver, 20)
-        prepare_output_directory(output_dir, csv_prefix)
-
-        # --- 楽天e-NAVIへログイン ---
-        login_to_rakuten(driver, wait, rakuten_url, rakuten_user, rakuten_password)
+        for account_cd in common.get_account_cds(config):
+            logger.info(f'Downloading statements for account: {account_cd}')
+            common.set_default_labels(account=account_cd)
+            try:
+                run(common.get_account_config(config, account_cd))
+            except Exception as e:
+                logger.error(f'An unexpected error occurred for account {account_cd}: {e}')
+                logger.error(traceback.format_exc())
+                failed_accounts.append(account_cd)
 
-        # --- 各タブの明細をダウンロード ---
-        for tab_no in [0, 1, 2]:
-            download_and_rename_csv(driver, wait, output_dir, csv_prefix, tab_no)
+        succeeded = not failed_accounts
 
     except Exception as e:
         logger.error(f'An unexpected error occurred: {e}')
         logger.error(traceback.format_exc())
         sys.exit(1)
     finally:
-        if driver:
-            driver.quit()
+        if config is not None:
+            common.write_run_report(config, '10createRakutenCardCsv', succeeded)
         logger.info('*** 10 createRakutenCardCsv END ***')
 
+    if failed_accounts:
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
@@ -1,118 +1,589 @@
 import os
 import sys
-import csv
-import psycopg2
+import time
+import hashlib
+from datetime import date
 import traceback
 from logzero import logger
 import common
+from rakuten_csv_parser import RakutenCardCsvParser
+from run_manifest import RunManifest, file_sha256
 
+# --- 定数 ---
+LOAD_METHOD_COPY = 'copy'
+LOAD_METHOD_INSERT = 'insert'
+IMPORT_MODE_FULL = 'full'
+IMPORT_MODE_INCREMENTAL = 'incremental'
+STAGING_TABLE = common.STAGING_TABLE
+DELTA_WORK_TABLE = 'tmp_if_rakuten_card'
+IF_RAKUTEN_CARD_COLUMNS = [
+    'usage_date', 'merchant_product_name', 'customer_nm', 'payment_method',
+    'usage_amount', 'payment_fee', 'total_payment_amount', 'payment_month',
+    'monthly_payment_amount', 'monthly_carryover_balance', 'new_signup_flag',
+    'row_fingerprint', 'account_cd', 'tab_no',
+]
 
-def clear_if_rakuten_card_table(cursor):
+
+def clear_if_rakuten_card_table(cursor, account_cd=common.DEFAULT_ACCOUNT_CD, kept_tab_nos=()):
     """
-    if_rakuten_cardテーブルの全データを削除します。
+    if_rakuten_cardテーブルから、指定されたアカウントの全データを削除します。
+    他のアカウントのデータは削除しません。
 
     Args:
         cursor: データベースカーソル
+        account_cd (str, optional): アカウントコード
+        kept_tab_nos (iterable, optional): 再取込を省略するため、行を削除しないタブ番号
     """
-    logger.info("Clearing all data from if_rakuten_card table.")
-    cursor.execute("DELETE FROM if_rakuten_card")
+    kept_tab_nos = list(kept_tab_nos)
+    if not kept_tab_nos:
+        logger.info(f"Clearing data of account {account_cd} from if_rakuten_card table.")
+        cursor.execute("DELETE FROM if_rakuten_card WHERE account_cd = %s", (account_cd,))
+        return
+
+    logger.info(f"Clearing data of account {account_cd} except tabNo={kept_tab_nos} from if_rakuten_card table.")
+    cursor.execute("""
+        DELETE FROM if_rakuten_card
+        WHERE account_cd = %s
+          AND (tab_no IS NULL OR NOT tab_no = ANY(%s))
+    """, (account_cd, kept_tab_nos))
 
 
-def insert_csv_data(cursor, csv_file_path, tab_no):
+def create_staging_table(cursor, table, staging_mode):
     """
-    CSVファイルのデータをDBに挿入します。
+    実行ごとのステージングテーブル (UNLOGGEDテーブル、またはセッションの一時テーブル) を作成します。
+    前回の実行で残ったテーブルは削除して作り直すため、DELETEによる不要行やWALは発生しません。
+    一時テーブルは12で読み込むため、コミット時には削除しません (12の終了時に削除します)。
 
     Args:
         cursor: データベースカーソル
+        table (str): テーブル名
+        staging_mode (str): ステージング方式 ('unlogged' または 'temp')
+    """
+    logger.info(f"Creating {staging_mode} staging table {table}.")
+    table_type = 'UNLOGGED' if staging_mode == common.STAGING_MODE_UNLOGGED else 'TEMP'
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"CREATE {table_type} TABLE {table} (LIKE if_rakuten_card INCLUDING DEFAULTS)")
+
+
+def create_delta_work_table(cursor):
+    """
+    差分取込用の一時テーブルを作成します。一時テーブルはコミット時に削除されます。
+
+    Args:
+        cursor: データベースカーソル
+    """
+    logger.info(f"Creating work table {DELTA_WORK_TABLE} for incremental import.")
+    sql = f"""
+        CREATE TEMP TABLE {DELTA_WORK_TABLE} ON COMMIT DROP AS
+        SELECT {', '.join(IF_RAKUTEN_CARD_COLUMNS)}
+        FROM if_rakuten_card
+        WITH NO DATA
+    """
+    cursor.execute(sql)
+
+
+def apply_delta(cursor, account_cd=common.DEFAULT_ACCOUNT_CD, reloaded_tab_nos=None):
+    """
+    一時テーブルに取り込んだ明細とif_rakuten_cardを行フィンガープリントで突き合わせ、差分のみを反映します。
+    新規の行は delta_status = '1' で登録し、明細から消えた行は '9'、再び現れた行は '0' に更新します。
+    突き合わせは指定されたアカウントの行のみを対象とします。
+
+    Args:
+        cursor: データベースカーソル
+        account_cd (str, optional): アカウントコード
+        reloaded_tab_nos (list, optional): 一時テーブルに取り込んだタブ番号。指定した場合、明細から消えた行の判定は
+            これらのタブ (およびタブ番号が未設定の行) のみを対象とします。省略時は全タブを対象とします。
+    """
+    logger.info("Applying delta to if_rakuten_card table.")
+    tab_condition = "AND (irc.tab_no IS NULL OR irc.tab_no = ANY(%s))" if reloaded_tab_nos is not None else ""
+    params = (account_cd, list(reloaded_tab_nos)) if reloaded_tab_nos is not None else (account_cd,)
+    cursor.execute(f"""
+        UPDATE if_rakuten_card irc
+        SET delta_status = '9'
+        WHERE irc.account_cd = %s
+          AND irc.delta_status <> '9'
+          {tab_condition}
+          AND NOT EXISTS (
+            SELECT 1
+            FROM {DELTA_WORK_TABLE} t
+            WHERE t.row_fingerprint = irc.row_fingerprint
+          )
+    """, params)
+    logger.info(f"{cursor.rowcount} disappeared rows marked.")
+
+    cursor.execute(f"""
+        UPDATE if_rakuten_card irc
+        SET delta_status = '0'
+        WHERE irc.account_cd = %s
+          AND irc.delta_status = '9'
+          AND EXISTS (
+            SELECT 1
+            FROM {DELTA_WORK_TABLE} t
+            WHERE t.row_fingerprint = irc.row_fingerprint
+          )
+    """, (account_cd,))
+    logger.info(f"{cursor.rowcount} reappeared rows restored.")
+
+    # 取込済みの行のタブ番号を最新の明細に合わせる (タブ番号の追加前に取り込んだ行を含む)
+    cursor.execute(f"""
+        UPDATE if_rakuten_card irc
+        SET tab_no = t.tab_no
+        FROM {DELTA_WORK_TABLE} t
+        WHERE irc.account_cd = %s
+          AND irc.row_fingerprint = t.row_fingerprint
+          AND irc.tab_no IS DISTINCT FROM t.tab_no
+    """, (account_cd,))
+
+    columns = ', '.join(IF_RAKUTEN_CARD_COLUMNS)
+    cursor.execute(f"""
+        INSERT INTO if_rakuten_card ({columns}, delta_status)
+        SELECT {columns}, '1'
+        FROM {DELTA_WORK_TABLE} t
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM if_rakuten_card irc
+            WHERE irc.account_cd = t.account_cd
+              AND irc.row_fingerprint = t.row_fingerprint
+        )
+    """)
+    logger.info(f"{cursor.rowcount} new rows inserted.")
+
+
+def read_csv_records(parser):
+    """
+    パーサーから一定件数ごとのバッチでレコードを読み込み、1件ずつ返します。
+    バッチの読み込み (CSVの解析・型変換) に要した時間を csv_parse として記録します。
+
+    Args:
+        parser (RakutenCardCsvParser): 明細CSVのパーサー
+
+    Yields:
+        CardRecord: 明細1行のレコード
+    """
+    batches = parser.batches()
+    while True:
+        start_time = time.perf_counter()
+        batch = next(batches, None)
+        common.record_time('csv_parse', time.perf_counter() - start_time, tab_no=parser.tab_no)
+        if batch is None:
+            break
+        yield from batch
+
+
+def add_row_fingerprint(records, occurrences, account_cd=common.DEFAULT_ACCOUNT_CD, tab_no=None):
+    """
+    レコードをif_rakuten_cardの登録カラム順の行データに変換し、
+    末尾に明細1行を一意に識別する行フィンガープリント (SHA-256)・アカウントコード・タブ番号を付与します。
+    フィンガープリントは変換前のCSVの値から算出し、内容が完全に一致する行は出現順の連番を含めることで区別します。
+
+    Args:
+        records (iterable): 明細のレコード
+        occurrences (dict): 同一内容の行の出現回数 (取込処理全体で共有)
+        account_cd (str, optional): アカウントコード
+        tab_no (int, optional): CSVの種別を示すタブ番号
+
+    Yields:
+        tuple: 行フィンガープリント・アカウントコード・タブ番号を付与した行データ
+    """
+    for record in records:
+        key = record.source_key
+        occurrences[key] = occurrences.get(key, 0) + 1
+        fingerprint = hashlib.sha256(f"{key}\x1f{occurrences[key]}".encode("utf-8")).hexdigest()
+        yield record.as_tuple() + (fingerprint, account_cd, tab_no)
+
+
+def count_occurrences(csv_file_path, tab_no, occurrences):
+    """
+    再取込を省略したタブのCSVを読み込み、同一内容の行の出現回数のみを加算します (DBへの登録は行いません)。
+    後続のタブの行フィンガープリントを、全タブを取り込んだ場合と一致させるために使用します。
+
+    Args:
         csv_file_path (str): CSVファイルのパス
         tab_no (int): CSVの種別を示すタブ番号
+        occurrences (dict): 同一内容の行の出現回数 (取込処理全体で共有)
+    """
+    with RakutenCardCsvParser(csv_file_path, tab_no) as parser:
+        for record in parser.records():
+            occurrences[record.source_key] = occurrences.get(record.source_key, 0) + 1
+
+
+def log_rejected_rows(parser):
+    """
+    変換できずに読み飛ばした行がある場合、件数とリジェクトファイルを出力します。
+
+    Args:
+        parser (RakutenCardCsvParser): 明細CSVのパーサー
+    """
+    common.increment('rows_rejected', parser.reject_count, tab_no=parser.tab_no)
+    if parser.reject_count:
+        logger.warning(f"{parser.reject_count} rows rejected. See: {parser.reject_file_path}")
+
+
+def insert_csv_data(cursor, csv_file_path, tab_no, table=STAGING_TABLE, occurrences=None, reject_file_path=None,
+                    account_cd=common.DEFAULT_ACCOUNT_CD):
+    """
+    CSVファイルのデータを1行ずつINSERT (準備済み文) でDBに挿入します。
+
+    Args:
+        cursor: データベースカーソル
+        csv_file_path (str): CSVファイルのパス
+        tab_no (int): CSVの種別を示すタブ番号
+        table (str, optional): 登録先テーブル名
+        occurrences (dict, optional): 同一内容の行の出現回数 (取込処理全体で共有)
+        reject_file_path (str, optional): 変換できない行の出力先ファイルのパス
+        account_cd (str, optional): アカウントコード
+
+    Returns:
+        int: 挿入した行数
     """
     logger.info(f"Processing file: {csv_file_path}")
     
-    sql = """
-        INSERT INTO if_rakuten_card (
+    sql = f"""
+        INSERT INTO {table} (
             usage_date, merchant_product_name, customer_nm, payment_method, 
             usage_amount, payment_fee, total_payment_amount, payment_month, 
-            monthly_payment_amount, monthly_carryover_balance, new_signup_flag
+            monthly_payment_amount, monthly_carryover_balance, new_signup_flag,
+            row_fingerprint, account_cd, tab_no
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, NULLIF(%s,''), %s, %s, NULLIF(%s, ''))
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
     """
 
-    with open(csv_file_path, mode="r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        header = next(reader)  # ヘッダー行をスキップ
+    if occurrences is None:
+        occurrences = {}
 
-        for row in reader:
-            # 利用日が存在しない行はスキップ
-            if not row or not row[0]:
-                continue
-            
-            # tab_noに応じて挿入するデータを調整
-            if tab_no == 0:
-                params = (row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], None, None, None)
-            else:
-                params = (row[0], row[1], row[2], row[3], row[4], row[5], row[6], None, row[7], row[8], row[9])
-            
-            cursor.execute(sql, params)
+    row_count = 0
+    with RakutenCardCsvParser(csv_file_path, tab_no, reject_file_path=reject_file_path) as parser:
+        logger.info(f"Detected encoding: {parser.encoding}")
+        for params in add_row_fingerprint(read_csv_records(parser), occurrences, account_cd, tab_no):
+            common.execute_prepared(cursor, f"ins_{table}", sql, params)
+            row_count += 1
+        log_rejected_rows(parser)
+    logger.info(f"Finished processing file: {csv_file_path}")
+    return row_count
+
+
+def copy_csv_data(cursor, csv_file_path, tab_no, table=STAGING_TABLE, occurrences=None, reject_file_path=None,
+                  account_cd=common.DEFAULT_ACCOUNT_CD):
+    """
+    CSVファイルのデータをCOPY FROM STDINでDBに一括登録します。
+    ファイルは一定件数ずつ読み込みながら送信するため、全体をメモリに保持しません。
+
+    Args:
+        cursor: データベースカーソル
+        csv_file_path (str): CSVファイルのパス
+        tab_no (int): CSVの種別を示すタブ番号
+        table (str, optional): 登録先テーブル名
+        occurrences (dict, optional): 同一内容の行の出現回数 (取込処理全体で共有)
+        reject_file_path (str, optional): 変換できない行の出力先ファイルのパス
+        account_cd (str, optional): アカウントコード
+
+    Returns:
+        int: 登録した行数
+    """
+    logger.info(f"Processing file with COPY: {csv_file_path}")
+
+    if occurrences is None:
+        occurrences = {}
+
+    with RakutenCardCsvParser(csv_file_path, tab_no, reject_file_path=reject_file_path) as parser:
+        logger.info(f"Detected encoding: {parser.encoding}")
+        rows = add_row_fingerprint(read_csv_records(parser), occurrences, account_cd, tab_no)
+        row_count = common.copy_rows(cursor, table, IF_RAKUTEN_CARD_COLUMNS, rows)
+        log_rejected_rows(parser)
     logger.info(f"Finished processing file: {csv_file_path}")
+    return row_count
+
+
+def load_csv_data(cursor, csv_file_path, tab_no, load_method=LOAD_METHOD_COPY, table=STAGING_TABLE, occurrences=None,
+                  reject_file_path=None, account_cd=common.DEFAULT_ACCOUNT_CD):
+    """
+    指定された登録方式でCSVファイルのデータをDBに登録し、処理件数と処理速度を出力します。
+
+    Args:
+        cursor: データベースカーソル
+        csv_file_path (str): CSVファイルのパス
+        tab_no (int): CSVの種別を示すタブ番号
+        load_method (str, optional): 登録方式 ('copy' または 'insert')
+        table (str, optional): 登録先テーブル名
+        occurrences (dict, optional): 同一内容の行の出現回数 (取込処理全体で共有)
+        reject_file_path (str, optional): 変換できない行の出力先ファイルのパス
+        account_cd (str, optional): アカウントコード
+
+    Returns:
+        int: 登録した行数
+    """
+    start_time = time.perf_counter()
+    if load_method == LOAD_METHOD_INSERT:
+        row_count = insert_csv_data(cursor, csv_file_path, tab_no, table, occurrences, reject_file_path, account_cd)
+    else:
+        row_count = copy_csv_data(cursor, csv_file_path, tab_no, table, occurrences, reject_file_path, account_cd)
+    elapsed = time.perf_counter() - start_time
+    common.record_time('load_csv', elapsed, tab_no=tab_no, method=load_method)
+    common.increment('rows_loaded', row_count, tab_no=tab_no)
+
+    rows_per_sec = row_count / elapsed if elapsed > 0 else 0
+    logger.info(f"{row_count} rows loaded by {load_method} in {elapsed:.3f}s ({rows_per_sec:.0f} rows/s).")
+    return row_count
+
+
+def is_tab_skip_supported(config):
+    """
+    内容が変わっていないタブの再取込を省略できるかを判定します。
+    取込先が実行ごとに作り直すテーブル (UNLOGGED・一時テーブル方式) の場合は省略できません。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        bool: if_rakuten_cardへ直接取り込む場合 (差分取込、またはステージング方式が table) はTrue
+    """
+    if config.get("IMPORT", "import_mode", fallback=IMPORT_MODE_FULL) == IMPORT_MODE_INCREMENTAL:
+        return True
+    return common.get_staging_mode(config) == common.STAGING_MODE_TABLE
+
+
+def get_unchanged_tabs(cursor, config, manifest, csv_hashes):
+    """
+    前回正常終了した取込とCSVの内容 (SHA-256) が一致し、if_rakuten_cardの件数も記録と一致するタブを求めます。
+
+    Args:
+        cursor: データベースカーソル
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        manifest (run_manifest.RunManifest): 実行マニフェスト
+        csv_hashes (dict): タブ番号をキー、CSVのSHA-256を値とする辞書
+
+    Returns:
+        set: 再取込を省略するタブ番号
+    """
+    candidates = {
+        tab_no for tab_no, sha256 in csv_hashes.items()
+        if (manifest.get_import(tab_no) or {}).get('sha256') == sha256
+    }
+    if not candidates:
+        return set()
+
+    # マニフェストの記録後にテーブルが変更された場合に備え、明細から消えた行を除く件数を確認する
+    cursor.execute("""
+        SELECT tab_no, count(*)
+        FROM if_rakuten_card
+        WHERE account_cd = %s
+          AND tab_no = ANY(%s)
+          AND delta_status <> '9'
+        GROUP BY tab_no
+    """, (common.get_account_cd(config), sorted(candidates)))
+    counts = dict(cursor.fetchall())
+
+    unchanged = set()
+    for tab_no in sorted(candidates):
+        if counts.get(tab_no, 0) == manifest.get_import(tab_no)['rows']:
+            logger.info(f"CSV for tabNo={tab_no} is unchanged since the last import, skipping.")
+            unchanged.add(tab_no)
+        else:
+            logger.info(f"Row count of tabNo={tab_no} does not match the last import, reloading.")
+    common.increment('tabs_skipped', len(unchanged))
+    return unchanged
+
+
+def update_manifest_imports(manifest, config, imported, kept_tab_nos=()):
+    """
+    実行マニフェストの取込結果を、今回の取込内容で更新します。
+    再取込を省略したタブの記録は保持し、それ以外の (今回取り込まなかった) タブの記録は削除します。
+
+    Args:
+        manifest (run_manifest.RunManifest): 実行マニフェスト
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        imported (dict): タブ番号をキー、(CSVのSHA-256, 登録した行数) を値とする辞書
+        kept_tab_nos (iterable, optional): 再取込を省略したタブ番号
+    """
+    if not is_tab_skip_supported(config):
+        manifest.clear_imports()
+        return
+
+    kept = {str(tab_no) for tab_no in kept_tab_nos}
+    manifest.imports = {key: value for key, value in manifest.imports.items() if key in kept}
+    for tab_no, (sha256, rows) in imported.items():
+        manifest.record_import(tab_no, sha256, rows)
+
+
+def prepare_import(cursor, config, kept_tab_nos=()):
+    """
+    取込先のテーブルを準備します (差分取込時は一時テーブル、UNLOGGED・一時テーブル方式では実行ごとのテーブルを作成し、
+    それ以外はアカウントの行を削除します)。
+
+    Args:
+        cursor: データベースカーソル
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        kept_tab_nos (iterable, optional): 再取込を省略するため、行を削除しないタブ番号
+
+    Returns:
+        str: 取込先のテーブル名
+    """
+    account_cd = common.get_account_cd(config)
+    if config.get("IMPORT", "import_mode", fallback=IMPORT_MODE_FULL) == IMPORT_MODE_INCREMENTAL:
+        create_delta_work_table(cursor)
+        return DELTA_WORK_TABLE
+
+    staging_mode = common.get_staging_mode(config)
+    if staging_mode != common.STAGING_MODE_TABLE:
+        target_table = common.get_staging_table(staging_mode, account_cd)
+        create_staging_table(cursor, target_table, staging_mode)
+        return target_table
+
+    clear_if_rakuten_card_table(cursor, account_cd, kept_tab_nos)
+    return STAGING_TABLE
+
+
+def import_tab(cursor, config, tab_no, csv_file_path, target_table, occurrences):
+    """
+    1タブ分のCSVファイルを取込先のテーブルへ登録します。
+
+    Args:
+        cursor: データベースカーソル
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        tab_no (int): CSVの種別を示すタブ番号
+        csv_file_path (str): CSVファイルのパス
+        target_table (str): 取込先のテーブル名 (prepare_importの戻り値)
+        occurrences (dict): 同一内容の行の出現回数 (取込処理全体で共有)
+
+    Returns:
+        int: 登録した行数
+    """
+    csv_prefix = config["RAKUTEN"]["csv_file_nm_prefix"]
+    load_method = config.get("IMPORT", "load_method", fallback=LOAD_METHOD_COPY)
+    reject_dir = config.get("IMPORT", "reject_dir", fallback=config["OUTPUT"]["dir"])
+    os.makedirs(reject_dir, exist_ok=True)
+
+    reject_file_path = os.path.join(reject_dir, f'{csv_prefix}_tab{tab_no}_reject.csv')
+    return load_csv_data(cursor, csv_file_path, tab_no, load_method, target_table, occurrences, reject_file_path,
+                         common.get_account_cd(config))
+
+
+def finish_import(cursor, config, target_table, reloaded_tab_nos=None):
+    """
+    全タブの登録後に、差分の反映または実行ごとのテーブルの統計情報の更新を行います。
+
+    Args:
+        cursor: データベースカーソル
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        target_table (str): 取込先のテーブル名 (prepare_importの戻り値)
+        reloaded_tab_nos (list, optional): 取り込んだタブ番号 (一部のタブの再取込を省略した場合に指定)
+    """
+    if target_table == DELTA_WORK_TABLE:
+        apply_delta(cursor, common.get_account_cd(config), reloaded_tab_nos)
+    elif target_table != STAGING_TABLE:
+        # 作成直後のテーブルは統計情報がない (一時テーブルは自動ANALYZEの対象外) ため、12での読み込み前に更新する
+        cursor.execute(f"ANALYZE {target_table}")
+
+
+def run(config, connection, manifest=None):
+    """
+    CSVファイルをif_rakuten_cardテーブルへインポートします。コミットは呼び出し元で行います。
+    取込・削除の対象は設定オブジェクトのアカウントの行のみです。
+
+    実行マニフェストを指定した場合、前回正常終了した取込とCSVの内容 (SHA-256) が一致するタブは再取込を省略し、
+    取り込んだタブの内容と件数をマニフェストに記録します。マニフェストはコミット後に呼び出し元で保存してください。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        connection: データベース接続
+        manifest (run_manifest.RunManifest, optional): 実行マニフェスト
+    """
+    csv_prefix = config["RAKUTEN"]["csv_file_nm_prefix"]
+    output_dir = config["OUTPUT"]["dir"]
+    tab_skip_supported = manifest is not None and is_tab_skip_supported(config)
+
+    csv_file_paths = {}
+    for tab_no in common.get_tab_nos(config):
+        csv_file_path = os.path.join(output_dir, f'{csv_prefix}_tab{tab_no}.csv')
+        if not os.path.exists(csv_file_path):
+            logger.warning(f'Input file does not exist, skipping: {csv_file_path}')
+            continue
+        csv_file_paths[tab_no] = csv_file_path
+    csv_hashes = {tab_no: file_sha256(path) for tab_no, path in csv_file_paths.items()} if manifest else {}
+
+    with connection.cursor() as cursor:
+        # --- 内容が変わっていないタブの判定 ---
+        unchanged = get_unchanged_tabs(cursor, config, manifest, csv_hashes) if tab_skip_supported else set()
+
+        # --- テーブルクリア ---
+        target_table = prepare_import(cursor, config, unchanged)
+
+        # --- CSVインポート ---
+        occurrences = {}
+        imported = {}
+        tab_nos = list(csv_file_paths)
+        reloaded = [tab_no for tab_no in tab_nos if tab_no not in unchanged]
+        for index, tab_no in enumerate(tab_nos):
+            csv_file_path = csv_file_paths[tab_no]
+            if tab_no in unchanged:
+                # 後続のタブを取り込む場合は、行フィンガープリントのために出現回数のみ数える
+                if any(later in reloaded for later in tab_nos[index + 1:]):
+                    count_occurrences(csv_file_path, tab_no, occurrences)
+                continue
+
+            row_count = import_tab(cursor, config, tab_no, csv_file_path, target_table, occurrences)
+            if manifest is not None:
+                imported[tab_no] = (csv_hashes[tab_no], row_count)
+
+        # --- 差分反映 ---
+        if target_table == DELTA_WORK_TABLE and not reloaded:
+            logger.info("All tabs are unchanged. Skipping delta.")
+        else:
+            finish_import(cursor, config, target_table, reloaded if unchanged else None)
+
+    # --- 取込結果の記録 ---
+    if manifest is not None:
+        update_manifest_imports(manifest, config, imported, unchanged)
 
 
 def main():
     """
     メイン処理
     """
-    connection = None
+    config = None
+    succeeded = False
+    failed_accounts = []
     try:
         # --- 初期設定 ---
         config = common.load_config()
         common.setup_logger(config["LOG"]["path"])
-        csv_prefix = config["RAKUTEN"]["csv_file_nm_prefix"]
-        output_dir = config["OUTPUT"]["dir"]
 
         logger.info('*** 11 importCsvToIfRakutenCard START ***')
 
-        # --- DB接続 ---
-        connection = common.get_db_connection(config)
-        connection.autocommit = False
-        cursor = connection.cursor()
+        for account_cd in common.get_account_cds(config):
+            logger.info(f'Importing account: {account_cd}')
+            common.set_default_labels(account=account_cd)
+            # --- DB接続・トランザクション (アカウントごとに、正常終了時にコミット、例外発生時にロールバック) ---
+            try:
+                account_config = common.get_account_config(config, account_cd)
+                manifest = RunManifest.load(account_config, date.today().isoformat())
+                with common.db_transaction(config) as connection:
+                    run(account_config, connection, manifest)
+                # --- コミット後に取込結果を記録 (12は取込後の内容で再実行が必要) ---
+                manifest.complete_stage('11', ('12',))
+                manifest.save()
+            except Exception as e:
+                if common.is_database_error(e):
+                    logger.error(f'Database error occurred for account {account_cd}: {e}')
+                else:
+                    logger.error(f'An unexpected error occurred for account {account_cd}: {e}')
+                logger.error(traceback.format_exc())
+                failed_accounts.append(account_cd)
 
-        # --- テーブルクリア ---
-        clear_if_rakuten_card_table(cursor)
-
-        # --- CSVインポート ---
-        for tab_no in [0, 1, 2]:
-            csv_file_path = os.path.join(output_dir, f'{csv_prefix}_tab{tab_no}.csv')
-
-            if not os.path.exists(csv_file_path):
-                logger.warning(f'Input file does not exist, skipping: {csv_file_path}')
-                continue
-            
-            insert_csv_data(cursor, csv_file_path, tab_no)
+        succeeded = not failed_accounts
 
-        # --- コミット ---
-        connection.commit()
-        logger.info("Data import committed successfully.")
-
-    except psycopg2.DatabaseError as e:
-        logger.error(f'Database error occurred: {e}')
-        logger.error(traceback.format_exc())
-        if connection:
-            connection.rollback()
-            logger.info("Transaction rolled back.")
-        sys.exit(1)
     except Exception as e:
         logger.error(f'An unexpected error occurred: {e}')
         logger.error(traceback.format_exc())
-        if connection:
-            connection.rollback()
-            logger.info("Transaction rolled back.")
         sys.exit(1)
     finally:
-        if connection:
-            cursor.close()
-            connection.close()
-            logger.info("Database connection closed.")
+        common.close_db_pool()
+        if config is not None:
+            common.write_run_report(config, '11importCsvToIfRakutenCard', succeeded)
         logger.info('*** 11 importCsvToIfRakutenCard END ***')
 
+    if failed_accounts:
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
@@ -1,108 +1,487 @@
 import sys
-import psycopg2
 import traceback
 from logzero import logger
 from datetime import datetime
 import common
+from category_matcher import CategoryMatcher
+from merchant_normalizer import MerchantNormalizer
 
+# --- 定数 ---
+RESOLUTION_TABLE = 'tmp_rakuten_card_resolution'
+MEMO_TABLE = 'merchant_classification_memo'
+# メモのキーとする際に前後から除去する文字 (半角・全角スペース。SQLの btrim と一致させること)
+MEMO_KEY_STRIP_CHARS = ' \u3000'
+FETCH_SIZE = 10000
 
-def get_target_period(cursor):
+# --- 店舗キャッシュ (normalized_key → store_cd) ---
+# 同一プロセス内で繰り返し連携する場合は、前回読み込んだ最大のstore_cd以降のみを追加で読み込む
+_store_cache = {}
+_store_cache_watermark = None
+
+
+def get_target_period(cursor, account_cd=common.DEFAULT_ACCOUNT_CD, table=common.STAGING_TABLE):
     """
-    処理対象となる期間を取得します。
+    処理対象 (未連携: delta_status = '1') となる期間を取得します。
 
     Args:
         cursor: データベースカーソル
+        account_cd (str, optional): アカウントコード
+        table (str, optional): 明細を読み込むステージングテーブル名
 
     Returns:
         tuple: (データ件数, 開始日, 終了日) or (0, None, None)
     """
-    sql = """
+    sql = f"""
         SELECT
             COUNT(*) AS CNT,
             MIN(usage_date) AS START_DATE,
             MAX(usage_date) AS END_DATE
-        FROM if_rakuten_card
+        FROM {table}
+        WHERE account_cd = %s
+          AND delta_status = '1'
     """
-    cursor.execute(sql)
+    common.execute_sql(cursor, f"sel_target_period_{table}", sql, (account_cd,))
     result = cursor.fetchone()
     return result if result else (0, None, None)
 
-def insert_new_stores(cursor):
+def clear_store_cache():
+    """
+    店舗キャッシュを破棄します。常駐して繰り返し連携する場合に、待機中のメモリ使用量を抑えるために使用します。
+    """
+    global _store_cache_watermark
+
+    _store_cache.clear()
+    _store_cache_watermark = None
+
+
+def load_store_cache(cursor, normalizer):
+    """
+    storeテーブルの店舗の正規化キーと店舗コードをキャッシュに読み込みます。
+    2回目以降は前回読み込んだ最大の店舗コードより後に登録された店舗のみを読み込みます。
+    同じ正規化キーの店舗が複数ある場合は、店舗コードが最小のものを使用します。
+    正規化キーが未設定の店舗 (migration/008 の適用前に登録された店舗) は、店舗名から正規化キーを求めます。
+
+    Args:
+        cursor: データベースカーソル
+        normalizer (MerchantNormalizer): 利用店名・商品名の正規化クラス
+
+    Returns:
+        dict: 正規化キーをキー、店舗コードを値とする辞書
+    """
+    global _store_cache_watermark
+
+    if _store_cache_watermark is None:
+        cursor.execute("SELECT store_nm, store_cd, normalized_key FROM store")
+    else:
+        cursor.execute("SELECT store_nm, store_cd, normalized_key FROM store WHERE store_cd > %s",
+                       (_store_cache_watermark,))
+
+    rows = cursor.fetchall()
+    for store_nm, store_cd, normalized_key in rows:
+        key = normalized_key or normalizer.normalize(store_nm)
+        if key not in _store_cache or store_cd < _store_cache[key]:
+            _store_cache[key] = store_cd
+        if _store_cache_watermark is None or store_cd > _store_cache_watermark:
+            _store_cache_watermark = store_cd
+    logger.info(f"{len(rows)} stores loaded into cache ({len(_store_cache)} cached).")
+    return _store_cache
+
+
+def register_new_stores(cursor, new_stores):
+    """
+    キャッシュにない正規化キーの店舗を、正規化キーで検索し、見つからない場合はstoreテーブルに一括登録して店舗コードを取得します。
+    他のアカウントの処理で同時に登録された正規化キーは ON CONFLICT (normalized_key) で読み飛ばし、
+    登録した処理のコミットを待ってから既存の店舗コードを取得します。
+    並行するトランザクションが同じ順序で一意インデックスをロックし、デッドロックしないよう、正規化キーの順に登録します。
+
+    登録した店舗はロールバックされる可能性があるため、キャッシュには追加しません。
+    (コミット後、次回のload_store_cacheで読み込まれます)
+
+    Args:
+        cursor: データベースカーソル
+        new_stores (dict): 正規化キーをキー、登録する店舗名 (最初に出現した利用店名・商品名) を値とする辞書
+
+    Returns:
+        dict: 正規化キーをキー、店舗コードを値とする辞書
+    """
+    if not new_stores:
+        return {}
+
+    # --- キャッシュの読み込み後に登録された店舗を、正規化キーのインデックスで検索 ---
+    cursor.execute("""
+        SELECT normalized_key, min(store_cd)
+        FROM store
+        WHERE normalized_key = ANY(%s)
+        GROUP BY normalized_key
+    """, (list(new_stores),))
+    store_codes = dict(cursor.fetchall())
+
+    missing = {key: nm for key, nm in new_stores.items() if key not in store_codes}
+    if not missing:
+        return store_codes
+
+    # --- 正規化キーが未設定 (または異なる接尾辞の設定で求めた) 既存の店舗を、店舗名で検索 ---
+    names = {nm: key for key, nm in missing.items()}
+    cursor.execute("SELECT store_nm, store_cd FROM store WHERE store_nm = ANY(%s)", (list(names),))
+    store_codes.update((names[store_nm], store_cd) for store_nm, store_cd in cursor.fetchall())
+    missing = {key: nm for key, nm in missing.items() if key not in store_codes}
+    if not missing:
+        return store_codes
+
+    sql = """
+        INSERT INTO store (store_nm, normalized_key)
+        VALUES %s
+        ON CONFLICT (normalized_key) DO NOTHING
+        RETURNING normalized_key, store_cd
+    """
+    from psycopg2.extras import execute_values
+
+    rows = execute_values(cursor, sql, [(nm, key) for key, nm in sorted(missing.items())], fetch=True)
+    store_codes.update(rows)
+    logger.info(f"{len(rows)} new stores inserted.")
+    common.increment('stores_registered', len(rows))
+
+    conflicted = [key for key in missing if key not in store_codes]
+    if conflicted:
+        cursor.execute("SELECT normalized_key, store_cd FROM store WHERE normalized_key = ANY(%s)", (conflicted,))
+        store_codes.update(cursor.fetchall())
+    return store_codes
+
+
+def load_category_matcher(cursor):
+    """
+    category_mapping_configの全マッピングキーから分類用のマッチャーを構築します。
+
+    Args:
+        cursor: データベースカーソル
+
+    Returns:
+        CategoryMatcher: 構築したマッチャー
+    """
+    sql = """
+        SELECT
+            mapping_key_nm, category_cd, linking_excluded_flg
+        FROM
+            category_mapping_config
+    """
+    cursor.execute(sql)
+    matcher = CategoryMatcher(cursor.fetchall())
+    logger.info(f"Category matcher built from {len(matcher)} mapping keys.")
+    return matcher
+
+
+def get_mapping_version(cursor):
     """
-    if_rakuten_cardに存在する新しい店舗名をstoreテーブルに登録します。
+    category_mapping_configの内容全体のチェックサム (MD5) を求めます。
+    マッピングキーの追加・変更・削除で値が変わるため、分類結果のメモの有効性の判定に使用します。
 
     Args:
         cursor: データベースカーソル
+
+    Returns:
+        str: チェックサム
     """
-    logger.info("Inserting new stores into the store table.")
     sql = """
-        INSERT INTO store (store_nm)
-        SELECT DISTINCT
-            irc.merchant_product_name
+        SELECT
+            md5(COALESCE(string_agg(
+                COALESCE(mapping_key_nm, '') || chr(31) || COALESCE(category_cd::text, '') || chr(31)
+                  || COALESCE(linking_excluded_flg, '')
+              , chr(30)
+              ORDER BY mapping_key_nm, category_cd, linking_excluded_flg
+            ), ''))
         FROM
-            if_rakuten_card irc
-        WHERE NOT EXISTS (
-            SELECT 1
-            FROM store s
-            WHERE s.store_nm = irc.merchant_product_name
-        )
+            category_mapping_config
     """
     cursor.execute(sql)
-    logger.info(f"{cursor.rowcount} new stores inserted.")
+    return cursor.fetchone()[0]
+
 
+def get_memo_key(merchant_product_name):
+    """
+    分類結果のメモのキーとする、正規化した利用店名・商品名を返します (前後の半角・全角スペースを除去します)。
+
+    Args:
+        merchant_product_name (str or None): 利用店名・商品名
 
-def insert_account_book_data(cursor):
+    Returns:
+        str or None: メモのキー
+    """
+    return merchant_product_name.strip(MEMO_KEY_STRIP_CHARS) if merchant_product_name is not None else None
+
+
+def load_classification_memo(cursor, mapping_version, account_cd=common.DEFAULT_ACCOUNT_CD, table=common.STAGING_TABLE):
+    """
+    現在のcategory_mapping_configで分類済みの利用店名・商品名のうち、未連携の行に含まれるものの分類結果を読み込みます。
+    異なるバージョン (変更前のcategory_mapping_config) で分類した結果は削除します。
+
+    Args:
+        cursor: データベースカーソル
+        mapping_version (str): category_mapping_configのチェックサム (get_mapping_versionの戻り値)
+        account_cd (str, optional): アカウントコード
+        table (str, optional): 明細を読み込むステージングテーブル名
+
+    Returns:
+        dict: メモのキーをキー、(category_cd, linking_excluded_flg) を値とする辞書
+    """
+    cursor.execute(f"DELETE FROM {MEMO_TABLE} WHERE mapping_version <> %s", (mapping_version,))
+    if cursor.rowcount:
+        logger.info(f"category_mapping_config has changed. {cursor.rowcount} memoized classifications invalidated.")
+
+    cursor.execute(f"""
+        SELECT
+            m.merchant_key, m.category_cd, m.linking_excluded_flg
+        FROM
+            {MEMO_TABLE} m
+        WHERE
+            m.mapping_version = %s
+            AND m.merchant_key IN (
+                SELECT btrim(merchant_product_name, %s)
+                FROM {table}
+                WHERE account_cd = %s
+                  AND delta_status = '1'
+            )
+    """, (mapping_version, MEMO_KEY_STRIP_CHARS, account_cd))
+    memo = {merchant_key: (category_cd, flg) for merchant_key, category_cd, flg in cursor.fetchall()}
+    logger.info(f"{len(memo)} memoized classifications loaded.")
+    return memo
+
+
+def save_classification_memo(cursor, mapping_version, classifications):
+    """
+    新たに分類した利用店名・商品名の分類結果をメモに登録します。
+    他のアカウントの処理で同時に登録された場合は ON CONFLICT で読み飛ばします。
+    並行するトランザクションが同じ順序で一意インデックスをロックし、デッドロックしないよう、キーの順に登録します。
+
+    Args:
+        cursor: データベースカーソル
+        mapping_version (str): 分類に使用したcategory_mapping_configのチェックサム
+        classifications (dict): メモのキーをキー、(category_cd, linking_excluded_flg) を値とする辞書
+    """
+    if not classifications:
+        return
+
+    sql = f"""
+        INSERT INTO {MEMO_TABLE} (merchant_key, category_cd, linking_excluded_flg, mapping_version)
+        VALUES %s
+        ON CONFLICT (merchant_key) DO NOTHING
+    """
+    from psycopg2.extras import execute_values
+
+    execute_values(cursor, sql, [
+        (merchant_key, category_cd, flg, mapping_version)
+        for merchant_key, (category_cd, flg) in sorted(classifications.items())
+    ])
+    logger.info(f"{len(classifications)} new classifications memoized.")
+    common.increment('merchants_classified', len(classifications))
+
+
+def resolve_rakuten_card_rows(cursor, account_cd=common.DEFAULT_ACCOUNT_CD, table=common.STAGING_TABLE, normalizer=None):
+    """
+    未連携のif_rakuten_cardの各行について、マッピングキーによるカテゴリ分類と店舗コードの解決を行い、
+    結果を一時テーブルに登録します。未登録の店舗はこの処理の中でstoreテーブルに登録します。
+    一時テーブルはコミット時に削除されます。
+
+    カテゴリ分類は利用店名・商品名ごとにmerchant_classification_memoへ記録し、メモにない店舗名のみ分類します。
+    マッチャーはメモにない店舗名がある場合にのみ構築します。
+
+    店舗は利用店名・商品名の正規化キー (全角・半角、大文字・小文字、空白、接尾辞の違いを吸収したもの) で検索・登録するため、
+    表記の揺れによる重複した店舗は登録しません。
+
+    Args:
+        cursor: データベースカーソル
+        account_cd (str, optional): アカウントコード
+        table (str, optional): 明細を読み込むステージングテーブル名
+        normalizer (MerchantNormalizer, optional): 利用店名・商品名の正規化クラス。省略時は接尾辞を除去しません。
+    """
+    logger.info("Resolving categories and stores of if_rakuten_card rows.")
+    mapping_version = get_mapping_version(cursor)
+    memo = load_classification_memo(cursor, mapping_version, account_cd, table)
+    new_classifications = {}
+    matcher = None
+    normalizer = normalizer or MerchantNormalizer()
+    store_codes = dict(load_store_cache(cursor, normalizer))
+
+    cursor.execute(f"""
+        CREATE TEMP TABLE {RESOLUTION_TABLE} ON COMMIT DROP AS
+        SELECT
+            irc.if_rakuten_card_seq
+          , cmc.category_cd
+          , cmc.linking_excluded_flg
+          , s.store_cd
+        FROM
+          if_rakuten_card irc
+          CROSS JOIN category_mapping_config cmc
+          CROSS JOIN store s
+        WITH NO DATA
+    """)
+
+    def classify(merchant_product_name):
+        nonlocal matcher
+        merchant_key = get_memo_key(merchant_product_name)
+        if merchant_key is None:
+            return (None, None)
+        classification = memo.get(merchant_key)
+        if classification is None:
+            if matcher is None:
+                matcher = load_category_matcher(cursor)
+            mapping = matcher.match(merchant_key)
+            classification = (None, None) if mapping is None else (mapping[1], mapping[2])
+            memo[merchant_key] = classification
+            new_classifications[merchant_key] = classification
+        return classification
+
+    def resolved_rows(rows):
+        for seq, merchant_product_name in rows:
+            category_cd, linking_excluded_flg = classify(merchant_product_name)
+            yield (seq, category_cd, linking_excluded_flg, store_codes.get(normalizer.normalize(merchant_product_name)))
+
+    # 対象行はサーバーサイドカーソルで一定件数ずつ取得し、解決結果をCOPYで登録する
+    # (COPY実行中は同一接続でFETCHできないため、取得済みの件数単位で登録する)
+    row_count = 0
+    with cursor.connection.cursor(name='rakuten_card_rows') as source:
+        source.execute(f"""
+            SELECT
+                if_rakuten_card_seq, merchant_product_name
+            FROM
+                {table}
+            WHERE
+                account_cd = %s
+                AND delta_status = '1'
+        """, (account_cd,))
+        while True:
+            rows = source.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            new_stores = {}
+            for _, nm in rows:
+                key = normalizer.normalize(nm)
+                if key is not None and key not in store_codes:
+                    new_stores.setdefault(key, nm)
+            store_codes.update(register_new_stores(cursor, new_stores))
+            row_count += common.copy_rows(
+                cursor, RESOLUTION_TABLE,
+                ['if_rakuten_card_seq', 'category_cd', 'linking_excluded_flg', 'store_cd'],
+                resolved_rows(rows),
+            )
+
+    save_classification_memo(cursor, mapping_version, new_classifications)
+    cursor.execute(f"ALTER TABLE {RESOLUTION_TABLE} ADD PRIMARY KEY (if_rakuten_card_seq)")
+    cursor.execute(f"ANALYZE {RESOLUTION_TABLE}")
+    logger.info(f"{row_count} rows resolved.")
+    common.increment('rows_resolved', row_count)
+
+
+def insert_account_book_data(cursor, account_cd=common.DEFAULT_ACCOUNT_CD, table=common.STAGING_TABLE):
     """
     if_rakuten_cardのデータから、household_account_bookテーブルに未登録のデータを登録します。
+    カテゴリと店舗コードはresolve_rakuten_card_rowsで登録した解決結果を参照します。
+
+    登録済みかどうかは取引ごとのフィンガープリント (linking_fingerprint) の一意インデックスで判定します。
+    フィンガープリントは利用日・利用店名・支払総額と、それらが同一の取引内での連番から算出するため、
+    同日・同店舗・同額の別取引も別の行として登録されます。
+    (算出式は migration/002_household_account_book_fingerprint.sql のバックフィルと一致させること)
+    既定のアカウント以外は、別のカードの同日・同店舗・同額の取引と区別するため、先頭にアカウントコードを含めます。
 
     Args:
         cursor: データベースカーソル
+        account_cd (str, optional): アカウントコード
+        table (str, optional): 明細を読み込むステージングテーブル名
     """
     logger.info("Inserting data into household_account_book table.")
-    sql = """
+    sql = f"""
         INSERT INTO household_account_book (
-            actual_date, category_cd, store_cd, amount, remarks, linking_data_type
+            actual_date, category_cd, store_cd, amount, remarks, linking_data_type, linking_fingerprint
         )
-        WITH iv_category_mapping_config AS ( 
+        WITH iv_if_rakuten_card AS (
           SELECT
               irc.if_rakuten_card_seq
+            , irc.usage_date
             , irc.merchant_product_name
-            , cmc.category_cd
-            , cmc.linking_excluded_flg 
+            , irc.total_payment_amount
+            , irc.delta_status
+            , md5(
+                CASE WHEN irc.account_cd = '{common.DEFAULT_ACCOUNT_CD}' THEN '' ELSE irc.account_cd || '|' END
+                || to_char(irc.usage_date, 'YYYY-MM-DD')
+                || '|' || coalesce(irc.merchant_product_name, '')
+                || '|' || coalesce(irc.total_payment_amount::bigint::text, '')
+                || '|' || row_number() OVER (
+                    PARTITION BY irc.usage_date, irc.merchant_product_name, irc.total_payment_amount
+                    ORDER BY irc.if_rakuten_card_seq
+                  )
+              ) AS linking_fingerprint
           FROM
-            category_mapping_config cmc 
-            INNER JOIN if_rakuten_card irc 
-              ON irc.merchant_product_name LIKE '%' || cmc.mapping_key_nm || '%'
-        ) 
+            {table} irc
+          WHERE
+            irc.account_cd = %s
+            AND irc.delta_status <> '9'
+        )
         SELECT
             irc.usage_date                   AS actual_date
-          , coalesce(icmc.category_cd, 1000) AS category_cd
-          , s.store_cd
+          , coalesce(res.category_cd, 1000)  AS category_cd
+          , res.store_cd
           , irc.total_payment_amount         AS amount
           , NULL                             AS remarks
           , 1                                AS linking_data_type 
+          , irc.linking_fingerprint
         FROM
-          if_rakuten_card irc 
-          LEFT OUTER JOIN iv_category_mapping_config icmc 
-            ON icmc.if_rakuten_card_seq = irc.if_rakuten_card_seq 
-          LEFT OUTER JOIN store s 
-            ON s.store_nm = irc.merchant_product_name 
+          iv_if_rakuten_card irc 
+          INNER JOIN {RESOLUTION_TABLE} res 
+            ON res.if_rakuten_card_seq = irc.if_rakuten_card_seq 
         WHERE
-          icmc.linking_excluded_flg IS NULL 
-          AND NOT EXISTS ( 
-            SELECT
-                * 
-            FROM
-              household_account_book hab 
-            WHERE
-              hab.actual_date = irc.usage_date 
-              AND hab.store_cd = s.store_cd 
-              AND hab.amount = irc.total_payment_amount 
-              AND hab.linking_data_type = 1
-          )
+          irc.delta_status = '1'
+          AND res.linking_excluded_flg IS NULL 
+        ON CONFLICT (linking_fingerprint) DO NOTHING
     """
-    cursor.execute(sql)
+    common.execute_sql(cursor, f"ins_household_account_book_{table}", sql, (account_cd,))
     logger.info(f"{cursor.rowcount} records inserted into household_account_book.")
+    common.increment('rows_linked', cursor.rowcount)
+
+
+def staging_table_exists(cursor, table):
+    """
+    ステージングテーブルが存在するかを確認します。
+    一時テーブルは11と同じ接続 (セッション) の場合のみ参照できます。
+
+    Args:
+        cursor: データベースカーソル
+        table (str): テーブル名
+
+    Returns:
+        bool: 存在する場合はTrue
+    """
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+    return cursor.fetchone()[0]
+
+
+def drop_staging_table(cursor, table):
+    """
+    実行ごとのステージングテーブルを削除します。DELETEと異なり不要行やWALを残しません。
+
+    Args:
+        cursor: データベースカーソル
+        table (str): テーブル名
+    """
+    logger.info(f"Dropping staging table {table}.")
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def mark_linked_rows(cursor, account_cd=common.DEFAULT_ACCOUNT_CD):
+    """
+    連携済みとなったif_rakuten_cardの行を処理済み (delta_status = '0') に更新します。
+
+    Args:
+        cursor: データベースカーソル
+        account_cd (str, optional): アカウントコード
+    """
+    logger.info("Marking linked rows in if_rakuten_card.")
+    sql = """
+        UPDATE if_rakuten_card
+        SET delta_status = '0'
+        WHERE account_cd = %s
+          AND delta_status = '1'
+    """
+    common.execute_sql(cursor, "upd_linked_rows", sql, (account_cd,))
+    logger.info(f"{cursor.rowcount} rows marked as linked.")
 
 
 def update_linking_date(cursor):
@@ -118,14 +497,55 @@ def update_linking_date(cursor):
         SET last_linking_date = CURRENT_DATE
         WHERE linking_data_type = 1
     """
-    cursor.execute(sql)
+    common.execute_sql(cursor, "upd_rakuten_linking_date", sql)
+
+
+def run(config, connection):
+    """
+    if_rakuten_cardのデータをマスタや家計簿テーブルに連携します。コミットは呼び出し元で行います。
+    連携の対象は設定オブジェクトのアカウントの行のみです。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        connection: データベース接続
+    """
+    account_cd = common.get_account_cd(config)
+    staging_mode = common.get_staging_mode(config)
+    table = common.get_staging_table(staging_mode, account_cd)
+    with connection.cursor() as cursor:
+        if staging_mode != common.STAGING_MODE_TABLE and not staging_table_exists(cursor, table):
+            logger.warning(f"Staging table {table} does not exist. With staging_mode = {staging_mode}, "
+                           "run 11 beforehand (temp requires running 11 and 12 in one session via recsav_batch.py).")
+            return
+
+        # --- 処理対象期間の取得 ---
+        count, start_date, end_date = get_target_period(cursor, account_cd, table)
+        if count == 0:
+            logger.info(f"No data to process in {table} for account {account_cd}. Exiting.")
+        else:
+            logger.info(f"Processing data for period: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
+
+            # --- データ連携処理 ---
+            with common.timer('resolve_rows'):
+                resolve_rakuten_card_rows(cursor, account_cd, table, MerchantNormalizer.from_config(config))
+            insert_account_book_data(cursor, account_cd, table)
+            update_linking_date(cursor)
+
+        # --- 連携済みの反映 (実行ごとのステージングテーブルは削除) ---
+        if staging_mode == common.STAGING_MODE_TABLE:
+            if count:
+                mark_linked_rows(cursor, account_cd)
+        else:
+            drop_staging_table(cursor, table)
 
 
 def main():
     """
     メイン処理
     """
-    connection = None
+    config = None
+    succeeded = False
+    failed_accounts = []
     try:
         # --- 初期設定 ---
         config = common.load_config()
@@ -133,48 +553,35 @@ def main():
 
         logger.info('*** 12 ifRakutenCardToRecsav START ***')
 
-        # --- DB接続 ---
-        connection = common.get_db_connection(config)
-        connection.autocommit = False
-        cursor = connection.cursor()
+        for account_cd in common.get_account_cds(config):
+            logger.info(f'Linking account: {account_cd}')
+            common.set_default_labels(account=account_cd)
+            # --- DB接続・トランザクション (アカウントごとに、正常終了時にコミット、例外発生時にロールバック) ---
+            try:
+                with common.db_transaction(config) as connection:
+                    run(common.get_account_config(config, account_cd), connection)
+            except Exception as e:
+                if common.is_database_error(e):
+                    logger.error(f'Database error occurred for account {account_cd}: {e}')
+                else:
+                    logger.error(f'An unexpected error occurred for account {account_cd}: {e}')
+                logger.error(traceback.format_exc())
+                failed_accounts.append(account_cd)
 
-        # --- 処理対象期間の取得 ---
-        count, start_date, end_date = get_target_period(cursor)
-        if count == 0:
-            logger.info("No data to process in if_rakuten_card. Exiting.")
-            return
-
-        logger.info(f"Processing data for period: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-
-        # --- データ連携処理 ---
-        insert_new_stores(cursor)
-        insert_account_book_data(cursor)
-        update_linking_date(cursor)
+        succeeded = not failed_accounts
 
-        # --- コミット ---
-        connection.commit()
-        logger.info("Data processing committed successfully.")
-
-    except psycopg2.DatabaseError as e:
-        logger.error(f'Database error occurred: {e}')
-        logger.error(traceback.format_exc())
-        if connection:
-            connection.rollback()
-            logger.info("Transaction rolled back.")
-        sys.exit(1)
     except Exception as e:
         logger.error(f'An unexpected error occurred: {e}')
         logger.error(traceback.format_exc())
-        if connection:
-            connection.rollback()
-            logger.info("Transaction rolled back.")
         sys.exit(1)
     finally:
-        if connection:
-            cursor.close()
-            connection.close()
-            logger.info("Database connection closed.")
+        common.close_db_pool()
+        if config is not None:
+            common.write_run_report(config, '12ifRakutenCardToRecsav', succeeded)
         logger.info('*** 12 ifRakutenCardToRecsav END ***')
 
+    if failed_accounts:
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
@@ -1,5 +1,4 @@
 import sys
-import psycopg2
 import traceback
 import argparse
 from logzero import logger
@@ -8,13 +7,29 @@ from dateutil.relativedelta import relativedelta
 import common
 
 
-def get_execution_date():
+def parse_date(value):
     """
-    コマンドライン引数から実行日を取得します。
-    引数がない場合は、本日の日付を返します。
+    YYYY-MM-DD形式の文字列を日付に変換します。形式が不正な場合は終了します。
+
+    Args:
+        value (str): 日付の文字列
 
     Returns:
-        datetime.date: 実行日
+        datetime.date: 日付
+    """
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        logger.error("Invalid date format. Please use YYYY-MM-DD.")
+        sys.exit(1)
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析します。
+
+    Returns:
+        argparse.Namespace: 解析結果
     """
     parser = argparse.ArgumentParser(description='定期的な情報をRECSAVに登録します。')
     parser.add_argument(
@@ -22,102 +37,175 @@ def get_execution_date():
         type=str, 
         help='YYYY-MM-DD形式で実行日を指定します。例: --date 2023-01-01'
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        '--backfill',
+        action='store_true',
+        help='前回の登録日以降に登録されていない月初をすべて登録します。'
+    )
+    parser.add_argument(
+        '--assets-only',
+        action='store_true',
+        help='資産データのみ、最新の登録月の翌月から --to (省略時は本日) までの月初へ繰り越します。'
+    )
+    parser.add_argument(
+        '--from',
+        dest='date_from',
+        type=str,
+        help='登録する期間の開始日 (YYYY-MM-DD)。省略時は前回の登録日の翌月初です。指定した場合は --backfill を有効にします。'
+    )
+    parser.add_argument(
+        '--to',
+        dest='date_to',
+        type=str,
+        help='登録する期間の終了日 (YYYY-MM-DD)。省略時は本日です。指定した場合は --backfill を有効にします。'
+    )
+    return parser.parse_args()
+
 
+def get_execution_date(args):
+    """
+    コマンドライン引数から実行日を取得します。
+    引数がない場合は、本日の日付を返します。
+
+    Args:
+        args (argparse.Namespace): コマンドライン引数
+
+    Returns:
+        datetime.date: 実行日
+    """
     if args.date:
-        try:
-            return datetime.strptime(args.date, '%Y-%m-%d').date()
-        except ValueError:
-            logger.error("Invalid date format. Please use YYYY-MM-DD.")
-            sys.exit(1)
+        return parse_date(args.date)
     else:
         return datetime.today().date()
 
 
-def delete_existing_recurring_data(cursor, exec_date):
+def get_last_linking_date(cursor):
     """
-    指定された実行日の定期支出データを削除します。
+    linking_dataテーブルから定期支出の最終連携日を取得します。
 
     Args:
         cursor: データベースカーソル
-        exec_date (datetime.date): 実行日
+
+    Returns:
+        datetime.date or None: 最終連携日。未登録の場合はNone
     """
-    logger.info(f"Deleting existing recurring data for date: {exec_date}")
-    sql = """
-        DELETE FROM household_account_book
-        WHERE actual_date = %s
-          AND linking_data_type = 0
+    cursor.execute("SELECT last_linking_date FROM linking_data WHERE linking_data_type = 0")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def get_target_months(date_from, date_to):
     """
-    cursor.execute(sql, (exec_date,))
-    logger.info(f"{cursor.rowcount} records deleted.")
+    指定された期間に含まれる月初の日付を返します。
 
-def delete_existing_asset_data(cursor, exec_date):
+    Args:
+        date_from (datetime.date): 開始日
+        date_to (datetime.date): 終了日
+
+    Returns:
+        list: 月初の日付 (datetime.date) のリスト
     """
-    指定された実行日の資産データを削除します。
+    month = date_from.replace(day=1)
+    if month < date_from:
+        month += relativedelta(months=1)
+    months = []
+    while month <= date_to:
+        months.append(month)
+        month += relativedelta(months=1)
+    return months
+
+
+def delete_existing_recurring_data(cursor, exec_dates):
+    """
+    指定された実行日の定期支出データを1回のDELETEで削除します。
 
     Args:
         cursor: データベースカーソル
-        exec_date (datetime.date): 実行日
+        exec_dates (list): 実行日 (datetime.date) のリスト
     """
-    logger.info(f"Deleting existing asset data for date: {exec_date}")
+    logger.info(f"Deleting existing recurring data for dates: {', '.join(map(str, exec_dates))}")
     sql = """
-        DELETE FROM asset
-        WHERE asset_year_month = %s
+        DELETE FROM household_account_book
+        WHERE actual_date = ANY(%s::date[])
+          AND linking_data_type = 0
     """
-    cursor.execute(sql, (exec_date,))
+    common.execute_sql(cursor, "del_recurring_household_account_book", sql, (list(exec_dates),))
     logger.info(f"{cursor.rowcount} records deleted.")
 
-def fetch_recurring_configs(cursor):
+def has_recurring_configs(cursor):
     """
-    登録対象の定期支出設定を取得します。
+    登録対象の定期支出設定が存在するかを判定します。
 
     Args:
         cursor: データベースカーソル
 
     Returns:
-        list: 定期支出設定のリスト
+        bool: 有効な毎月実行の定期支出設定が存在する場合はTrue
     """
     logger.info("Fetching recurring configurations.")
     sql = """
-        SELECT
-            category_cd, store_cd, amount, remarks, linking_data_type
-        FROM
-            recurring_config
-        WHERE
-            execution_interval_type = '1' -- 毎月実行
-            AND active_flg = '1'
+        SELECT EXISTS (
+            SELECT 1
+            FROM recurring_config
+            WHERE
+                execution_interval_type = '1' -- 毎月実行
+                AND active_flg = '1'
+        )
     """
     cursor.execute(sql)
-    return cursor.fetchall()
+    return cursor.fetchone()[0]
 
 
-def insert_recurring_data(cursor, exec_date, recurring_data):
+def insert_recurring_data(cursor, exec_dates):
     """
-    取得した定期支出データを家計簿テーブルに登録します。
+    有効な毎月実行の定期支出設定を、実行日ごとに家計簿テーブルへ登録します。
+    recurring_config と実行日の組み合わせを1回の INSERT ... SELECT で登録します。
 
     Args:
         cursor: データベースカーソル
-        exec_date (datetime.date): 実行日
-        recurring_data (list): 登録するデータのリスト
+        exec_dates (list): 実行日 (datetime.date) のリスト
+
     """
-    logger.info(f"Registering {len(recurring_data)} recurring data entries.")
+    logger.info("Registering recurring data.")
     insert_sql = """
         INSERT INTO household_account_book (
             actual_date, category_cd, store_cd, amount, remarks, linking_data_type
-        ) VALUES (%s, %s, %s, %s, %s, %s)
+        )
+        SELECT
+            exec_date, rc.category_cd, rc.store_cd, rc.amount, rc.remarks, rc.linking_data_type
+        FROM
+            unnest(%s::date[]) AS target(exec_date)
+            CROSS JOIN recurring_config rc
+        WHERE
+            rc.execution_interval_type = '1' -- 毎月実行
+            AND rc.active_flg = '1'
+    """
+    common.execute_sql(cursor, "ins_recurring_household_account_book", insert_sql, (list(exec_dates),))
+    common.increment('recurring_rows_inserted', cursor.rowcount)
+    logger.info(f"{cursor.rowcount} recurring data entries have been registered.")
+
+def get_latest_asset_month(cursor):
+    """
+    資産データが登録されている最新の年月を取得します。
+
+    Args:
+        cursor: データベースカーソル
+
+    Returns:
+        datetime.date or None: 最新の asset_year_month。資産データがない場合はNone
     """
-    
-    for record in recurring_data:
-        cursor.execute(insert_sql, (exec_date,) + record)
-    logger.info("All recurring data has been registered.")
+    cursor.execute("SELECT max(asset_year_month) FROM asset")
+    return cursor.fetchone()[0]
 
-def insert_asset_data(cursor, exec_date):
+def insert_asset_data(cursor, exec_dates):
     """
-    前月の資産データをコピーし、当月の資産データとしてテーブルに登録します。
+    各実行日より前で最新の月の資産データをコピーし、実行日の資産データとして金額0で登録します。
+    複数の実行日を1回の INSERT ... SELECT で登録し、既に登録されている口座の行は変更しません (再実行時も入力済みの金額を保持します)。
+    コピー元はテーブルに登録済みの行のみのため、未登録の月が続く場合も各月へ同じ月の口座がコピーされます。
 
     Args:
         cursor: データベースカーソル
-        exec_date (datetime.date): 実行日
+        exec_dates (list): 実行日 (datetime.date) のリスト
     """
     logger.info(f"Copy and register the asset data from last month.")
     insert_sql = """
@@ -127,96 +215,209 @@ def insert_asset_data(cursor, exec_date):
           , asset_amount
         ) 
         SELECT
-            %s
-          , deposit_account_cd
+            target.exec_date
+          , asset.deposit_account_cd
           , 0 
         FROM
-          asset 
-        WHERE
-          asset_year_month = %s;
-
+          unnest(%s::date[]) AS target(exec_date)
+          CROSS JOIN LATERAL ( 
+            SELECT
+              max(asset_year_month) AS source_month 
+            FROM
+              asset 
+            WHERE
+              asset_year_month < target.exec_date
+          ) source
+          INNER JOIN asset 
+            ON asset.asset_year_month = source.source_month
+        ON CONFLICT (asset_year_month, deposit_account_cd) DO NOTHING
     """
-    one_month_ago = exec_date - relativedelta(months=1)
+    common.execute_sql(cursor, "ins_asset", insert_sql, (list(exec_dates),))
+    common.increment('asset_rows_inserted', cursor.rowcount)
+    logger.info(f"{cursor.rowcount} asset records registered.")
 
-    cursor.execute(insert_sql, (exec_date, datetime.strftime(one_month_ago, "%Y-%m-%d")))
-
-def update_linking_date(cursor):
+def update_linking_date(cursor, linked_date=None):
     """
     linking_dataテーブルの最終連携日時を更新します。
 
     Args:
         cursor: データベースカーソル
+        linked_date (datetime.date, optional): 登録済みとする最後の日付。省略時は本日で更新します。
+            指定した場合、最終連携日を過去の日付に戻すことはありません。
     """
     logger.info("Updating last linking date.")
+    if linked_date is None:
+        sql = """
+            UPDATE linking_data
+            SET last_linking_date = CURRENT_DATE
+            WHERE linking_data_type = 0
+        """
+        cursor.execute(sql)
+        return
+
     sql = """
         UPDATE linking_data
-        SET last_linking_date = CURRENT_DATE
+        SET last_linking_date = GREATEST(COALESCE(last_linking_date, %s), %s)
         WHERE linking_data_type = 0
     """
-    cursor.execute(sql)
+    cursor.execute(sql, (linked_date, linked_date))
+
+
+def register_months(cursor, exec_dates):
+    """
+    指定された月初の定期支出と資産データを、月ごとの削除・登録をまとめて登録します。
+
+    Args:
+        cursor: データベースカーソル
+        exec_dates (list): 実行日 (月初の datetime.date) のリスト
+
+    Returns:
+        bool: 有効な定期支出設定があり、登録を行った場合はTrue
+    """
+    if not has_recurring_configs(cursor):
+        logger.info("No active recurring configurations found. Exiting.")
+        return False
+
+    delete_existing_recurring_data(cursor, exec_dates)
+    insert_recurring_data(cursor, exec_dates)
+
+    insert_asset_data(cursor, exec_dates)
+    return True
+
+
+def run(config, connection, execution_date):
+    """
+    実行日が月初の場合に、定期支出と資産データを登録します。コミットは呼び出し元で行います。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+        connection: データベース接続
+        execution_date (datetime.date): 実行日
+    """
+    # --- 実行判定 ---
+    if execution_date.day != 1:
+        logger.info(f"Skipping process because it is not the first day of the month. Execution date: {execution_date}")
+        return
+
+    with connection.cursor() as cursor:
+        # --- データ処理 ---
+        if register_months(cursor, [execution_date]):
+            update_linking_date(cursor)
+
+
+def run_backfill(config, connection, date_from=None, date_to=None):
+    """
+    期間内の月初のうち、登録されていない月の定期支出と資産データを1トランザクションでまとめて登録します。
+    コミットは呼び出し元で行います。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+        connection: データベース接続
+        date_from (datetime.date, optional): 開始日。省略時は最終連携日の翌日
+        date_to (datetime.date, optional): 終了日。省略時は本日
+
+    Raises:
+        ValueError: 開始日が省略され、最終連携日も登録されていない場合
+    """
+    date_to = date_to or datetime.today().date()
+    with connection.cursor() as cursor:
+        if date_from is None:
+            last_linking_date = get_last_linking_date(cursor)
+            if last_linking_date is None:
+                raise ValueError("last_linking_date is not set. Please specify --from.")
+            date_from = last_linking_date + relativedelta(days=1)
+
+        exec_dates = get_target_months(date_from, date_to)
+        if not exec_dates:
+            logger.info(f"No missed first day of the month between {date_from} and {date_to}.")
+            return
+
+        logger.info(f"Backfilling {len(exec_dates)} month(s): {exec_dates[0]} - {exec_dates[-1]}")
+        if register_months(cursor, exec_dates):
+            update_linking_date(cursor, exec_dates[-1])
+
+
+def run_asset_carry_forward(config, connection, date_to=None):
+    """
+    資産データが登録されている最新の月の翌月初から終了日までの月初へ、資産データを1回のINSERTで繰り越します。
+    定期支出の登録は行いません。コミットは呼び出し元で行います。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+        connection: データベース接続
+        date_to (datetime.date, optional): 終了日。省略時は本日
+    """
+    date_to = date_to or datetime.today().date()
+    with connection.cursor() as cursor:
+        latest_month = get_latest_asset_month(cursor)
+        if latest_month is None:
+            logger.info("No asset data found. Nothing to carry forward.")
+            return
+
+        exec_dates = get_target_months(latest_month + relativedelta(days=1), date_to)
+        if not exec_dates:
+            logger.info(f"Asset data is already registered up to {latest_month}.")
+            return
+
+        logger.info(f"Carrying asset data forward to {len(exec_dates)} month(s): {exec_dates[0]} - {exec_dates[-1]}")
+        insert_asset_data(cursor, exec_dates)
 
 
 def main():
     """
     メイン処理
     """
-    connection = None
+    config = None
+    succeeded = False
     try:
         # --- 初期設定 ---
         config = common.load_config()
         common.setup_logger(config["LOG"]["path"])
-        
-        logger.info('*** 90 RecsavRecurringInput START ***')
 
-        # --- 実行日取得＆実行判定 ---
-        execution_date = get_execution_date()
-        if execution_date.day != 1:
-            logger.info(f"Skipping process because it is not the first day of the month. Execution date: {execution_date}")
-            return
-
-        # --- DB接続 ---
-        connection = common.get_db_connection(config)
-        connection.autocommit = False
-        cursor = connection.cursor()
+        logger.info('*** 90 RecsavRecurringInput START ***')
 
-        # --- データ処理 ---
-        delete_existing_recurring_data(cursor, execution_date)
-        recurring_configs = fetch_recurring_configs(cursor)
+        args = parse_args()
 
-        if not recurring_configs:
-            logger.info("No active recurring configurations found. Exiting.")
+        # --- 資産データのみ、未登録の月へまとめて繰り越し ---
+        if args.assets_only:
+            date_to = parse_date(args.date_to) if args.date_to else None
+            with common.db_transaction(config) as connection:
+                run_asset_carry_forward(config, connection, date_to)
+            succeeded = True
             return
 
-        insert_recurring_data(cursor, execution_date, recurring_configs)
-
-        delete_existing_asset_data(cursor, execution_date)
-        insert_asset_data(cursor, execution_date)
+        # --- 期間指定の場合は、未登録の月初をまとめて登録 ---
+        if args.backfill or args.date_from or args.date_to:
+            date_from = parse_date(args.date_from) if args.date_from else None
+            date_to = parse_date(args.date_to) if args.date_to else None
+            with common.db_transaction(config) as connection:
+                run_backfill(config, connection, date_from, date_to)
+            succeeded = True
+            return
 
-        update_linking_date(cursor)
+        # --- 実行日取得＆実行判定 ---
+        execution_date = get_execution_date(args)
+        if execution_date.day != 1:
+            logger.info(f"Skipping process because it is not the first day of the month. Execution date: {execution_date}")
+            succeeded = True
+            return
 
-        # --- コミット ---
-        connection.commit()
-        logger.info("Transaction committed successfully.")
+        # --- DB接続・トランザクション (正常終了時にコミット、例外発生時にロールバック) ---
+        with common.db_transaction(config) as connection:
+            run(config, connection, execution_date)
+        succeeded = True
 
-    except psycopg2.DatabaseError as e:
-        logger.error(f'Database error occurred: {e}')
-        logger.error(traceback.format_exc())
-        if connection:
-            connection.rollback()
-            logger.info("Transaction rolled back.")
-        sys.exit(1)
     except Exception as e:
-        logger.error(f'An unexpected error occurred: {e}')
+        if common.is_database_error(e):
+            logger.error(f'Database error occurred: {e}')
+        else:
+            logger.error(f'An unexpected error occurred: {e}')
         logger.error(traceback.format_exc())
-        if connection:
-            connection.rollback()
-            logger.info("Transaction rolled back.")
         sys.exit(1)
     finally:
-        if connection:
-            cursor.close()
-            connection.close()
-            logger.info("Database connection closed.")
+        common.close_db_pool()
+        if config is not None:
+            common.write_run_report(config, '90RecsavRecurringInput', succeeded)
         logger.info('*** 90 RecsavRecurringInput END ***')
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+
+# リポジトリ直下のモジュールを読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import common
+
+import_csv = importlib.import_module('11importCsvToIfRakutenCard')
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析します。
+
+    Returns:
+        argparse.Namespace: 解析結果
+    """
+    parser = argparse.ArgumentParser(description='if_rakuten_cardへのCSV登録方式 (COPY / INSERT) の処理速度を比較します。')
+    parser.add_argument('csv_file', help='計測に使用する楽天カード明細CSVファイル')
+    parser.add_argument('--tab-no', type=int, default=0, help='CSVの種別を示すタブ番号 (既定: 0)')
+    parser.add_argument('--repeat', type=int, default=3, help='各方式の計測回数 (既定: 3)')
+    return parser.parse_args()
+
+
+def measure(connection, csv_file, tab_no, load_method):
+    """
+    指定された登録方式でCSVを登録し、処理時間を計測します。
+    計測後はロールバックするため、テーブルの内容は変更されません。
+
+    Args:
+        connection: データベース接続
+        csv_file (str): CSVファイルのパス
+        tab_no (int): CSVの種別を示すタブ番号
+        load_method (str): 登録方式
+
+    Returns:
+        tuple: (登録行数, 処理時間[秒])
+    """
+    cursor = connection.cursor()
+    try:
+        start_time = time.perf_counter()
+        row_count = import_csv.load_csv_data(cursor, csv_file, tab_no, load_method)
+        elapsed = time.perf_counter() - start_time
+    finally:
+        connection.rollback()
+        cursor.close()
+    return row_count, elapsed
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    config = common.load_config()
+    connection = common.get_db_connection(config)
+    connection.autocommit = False
+
+    try:
+        print(f"{'method':<8} {'rows':>10} {'best[s]':>10} {'rows/s':>12}")
+        for load_method in (import_csv.LOAD_METHOD_INSERT, import_csv.LOAD_METHOD_COPY):
+            results = [measure(connection, args.csv_file, args.tab_no, load_method) for _ in range(args.repeat)]
+            row_count = results[0][0]
+            best = min(elapsed for _, elapsed in results)
+            rows_per_sec = row_count / best if best > 0 else 0
+            print(f"{load_method:<8} {row_count:>10} {best:>10.3f} {rows_per_sec:>12.0f}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
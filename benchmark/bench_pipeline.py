@@ -0,0 +1,316 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import subprocess
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+# リポジトリ直下のモジュールを読み込めるようにする
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import common
+from generate_rakuten_csv import generate_statement_csvs, generate_merchant_names, generate_mapping_keys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- 定数 ---
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(BENCH_DIR, 'schema.sql')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+DEFAULT_SIZES = [1000, 100000, 1000000]
+DEFAULT_MAPPING_KEYS = 10000
+DEFAULT_MERCHANTS = 5000
+# 事前にstoreへ登録しておく店舗名の割合 (残りは12の処理中に新規登録される)
+PRELOADED_STORE_RATIO = 0.5
+STATEMENT_LABEL_LENGTH = 80
+VALUES_PATTERN = re.compile(r'\sVALUES\s', re.IGNORECASE)
+EXECUTE_PATTERN = re.compile(r'^(EXECUTE\s+\w+)', re.IGNORECASE)
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析します。
+
+    Returns:
+        argparse.Namespace: 解析結果
+    """
+    parser = argparse.ArgumentParser(description='合成データで11 (CSV取込) と12 (家計簿連携) の処理性能を計測し、結果をJSONで保存します。')
+    parser.add_argument('--dsn', default=os.environ.get('RECSAV_BENCH_DSN', 'dbname=recsav_bench'),
+                        help='計測に使用する使い捨てのPostgreSQLの接続文字列 (既定: 環境変数 RECSAV_BENCH_DSN または dbname=recsav_bench)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='計測する明細行数 (既定: 1000 100000 1000000)')
+    parser.add_argument('--mapping-keys', type=int, default=DEFAULT_MAPPING_KEYS, help='category_mapping_configのキー数 (既定: 10000)')
+    parser.add_argument('--merchants', type=int, default=DEFAULT_MERCHANTS, help='利用店名・商品名の種類数 (既定: 5000)')
+    parser.add_argument('--load-methods', nargs='+', default=['insert', 'copy'], choices=['insert', 'copy'],
+                        help='計測する11の登録方式。最後の方式で登録したデータを12の計測に使用します (既定: insert copy)')
+    parser.add_argument('--encoding', default='utf-8', help='生成するCSVの文字コード (既定: utf-8)')
+    parser.add_argument('--seed', type=int, default=0, help='乱数のシード (既定: 0)')
+    parser.add_argument('--output', help='結果のJSONファイルのパス (既定: benchmark/results/pipeline_日時.json)')
+    parser.add_argument('--keep-schema', action='store_true', help='計測後にベンチマーク用のスキーマを削除しません。')
+    return parser.parse_args()
+
+
+def create_timing_cursor_class():
+    """
+    SQL文ごとの実行回数と処理時間を集計するカーソルクラスを生成します。
+    準備済み文は EXECUTE 文の名前、複数行の INSERT は VALUES より前の部分で集計します。
+
+    Returns:
+        type: psycopg2のカーソルクラス (stats 属性に {SQL文: [実行回数, 処理時間[秒]]} を保持)
+    """
+    import psycopg2.extensions
+
+    def label_of(query):
+        if isinstance(query, bytes):
+            query = query[:1024].decode('utf-8', errors='replace')
+        query = ' '.join(str(query).split())
+        match = EXECUTE_PATTERN.match(query)
+        if match:
+            return match.group(1)
+        match = VALUES_PATTERN.search(query)
+        if match:
+            query = query[:match.start()] + ' VALUES ...'
+        return query[:STATEMENT_LABEL_LENGTH]
+
+    class TimingCursor(psycopg2.extensions.cursor):
+        stats = {}
+
+        def _record(self, query, start_time):
+            entry = self.stats.setdefault(label_of(query), [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start_time
+
+        def execute(self, query, vars=None):
+            start_time = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                self._record(query, start_time)
+
+        def copy_expert(self, sql, file, size=8192):
+            start_time = time.perf_counter()
+            try:
+                return super().copy_expert(sql, file, size)
+            finally:
+                self._record(sql, start_time)
+
+    return TimingCursor
+
+
+def get_peak_rss_mb():
+    """
+    プロセスの最大メモリ使用量 (peak RSS) を取得します。
+
+    Returns:
+        float or None: 最大メモリ使用量[MB]。取得できない環境ではNone
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def create_bench_schema(cursor, schema, mapping_keys, merchant_names):
+    """
+    ベンチマーク用のスキーマとテーブルを作成し、マッピングキーと既存店舗を登録します。
+
+    Args:
+        cursor: データベースカーソル
+        schema (str): スキーマ名
+        mapping_keys (list): (mapping_key_nm, category_cd, linking_excluded_flg) のリスト
+        merchant_names (list): 利用店名・商品名のリスト
+    """
+    cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    cursor.execute(f"SET search_path TO {schema}")
+    with open(SCHEMA_FILE, encoding='utf-8') as f:
+        cursor.execute(f.read())
+
+    common.copy_rows(cursor, 'category_mapping_config',
+                     ['mapping_key_nm', 'category_cd', 'linking_excluded_flg'], mapping_keys)
+    preloaded = merchant_names[:int(len(merchant_names) * PRELOADED_STORE_RATIO)]
+    common.copy_rows(cursor, 'store', ['store_nm'], ((nm,) for nm in preloaded))
+    cursor.execute("ANALYZE")
+
+
+def timed(steps, name, row_count, func, *args):
+    """
+    関数を実行して処理時間を計測し、結果を steps に追加します。
+
+    Args:
+        steps (dict): 計測結果の辞書
+        name (str): 計測項目名
+        row_count (int or None): 処理行数 (Noneの場合は関数の戻り値)
+        func (callable): 実行する関数
+        *args: 関数の引数
+
+    Returns:
+        object: 関数の戻り値
+    """
+    start_time = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start_time
+    rows = row_count if row_count is not None else result
+    steps[name] = {
+        'rows': rows,
+        'seconds': round(elapsed, 4),
+        'rows_per_sec': round(rows / elapsed) if elapsed > 0 else None,
+    }
+    return result
+
+
+def run_size(dsn, row_count, mapping_key_count, merchant_count, load_methods, encoding, seed, keep_schema):
+    """
+    指定された行数で11・12の処理を計測します。最大メモリ使用量を行数ごとに計測するため、別プロセスで実行します。
+
+    Args:
+        dsn (str): PostgreSQLの接続文字列
+        row_count (int): 明細行数
+        mapping_key_count (int): マッピングキー数
+        merchant_count (int): 利用店名・商品名の種類数
+        load_methods (list): 計測する11の登録方式
+        encoding (str): 生成するCSVの文字コード
+        seed (int): 乱数のシード
+        keep_schema (bool): 計測後にスキーマを残すか
+
+    Returns:
+        dict: 計測結果
+    """
+    import psycopg2
+
+    import_csv = importlib.import_module('11importCsvToIfRakutenCard')
+    link = importlib.import_module('12ifRakutenCardToRecsav')
+
+    schema = f"recsav_bench_{row_count}"
+    work_dir = tempfile.mkdtemp(prefix='recsav_bench_')
+    cursor_class = create_timing_cursor_class()
+    connection = psycopg2.connect(dsn, cursor_factory=cursor_class)
+    steps = {}
+    try:
+        # --- データ準備 (計測対象外) ---
+        merchant_names = generate_merchant_names(merchant_count, seed)
+        paths = generate_statement_csvs(work_dir, row_count, merchant_count, encoding=encoding, seed=seed)
+        with connection.cursor() as cursor:
+            create_bench_schema(cursor, schema, generate_mapping_keys(mapping_key_count, seed), merchant_names)
+        connection.commit()
+        cursor_class.stats.clear()
+
+        # --- 11: CSV取込 (最後の方式以外はロールバック) ---
+        for i, load_method in enumerate(load_methods):
+            with connection.cursor() as cursor:
+                def load_all():
+                    return sum(import_csv.load_csv_data(cursor, path, tab_no, load_method) for tab_no, path in paths.items())
+                timed(steps, f'11_load_csv_{load_method}', None, load_all)
+            if i < len(load_methods) - 1:
+                connection.rollback()
+            else:
+                connection.commit()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE if_rakuten_card")
+        connection.commit()
+
+        # --- 12: 店舗登録・カテゴリ解決・家計簿登録 ---
+        register_stats = {'rows': 0, 'seconds': 0.0}
+        register_new_stores = link.register_new_stores
+
+        def timed_register_new_stores(cursor, new_stores):
+            start_time = time.perf_counter()
+            result = register_new_stores(cursor, new_stores)
+            register_stats['seconds'] += time.perf_counter() - start_time
+            register_stats['rows'] += len(new_stores)
+            return result
+
+        link.register_new_stores = timed_register_new_stores
+        try:
+            with connection.cursor() as cursor:
+                timed(steps, '12_resolve_rakuten_card_rows', row_count, link.resolve_rakuten_card_rows, cursor)
+                steps['12_register_new_stores'] = {
+                    'rows': register_stats['rows'],
+                    'seconds': round(register_stats['seconds'], 4),
+                    'rows_per_sec': round(register_stats['rows'] / register_stats['seconds']) if register_stats['seconds'] > 0 else None,
+                }
+                timed(steps, '12_insert_account_book_data', row_count, link.insert_account_book_data, cursor)
+            connection.commit()
+        finally:
+            link.register_new_stores = register_new_stores
+
+        statements = sorted(
+            ({'statement': label, 'calls': calls, 'seconds': round(seconds, 4)}
+             for label, (calls, seconds) in cursor_class.stats.items()),
+            key=lambda s: -s['seconds'],
+        )
+        return {
+            'rows': row_count,
+            'steps': steps,
+            'statements': statements,
+            'peak_rss_mb': get_peak_rss_mb(),
+        }
+    finally:
+        if not keep_schema and not connection.closed:
+            connection.rollback()
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            connection.commit()
+        connection.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def get_git_commit():
+    """
+    計測したソースのコミットハッシュを取得します。
+
+    Returns:
+        str or None: コミットハッシュ。取得できない場合はNone
+    """
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    results = []
+    print(f"{'rows':>10} {'step':<32} {'seconds':>10} {'rows/s':>12}")
+    for row_count in args.sizes:
+        # 最大メモリ使用量を行数ごとに計測するため、行数ごとに新しいプロセスで実行する
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(run_size, args.dsn, row_count, args.mapping_keys, args.merchants,
+                                     args.load_methods, args.encoding, args.seed, args.keep_schema).result()
+        results.append(result)
+        for name, step in result['steps'].items():
+            print(f"{row_count:>10} {name:<32} {step['seconds']:>10.3f} {step['rows_per_sec'] or 0:>12}")
+        print(f"{row_count:>10} {'peak RSS [MB]':<32} {result['peak_rss_mb'] or '-':>10}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': get_git_commit(),
+            'python': sys.version.split()[0],
+            'mapping_keys': args.mapping_keys,
+            'merchants': args.merchants,
+            'load_methods': args.load_methods,
+            'results': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# --- 定数 ---
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+STAGE_MODULES = [
+    '00updateWebDriver',
+    '10createRakutenCardCsv',
+    '11importCsvToIfRakutenCard',
+    '12ifRakutenCardToRecsav',
+    '90RecsavRecurringInput',
+    'recsav_batch',
+]
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(.+)$')
+BUDGET_MARGIN = 1.5
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析します。
+
+    Returns:
+        argparse.Namespace: 解析結果
+    """
+    parser = argparse.ArgumentParser(
+        description='python -X importtime で各ステージの起動時間 (モジュール読み込み時間) を計測し、予算と比較します。'
+                    '予算は計測環境の速度に依存しないよう、python -c pass の実行時間に対する倍率で指定します。')
+    parser.add_argument('--repeat', type=int, default=5, help='各ステージの計測回数 (既定: 5、最小値を採用)')
+    parser.add_argument('--update-budget', action='store_true', help=f'計測値に {BUDGET_MARGIN} 倍の余裕を持たせて予算ファイルを更新します。')
+    parser.add_argument('--top', type=int, default=5, help='読み込み時間の大きいモジュールを表示する件数 (既定: 5)')
+    return parser.parse_args()
+
+
+def measure_baseline(repeat):
+    """
+    新しいインタプリタで python -c pass を実行し、インタプリタの起動時間を計測します。
+    予算の基準とするため、計測環境の速度の目安として使用します。
+
+    Args:
+        repeat (int): 計測回数 (最小値を採用)
+
+    Returns:
+        float: インタプリタの起動時間[ms]
+    """
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], cwd=REPO_DIR, check=True)
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return min(elapsed)
+
+
+def measure_import(module_name):
+    """
+    新しいインタプリタでステージのモジュールを読み込み、-X importtime の出力から読み込み時間を取得します。
+
+    Args:
+        module_name (str): ステージのモジュール名
+
+    Returns:
+        tuple: (モジュールの累積読み込み時間[ms], {モジュール名: 累積読み込み時間[ms]})
+    """
+    # importlib.import_module は -X importtime に出力されないため __import__ を使用する
+    code = f"__import__({module_name!r})"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module_name}:\n{result.stderr}")
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            cumulative[match.group(3).strip()] = int(match.group(2)) / 1000
+    return cumulative.get(module_name, 0.0), cumulative
+
+
+def load_budget():
+    """
+    予算ファイルを読み込みます。
+
+    Returns:
+        dict: モジュール名をキー、起動時間の上限 (python -c pass の実行時間に対する倍率) を値とする辞書
+    """
+    if not os.path.exists(BUDGET_FILE):
+        return {}
+    with open(BUDGET_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    """
+    メイン処理
+
+    Returns:
+        int: 終了コード (いずれかのステージが予算を超過した場合は1)
+    """
+    args = parse_args()
+    budget = load_budget()
+    measured = {}
+    exceeded = []
+
+    baseline = measure_baseline(args.repeat)
+    print(f"baseline (python -c pass): {baseline:.1f} ms")
+    print(f"{'stage':<30} {'import[ms]':>12} {'ratio':>8} {'budget':>8}")
+    for module_name in STAGE_MODULES:
+        results = [measure_import(module_name) for _ in range(args.repeat)]
+        elapsed, breakdown = min(results, key=lambda r: r[0])
+        ratio = elapsed / baseline
+        measured[module_name] = ratio
+
+        limit = budget.get(module_name)
+        status = '' if limit is None or ratio <= limit else '  EXCEEDED'
+        print(f"{module_name:<30} {elapsed:>12.1f} {ratio:>8.2f} {limit if limit is not None else '-':>8}{status}")
+        if status:
+            exceeded.append(module_name)
+            # 予算超過時は読み込み時間の大きいモジュールを表示する
+            heavy = sorted((item for item in breakdown.items() if item[0] != module_name), key=lambda item: -item[1])
+            for name, ms in heavy[:args.top]:
+                print(f"    {name:<40} {ms:>10.1f}")
+
+    if args.update_budget:
+        with open(BUDGET_FILE, 'w', encoding='utf-8') as f:
+            json.dump({name: round(ratio * BUDGET_MARGIN, 2) for name, ratio in measured.items()}, f, indent=2)
+            f.write('\n')
+        print(f"Budget updated: {BUDGET_FILE}")
+        return 0
+
+    if exceeded:
+        print(f"Startup budget exceeded: {', '.join(exceeded)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
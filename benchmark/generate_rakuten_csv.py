@@ -0,0 +1,177 @@
+import os
+import csv
+import random
+import argparse
+from datetime import date, timedelta
+
+# --- 定数 ---
+# 利用店名・商品名のベースとなる店舗名 (支店名・商品名を付与して店舗数を増やす)
+MERCHANT_BASES = [
+    'セブン-イレブン', 'ファミリーマート', 'ローソン', 'ミニストップ', 'デイリーヤマザキ',
+    'イオン', 'イトーヨーカドー', '西友', 'ライフ', 'サミット', 'マルエツ', 'オーケー',
+    'ＡＭＡＺＯＮ．ＣＯ．ＪＰ', 'Amazon Prime', '楽天市場', '楽天ブックス', 'Yahoo!ショッピング',
+    'スターバックスコーヒー', 'ドトールコーヒー', 'タリーズコーヒー', 'マクドナルド', 'モスバーガー',
+    'すき家', '吉野家', '松屋', 'サイゼリヤ', 'ガスト', 'スシロー', 'くら寿司',
+    'ユニクロ', 'ＧＵ', '無印良品', 'ニトリ', 'ヨドバシカメラ', 'ビックカメラ', 'ケーズデンキ',
+    'マツモトキヨシ', 'ウエルシア', 'ツルハドラッグ', 'スギ薬局',
+    'ＥＮＥＯＳ', '出光', 'コスモ石油', 'タイムズ', '三井のリパーク',
+    'ＪＲ東日本　モバイルＳｕｉｃａ', 'ＰＡＳＭＯ', 'ＪＡＬ', 'ＡＮＡ', '東京電力エナジーパートナー',
+    '東京ガス', '東京都水道局', 'ＮＴＴドコモ', '楽天モバイル', 'ソフトバンク',
+    'ＮＥＴＦＬＩＸ．ＣＯＭ', 'Ｓｐｏｔｉｆｙ', 'Ａｐｐｌｅ．ＣＯＭ／ＢＩＬＬ', 'ＧＯＯＧＬＥ＊ＹｏｕＴｕｂｅ',
+]
+BRANCH_SUFFIXES = ['新宿店', '渋谷店', '池袋店', '横浜店', '大宮店', '千葉店', '梅田店', '難波店', '名古屋駅前店', '博多店']
+CUSTOMERS = ['本人', '家族']
+PAYMENT_METHODS = ['1回払い', '2回払い', 'リボ払い', 'ボーナス一括']
+# タブごとのCSVレイアウト (0: 未確定の明細、1・2: 確定済みの明細。1と2は支払月のヘッダーが異なる)
+TAB_HEADERS = {
+    0: ['利用日', '利用店名・商品', '利用者', '支払方法', '利用金額', '支払手数料', '支払総額', '支払月'],
+    1: ['利用日', '利用店名・商品', '利用者', '支払方法', '利用金額', '支払手数料', '支払総額',
+        '11月支払金額', '12月繰越残高', '新規サイン'],
+    2: ['利用日', '利用店名・商品', '利用者', '支払方法', '利用金額', '支払手数料', '支払総額',
+        '10月支払金額', '11月繰越残高', '新規サイン'],
+}
+START_DATE = date(2024, 1, 1)
+DAYS = 365
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析します。
+
+    Returns:
+        argparse.Namespace: 解析結果
+    """
+    parser = argparse.ArgumentParser(description='楽天カード明細と同じ形式の合成CSVを生成します。')
+    parser.add_argument('output_dir', help='出力ディレクトリ')
+    parser.add_argument('--rows', type=int, default=1000, help='全タブ合計の明細行数 (既定: 1000)')
+    parser.add_argument('--merchants', type=int, default=5000, help='利用店名・商品名の種類数 (既定: 5000)')
+    parser.add_argument('--prefix', default='rakuten_card', help='ファイル名の接頭辞 (既定: rakuten_card)')
+    parser.add_argument('--encoding', default='utf-8', help='文字コード (既定: utf-8、cp932も指定可能)')
+    parser.add_argument('--seed', type=int, default=0, help='乱数のシード (既定: 0)')
+    return parser.parse_args()
+
+
+def generate_merchant_names(count, seed=0):
+    """
+    ベースの店舗名に支店名・商品番号を組み合わせ、重複のない利用店名・商品名を生成します。
+
+    Args:
+        count (int): 生成する店舗名の数
+        seed (int, optional): 乱数のシード
+
+    Returns:
+        list: 利用店名・商品名のリスト
+    """
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        base = MERCHANT_BASES[i % len(MERCHANT_BASES)]
+        round_no = i // len(MERCHANT_BASES)
+        if round_no == 0:
+            names.append(base)
+        elif round_no <= len(BRANCH_SUFFIXES):
+            names.append(f"{base}　{BRANCH_SUFFIXES[round_no - 1]}")
+        else:
+            names.append(f"{base}　{rng.choice(BRANCH_SUFFIXES)}{round_no:05d}")
+    return names
+
+
+def generate_mapping_keys(count, seed=0):
+    """
+    category_mapping_config に登録するマッピングキーを生成します。
+    ベースの店舗名 (実際に一致するキー) に、一致しない合成キーを加えて指定された数にします。
+
+    Args:
+        count (int): 生成するマッピングキーの数
+        seed (int, optional): 乱数のシード
+
+    Returns:
+        list: (mapping_key_nm, category_cd, linking_excluded_flg) のリスト
+    """
+    rng = random.Random(seed)
+    keys = []
+    for i, base in enumerate(MERCHANT_BASES[:count]):
+        excluded = '1' if i % 20 == 0 else None
+        keys.append((base, 1000 + i % 30, excluded))
+    for i in range(count - len(keys)):
+        keys.append((f"合成キー{i:06d}{rng.choice(BRANCH_SUFFIXES)}", 1000 + i % 30, None))
+    return keys
+
+
+def generate_rows(tab_no, row_count, merchant_names, rng):
+    """
+    指定されたタブのレイアウトで明細行を生成します。
+
+    Args:
+        tab_no (int): タブ番号
+        row_count (int): 生成する行数
+        merchant_names (list): 利用店名・商品名のリスト
+        rng (random.Random): 乱数生成器
+
+    Yields:
+        list: 明細1行
+    """
+    for _ in range(row_count):
+        usage_date = START_DATE + timedelta(days=rng.randrange(DAYS))
+        amount = rng.choice([110, 150, 298, 500, 980, 1200, 1580, 3300, 5480, 12800, rng.randrange(100, 200000)])
+        row = [
+            usage_date.strftime('%Y/%m/%d'),
+            rng.choice(merchant_names),
+            rng.choice(CUSTOMERS),
+            rng.choice(PAYMENT_METHODS),
+            f"{amount:,}",
+            '0',
+            f"{amount:,}",
+        ]
+        if tab_no == 0:
+            row.append(f"{usage_date.year}/{usage_date.month:02d}")
+        else:
+            row.extend([f"{amount:,}", '0', rng.choice(['', '*'])])
+        yield row
+
+
+def generate_statement_csvs(output_dir, row_count, merchant_count=5000, prefix='rakuten_card', encoding='utf-8', seed=0):
+    """
+    3つのタブのレイアウトで合成の明細CSVを生成します。行数は各タブに均等に割り当てます。
+    各ファイルの末尾には、実際の明細と同様に利用日が空の合計行を出力します。
+
+    Args:
+        output_dir (str): 出力ディレクトリ
+        row_count (int): 全タブ合計の明細行数
+        merchant_count (int, optional): 利用店名・商品名の種類数
+        prefix (str, optional): ファイル名の接頭辞
+        encoding (str, optional): 文字コード
+        seed (int, optional): 乱数のシード
+
+    Returns:
+        dict: タブ番号をキー、生成したファイルのパスを値とする辞書
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    merchant_names = generate_merchant_names(merchant_count, seed)
+
+    paths = {}
+    for tab_no, header in TAB_HEADERS.items():
+        tab_rows = row_count // len(TAB_HEADERS) + (1 if tab_no < row_count % len(TAB_HEADERS) else 0)
+        path = os.path.join(output_dir, f"{prefix}_tab{tab_no}.csv")
+        with open(path, 'w', encoding=encoding, newline='') as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(header)
+            writer.writerows(generate_rows(tab_no, tab_rows, merchant_names, rng))
+            writer.writerow([''] * (len(header) - 1) + ['合計'])
+        paths[tab_no] = path
+    return paths
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    paths = generate_statement_csvs(args.output_dir, args.rows, args.merchants, args.prefix, args.encoding, args.seed)
+    for tab_no, path in paths.items():
+        print(f"tab{tab_no}: {path}")
+
+
+if __name__ == "__main__":
+    main()
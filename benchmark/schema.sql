@@ -0,0 +1,70 @@
+-- =============================================================
+-- ベンチマーク用スキーマ (bench_pipeline.py が使い捨てのスキーマに作成します)
+--   11・12 が参照するテーブルのみを、migration/ 適用後と同じカラム・インデックスで定義する
+-- =============================================================
+CREATE TABLE if_rakuten_card (
+    if_rakuten_card_seq        serial PRIMARY KEY,
+    usage_date                 date,
+    merchant_product_name      varchar(256),
+    customer_nm                varchar(64),
+    payment_method             varchar(64),
+    usage_amount               numeric(12),
+    payment_fee                numeric(12),
+    total_payment_amount       numeric(12),
+    payment_month              varchar(16),
+    monthly_payment_amount     numeric(12),
+    monthly_carryover_balance  numeric(12),
+    new_signup_flag            varchar(8),
+    row_fingerprint            varchar(64),
+    delta_status               char(1) NOT NULL DEFAULT '1',
+    account_cd                 varchar(32) NOT NULL DEFAULT 'default',
+    tab_no                     smallint
+);
+CREATE UNIQUE INDEX if_rakuten_card_account_row_fingerprint_uidx
+    ON if_rakuten_card (account_cd, row_fingerprint);
+CREATE INDEX if_rakuten_card_account_delta_status_idx
+    ON if_rakuten_card (account_cd, delta_status);
+CREATE INDEX if_rakuten_card_account_tab_no_idx
+    ON if_rakuten_card (account_cd, tab_no);
+
+CREATE TABLE store (
+    store_cd        serial PRIMARY KEY,
+    store_nm        varchar(256) NOT NULL,
+    normalized_key  varchar(256)
+);
+CREATE UNIQUE INDEX store_store_nm_uidx ON store (store_nm);
+CREATE UNIQUE INDEX store_normalized_key_uidx ON store (normalized_key);
+
+CREATE TABLE category_mapping_config (
+    category_mapping_config_seq  serial PRIMARY KEY,
+    mapping_key_nm               varchar(256),
+    category_cd                  integer,
+    linking_excluded_flg         char(1)
+);
+
+CREATE TABLE merchant_classification_memo (
+    merchant_key          varchar(256) PRIMARY KEY,
+    category_cd           integer,
+    linking_excluded_flg  char(1),
+    mapping_version       varchar(32) NOT NULL,
+    created_at            timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE household_account_book (
+    household_account_book_seq  serial PRIMARY KEY,
+    actual_date                 date,
+    category_cd                 integer,
+    store_cd                    integer,
+    amount                      numeric(12),
+    remarks                     varchar(256),
+    linking_data_type           integer,
+    linking_fingerprint         varchar(32)
+);
+CREATE UNIQUE INDEX household_account_book_linking_fingerprint_uidx
+    ON household_account_book (linking_fingerprint);
+
+CREATE TABLE linking_data (
+    linking_data_type  integer PRIMARY KEY,
+    last_linking_date  date
+);
+INSERT INTO linking_data (linking_data_type, last_linking_date) VALUES (1, NULL);
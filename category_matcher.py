@@ -0,0 +1,97 @@
+from collections import deque
+
+
+class CategoryMatcher:
+    """
+    category_mapping_config のマッピングキーから構築する Aho-Corasick オートマトン。
+    利用店名・商品名に含まれるマッピングキーを1回の走査ですべて検出し、分類結果を返します。
+
+    複数のキーに一致した場合は、次の順で1件に決定します。
+        1. キーの文字数が長いもの (より具体的なキーを優先)
+        2. 一致した位置が先頭に近いもの
+        3. キー文字列、カテゴリコード、連携除外フラグの昇順
+    """
+
+    def __init__(self, mappings):
+        """
+        Args:
+            mappings (iterable): (mapping_key_nm, category_cd, linking_excluded_flg) のイテレータ
+        """
+        # 同一条件での選択結果を安定させるため、キーの昇順で優先順位を付ける
+        patterns = sorted(
+            (m for m in mappings if m[0] is not None),
+            key=lambda m: (m[0], str(m[1]), str(m[2])),
+        )
+        self._patterns = []
+        self._empty_pattern = None
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for mapping in patterns:
+            if mapping[0] == '':
+                # 空のキーは LIKE '%%' と同様に全件に一致するため、他に一致がない場合のみ採用する
+                if self._empty_pattern is None:
+                    self._empty_pattern = mapping
+                continue
+            self._add_pattern(mapping)
+        self._build_failure_links()
+
+    def __len__(self):
+        return len(self._patterns) + (1 if self._empty_pattern is not None else 0)
+
+    def _add_pattern(self, mapping):
+        node = 0
+        for ch in mapping[0]:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(len(self._patterns))
+        self._patterns.append(mapping)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def match(self, text):
+        """
+        文字列に含まれるマッピングキーのうち、優先順位が最も高いものを返します。
+
+        Args:
+            text (str): 利用店名・商品名
+
+        Returns:
+            tuple or None: (mapping_key_nm, category_cd, linking_excluded_flg)。一致しない場合はNone
+        """
+        if text is None:
+            return None
+
+        best = None
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for index in self._output[node]:
+                key_len = len(self._patterns[index][0])
+                rank = (-key_len, pos - key_len + 1, index)
+                if best is None or rank < best:
+                    best = rank
+
+        if best is None:
+            return self._empty_pattern
+        return self._patterns[best[2]]
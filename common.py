@@ -1,11 +1,55 @@
 import configparser
+import csv
+import io
+import os
+import re
+import sys
+import json
+import time
+import threading
+from datetime import datetime
 import logging
 import logzero
-import psycopg2
+from contextlib import contextmanager
+from logzero import logger
+
+# psycopg2 は設定の読み込みのみを行う呼び出し元で読み込まないよう、DB接続時に読み込む
 
 # --- 定数 ---
 SETTINGS_FILE = 'settings.ini'
 LOG_FORMAT = '[%(levelname)s %(asctime)s] %(message)s'
+COPY_NULL = '\\N'
+DEFAULT_TAB_NOS = '0,1,2'
+DEFAULT_ACCOUNT_CD = 'default'
+ACCOUNT_SECTION_PREFIX = 'RAKUTEN:'
+ACCOUNT_CD_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+STAGING_MODE_TABLE = 'table'
+STAGING_MODE_UNLOGGED = 'unlogged'
+STAGING_MODE_TEMP = 'temp'
+STAGING_TABLE = 'if_rakuten_card'
+UNLOGGED_STAGING_TABLE = 'if_rakuten_card_stage'
+TEMP_STAGING_TABLE = 'tmp_if_rakuten_card_stage'
+DEFAULT_POOL_MINCONN = 1
+DEFAULT_POOL_MAXCONN = 4
+KEEPALIVE_PARAMS = {
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 5,
+}
+BATCH_SESSION_SETTINGS = ['synchronous_commit', 'work_mem']
+METRICS_PREFIX = 'recsav_batch'
+
+# --- DB接続プール・準備済み文 ---
+_db_pool = None
+_prepared_statements = {}  # (接続のid, バックエンドPID) → 準備済み文の名前の集合
+
+# --- 計測値 (タイマー・カウンター) ---
+_timers = {}  # (名前, ラベル) → [回数, 合計秒, 最大秒]
+_counters = {}  # (名前, ラベル) → 値
+_default_labels = {}
+_run_started = time.time()
+_metrics_lock = threading.Lock()  # 10のHTTP取得など、スレッドから記録する場合のため
 
 def load_config():
     """
@@ -18,6 +62,145 @@ def load_config():
     config.read(SETTINGS_FILE, "utf-8")
     return config
 
+def get_tab_nos(config):
+    """
+    処理対象とする明細のタブ番号を設定から取得します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        list: タブ番号のリスト
+    """
+    tab_nos = config.get("RAKUTEN", "tab_nos", fallback=DEFAULT_TAB_NOS)
+    return [int(tab_no) for tab_no in tab_nos.split(',') if tab_no.strip()]
+
+def get_account_cds(config):
+    """
+    設定ファイルに定義されたカードアカウントのコードを取得します。
+    [RAKUTEN:xxx] セクションがある場合は各セクションの xxx を、ない場合は [RAKUTEN] のみの DEFAULT_ACCOUNT_CD を返します。
+    [RAKUTEN] のみで連携していたカードは、[RAKUTEN:default] セクションとすることで、アカウントを追加した後も
+    DEFAULT_ACCOUNT_CD として (取込済みの行・家計簿の連携済みの行を引き継いで) 処理します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        list: アカウントコードのリスト
+
+    Raises:
+        ValueError: アカウントコードに英数字・アンダースコア以外の文字が含まれる場合
+    """
+    account_cds = [section[len(ACCOUNT_SECTION_PREFIX):] for section in config.sections()
+                   if section.startswith(ACCOUNT_SECTION_PREFIX)]
+    for account_cd in account_cds:
+        # アカウントコードはテーブル名・ファイル名に使用するため、使用できる文字を制限する
+        if not ACCOUNT_CD_PATTERN.match(account_cd):
+            raise ValueError(f"Invalid account code: {account_cd!r} (use letters, digits and underscores only)")
+    return account_cds or [DEFAULT_ACCOUNT_CD]
+
+def get_account_config(config, account_cd):
+    """
+    指定されたアカウント用の設定オブジェクトを生成します。
+    [RAKUTEN] の内容を [RAKUTEN:xxx] の内容で上書きし、出力ディレクトリはアカウントごとのサブディレクトリとします。
+    既存の処理はアカウントを意識せず [RAKUTEN]・[OUTPUT] を参照できます。
+    DEFAULT_ACCOUNT_CD のアカウントは、[RAKUTEN:default] の内容で上書きしますが、出力ディレクトリ・リジェクトの出力先・
+    セッションの保存先は [RAKUTEN] のみの場合と同じとし、前回までの実行マニフェストや保存済みのセッションを引き継ぎます。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+        account_cd (str): アカウントコード
+
+    Returns:
+        configparser.ConfigParser: アカウント用の設定オブジェクト (account_cd は [RAKUTEN] account_cd に設定)
+    """
+    account_config = configparser.ConfigParser()
+    account_config.read_dict({section: dict(config.items(section, raw=True)) for section in config.sections()})
+    if not account_config.has_section("RAKUTEN"):
+        account_config.add_section("RAKUTEN")
+
+    section = f"{ACCOUNT_SECTION_PREFIX}{account_cd}"
+    overrides = dict(config.items(section, raw=True)) if config.has_section(section) else {}
+    is_default = account_cd == DEFAULT_ACCOUNT_CD
+    # 共通のセッション保存先を引き継ぐ場合は、アカウント間で共有しないようファイル名にアカウントコードを付与する
+    if not is_default and "session_cache" not in overrides and config.has_option("RAKUTEN", "session_cache"):
+        root, ext = os.path.splitext(config.get("RAKUTEN", "session_cache", raw=True))
+        overrides["session_cache"] = f"{root}_{account_cd}{ext}"
+    for key, value in overrides.items():
+        account_config.set("RAKUTEN", key, value)
+
+    output_dir = overrides.get("output_dir") or (None if is_default else os.path.join(config["OUTPUT"]["dir"], account_cd))
+    if output_dir:
+        account_config.set("OUTPUT", "dir", output_dir)
+    if not is_default and config.has_option("IMPORT", "reject_dir"):
+        account_config.set("IMPORT", "reject_dir", os.path.join(config.get("IMPORT", "reject_dir", raw=True), account_cd))
+
+    account_config.set("RAKUTEN", "account_cd", account_cd)
+    return account_config
+
+def get_account_cd(config):
+    """
+    設定オブジェクトのアカウントコードを取得します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト (get_account_configで生成したもの)
+
+    Returns:
+        str: アカウントコード
+    """
+    return config.get("RAKUTEN", "account_cd", fallback=DEFAULT_ACCOUNT_CD)
+
+def get_staging_mode(config):
+    """
+    明細の取込先 (ステージング方式) を設定から取得します。
+    差分取込 (import_mode = incremental) はif_rakuten_cardの行を実行をまたいで保持するため、常に 'table' とします。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        str: ステージング方式 ('table' / 'unlogged' / 'temp')
+    """
+    staging_mode = config.get("IMPORT", "staging_mode", fallback=STAGING_MODE_TABLE)
+    if staging_mode != STAGING_MODE_TABLE and config.get("IMPORT", "import_mode", fallback="full") == "incremental":
+        logger.warning(f"staging_mode = {staging_mode} is not supported with incremental import. Using if_rakuten_card.")
+        return STAGING_MODE_TABLE
+    return staging_mode
+
+def get_staging_table(staging_mode, account_cd=DEFAULT_ACCOUNT_CD):
+    """
+    11で明細を取り込み、12で読み込むステージングテーブル名を返します。
+
+    Args:
+        staging_mode (str): ステージング方式 (get_staging_modeで取得したもの)
+        account_cd (str, optional): アカウントコード
+
+    Returns:
+        str: テーブル名
+            table    : if_rakuten_card
+            unlogged : if_rakuten_card_stage_アカウントコード (実行ごとに作成・削除するUNLOGGEDテーブル)
+            temp     : tmp_if_rakuten_card_stage (セッションの一時テーブル。11と12を同じ接続で実行する場合のみ使用可能)
+    """
+    if staging_mode == STAGING_MODE_UNLOGGED:
+        return f"{UNLOGGED_STAGING_TABLE}_{account_cd}"
+    if staging_mode == STAGING_MODE_TEMP:
+        return TEMP_STAGING_TABLE
+    return STAGING_TABLE
+
+def get_account_log_path(log_file, account_cd):
+    """
+    アカウントごとに並行して処理する場合のログファイルのパスを返します。
+
+    Args:
+        log_file (str): ログファイルのパス
+        account_cd (str): アカウントコード
+
+    Returns:
+        str: アカウント用のログファイルのパス (例: app.log → app_xxx.log)
+    """
+    root, ext = os.path.splitext(log_file)
+    return f"{root}_{account_cd}{ext}"
+
 def setup_logger(log_file):
     """
     ログ設定を初期化します。
@@ -31,6 +214,199 @@ def setup_logger(log_file):
                     loglevel=logging.INFO,
                     formatter=logging.Formatter(LOG_FORMAT))
 
+def _metric_key(name, labels):
+    merged = dict(_default_labels, **labels)
+    return name, tuple(sorted((key, str(value)) for key, value in merged.items()))
+
+def set_default_labels(**labels):
+    """
+    以降に記録するすべての計測値に付与するラベルを設定します (例: account='main')。
+
+    Args:
+        **labels: ラベル名と値
+    """
+    _default_labels.clear()
+    _default_labels.update(labels)
+
+def reset_metrics():
+    """
+    記録済みの計測値を消去し、実行開始時刻を現在時刻にします。
+    """
+    global _run_started
+    _timers.clear()
+    _counters.clear()
+    _run_started = time.time()
+
+def record_time(name, seconds, **labels):
+    """
+    処理時間を記録します。
+
+    Args:
+        name (str): タイマー名
+        seconds (float): 処理時間[秒]
+        **labels: ラベル名と値 (例: tab_no=1)
+    """
+    key = _metric_key(name, labels)
+    with _metrics_lock:
+        entry = _timers.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+@contextmanager
+def timer(name, **labels):
+    """
+    ブロック内の処理時間を記録します。例外で終了した場合も記録します。
+
+    Args:
+        name (str): タイマー名
+        **labels: ラベル名と値 (例: tab_no=1)
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_time(name, time.perf_counter() - start_time, **labels)
+
+def increment(name, value=1, **labels):
+    """
+    カウンターに値を加算します。
+
+    Args:
+        name (str): カウンター名
+        value (int, optional): 加算する値
+        **labels: ラベル名と値 (例: tab_no=1)
+    """
+    key = _metric_key(name, labels)
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def get_metrics():
+    """
+    記録済みの計測値を、JSONに変換できる形式で返します。
+
+    Returns:
+        dict: {'timers': [...], 'counters': [...]}
+    """
+    return {
+        'timers': [
+            {'name': name, 'labels': dict(labels), 'count': count,
+             'total_seconds': round(total, 6), 'max_seconds': round(maximum, 6)}
+            for (name, labels), (count, total, maximum) in sorted(_timers.items())
+        ],
+        'counters': [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in sorted(_counters.items())
+        ],
+    }
+
+def merge_metrics(metrics):
+    """
+    別プロセスで記録した計測値 (get_metricsの戻り値) を、このプロセスの計測値に加算します。
+
+    Args:
+        metrics (dict): get_metricsの戻り値
+    """
+    for timer_metric in metrics['timers']:
+        entry = _timers.setdefault((timer_metric['name'], tuple(sorted(timer_metric['labels'].items()))), [0, 0.0, 0.0])
+        entry[0] += timer_metric['count']
+        entry[1] += timer_metric['total_seconds']
+        entry[2] = max(entry[2], timer_metric['max_seconds'])
+    for counter in metrics['counters']:
+        key = (counter['name'], tuple(sorted(counter['labels'].items())))
+        _counters[key] = _counters.get(key, 0) + counter['value']
+
+def _write_atomically(path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_prometheus(run_name, succeeded, finished, duration):
+    def labels_of(labels):
+        text = ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in (('run', run_name),) + labels)
+        return f'{{{text}}}'
+
+    run_labels = labels_of(())
+    lines = [
+        f'# TYPE {METRICS_PREFIX}_last_run_timestamp_seconds gauge',
+        f'{METRICS_PREFIX}_last_run_timestamp_seconds{run_labels} {finished:.3f}',
+        f'# TYPE {METRICS_PREFIX}_last_run_success gauge',
+        f'{METRICS_PREFIX}_last_run_success{run_labels} {1 if succeeded else 0}',
+        f'# TYPE {METRICS_PREFIX}_last_run_duration_seconds gauge',
+        f'{METRICS_PREFIX}_last_run_duration_seconds{run_labels} {duration:.6f}',
+        f'# TYPE {METRICS_PREFIX}_duration_seconds_sum gauge',
+    ]
+    lines += [f'{METRICS_PREFIX}_duration_seconds_sum{labels_of((("name", name),) + labels)} {total:.6f}'
+              for (name, labels), (_, total, _) in sorted(_timers.items())]
+    lines.append(f'# TYPE {METRICS_PREFIX}_duration_seconds_count gauge')
+    lines += [f'{METRICS_PREFIX}_duration_seconds_count{labels_of((("name", name),) + labels)} {count}'
+              for (name, labels), (count, _, _) in sorted(_timers.items())]
+    lines.append(f'# TYPE {METRICS_PREFIX}_duration_seconds_max gauge')
+    lines += [f'{METRICS_PREFIX}_duration_seconds_max{labels_of((("name", name),) + labels)} {maximum:.6f}'
+              for (name, labels), (_, _, maximum) in sorted(_timers.items())]
+    lines.append(f'# TYPE {METRICS_PREFIX}_count gauge')
+    lines += [f'{METRICS_PREFIX}_count{labels_of((("name", name),) + labels)} {value}'
+              for (name, labels), value in sorted(_counters.items())]
+    return '\n'.join(lines) + '\n'
+
+def write_run_report(config, run_name, succeeded, log_file=None):
+    """
+    実行結果と計測値のサマリーを、ログファイルと同じディレクトリにJSONで出力します (例: app.log → app_report.json)。
+    [METRICS] prometheus_textfile が設定されている場合は、Prometheus (node_exporter の textfile collector) 形式でも出力します。
+    出力に失敗しても処理は継続します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+        run_name (str): 実行名 (スクリプト名など)
+        succeeded (bool): 正常終了したか
+        log_file (str, optional): ログファイルのパス。省略時は [LOG] path
+    """
+    finished = time.time()
+    duration = finished - _run_started
+    log_file = log_file or config["LOG"]["path"]
+    report_path = f"{os.path.splitext(log_file)[0]}_report.json"
+    report = {
+        'run': run_name,
+        'started_at': datetime.fromtimestamp(_run_started).isoformat(timespec='seconds'),
+        'finished_at': datetime.fromtimestamp(finished).isoformat(timespec='seconds'),
+        'duration_seconds': round(duration, 3),
+        'succeeded': succeeded,
+        **get_metrics(),
+    }
+    try:
+        _write_atomically(report_path, json.dumps(report, ensure_ascii=False, indent=2))
+        logger.info(f"Run report written to: {report_path}")
+
+        textfile = config.get("METRICS", "prometheus_textfile", fallback=None)
+        if textfile:
+            _write_atomically(textfile, _format_prometheus(run_name, succeeded, finished, duration))
+    except OSError as e:
+        logger.warning(f"Could not write run report: {e}")
+
+def get_connect_params(config):
+    """
+    設定からデータベースの接続パラメータを組み立てます。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        dict: psycopg2.connectに渡す接続パラメータ
+    """
+    return dict(
+        host=config["DB"]["host"],
+        port=config["DB"]["port"],
+        dbname=config["DB"]["dbname"],
+        user=config["DB"]["dbuser"],
+        password=config["DB"]["dbpassword"],
+        **KEEPALIVE_PARAMS
+    )
+
 def get_db_connection(config):
     """
     データベース接続を確立します。
@@ -41,15 +417,229 @@ def get_db_connection(config):
     Returns:
         psycopg2.connection: データベース接続オブジェクト
     """
+    import psycopg2
+
     try:
-        conn = psycopg2.connect(
-            host=config["DB"]["host"],
-            port=config["DB"]["port"],
-            dbname=config["DB"]["dbname"],
-            user=config["DB"]["dbuser"],
-            password=config["DB"]["dbpassword"]
-        )
+        conn = psycopg2.connect(**get_connect_params(config))
         return conn
     except psycopg2.Error as e:
         # ログは呼び出し元で出すことを想定
         raise e
+
+def get_db_pool(config):
+    """
+    データベース接続プールを取得します。初回呼び出し時に settings.ini の設定に基づいて生成します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        psycopg2.pool.ThreadedConnectionPool: データベース接続プール
+    """
+    import psycopg2.pool
+
+    global _db_pool
+    if _db_pool is None or _db_pool.closed:
+        minconn = config.getint("DB", "pool_minconn", fallback=DEFAULT_POOL_MINCONN)
+        maxconn = config.getint("DB", "pool_maxconn", fallback=DEFAULT_POOL_MAXCONN)
+        _db_pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, **get_connect_params(config))
+    return _db_pool
+
+def close_db_pool():
+    """
+    データベース接続プールの全接続を閉じます。
+    """
+    global _db_pool
+    if _db_pool is not None and not _db_pool.closed:
+        _db_pool.closeall()
+        logger.info("Database connection closed.")
+    _db_pool = None
+    _prepared_statements.clear()
+
+def is_database_error(error):
+    """
+    例外がデータベースエラー (psycopg2.DatabaseError) かを判定します。
+    psycopg2 が読み込まれていない場合、データベースエラーは発生しないためFalseを返します。
+
+    Args:
+        error (Exception): 判定する例外
+
+    Returns:
+        bool: データベースエラーの場合はTrue
+    """
+    psycopg2 = sys.modules.get('psycopg2')
+    return psycopg2 is not None and isinstance(error, psycopg2.DatabaseError)
+
+def apply_batch_session_settings(connection, config):
+    """
+    バッチ処理向けのセッション設定 (synchronous_commit, work_mem) を適用します。
+    settings.ini の [DB] セクションに指定された項目のみ適用します。
+
+    Args:
+        connection: データベース接続
+        config (configparser.ConfigParser): 設定オブジェクト
+    """
+    settings = [(name, config.get("DB", name)) for name in BATCH_SESSION_SETTINGS if config.has_option("DB", name)]
+    if not settings:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings:
+            cursor.execute("SELECT set_config(%s, %s, false)", (name, value))
+    connection.commit()
+
+@contextmanager
+def pooled_connection(config):
+    """
+    接続プールからデータベース接続を取得し、終了時にプールへ返却します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Yields:
+        psycopg2.connection: データベース接続オブジェクト
+    """
+    pool = get_db_pool(config)
+    connection = pool.getconn()
+    try:
+        connection.autocommit = False
+        apply_batch_session_settings(connection, config)
+        yield connection
+    finally:
+        if not connection.closed:
+            connection.rollback()
+        else:
+            for key in [key for key in _prepared_statements if key[0] == id(connection)]:
+                del _prepared_statements[key]
+        pool.putconn(connection, close=bool(connection.closed))
+
+@contextmanager
+def transaction(connection):
+    """
+    ブロック内の処理を1つのトランザクションとして実行します。
+    正常終了時はコミットし、例外発生時はロールバックして例外を再送出します。
+
+    Args:
+        connection: データベース接続
+
+    Yields:
+        psycopg2.connection: データベース接続オブジェクト
+    """
+    try:
+        yield connection
+        connection.commit()
+        logger.info("Transaction committed successfully.")
+    except Exception:
+        if not connection.closed:
+            connection.rollback()
+            logger.info("Transaction rolled back.")
+        raise
+
+@contextmanager
+def db_transaction(config):
+    """
+    接続プールから取得した接続で、ブロック内の処理を1つのトランザクションとして実行します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Yields:
+        psycopg2.connection: データベース接続オブジェクト
+    """
+    with pooled_connection(config) as connection:
+        with transaction(connection):
+            yield connection
+
+def execute_sql(cursor, name, sql, params=None):
+    """
+    SQLを実行し、処理時間を名前ごとに記録します。
+    1回の実行で1度しか実行しないSQLは、PREPAREの往復が増えるだけのため準備済み文を使用せずにこの関数で実行します。
+
+    Args:
+        cursor: データベースカーソル
+        name (str): 処理時間を記録するSQLの名前
+        sql (str): 実行するSQL (パラメータは %s で指定)
+        params (tuple, optional): パラメータ
+    """
+    with timer('sql', statement=name):
+        cursor.execute(sql, params)
+
+def execute_prepared(cursor, name, sql, params=()):
+    """
+    サーバーサイドの準備済み文 (PREPARE / EXECUTE) でSQLを実行します。
+    準備済み文は接続ごとに初回実行時のみ作成し、以降は構文解析・実行計画の作成を省略します。
+    11の行ごとのINSERTなど、同じ接続で繰り返し実行するSQLに使用します。
+
+    Args:
+        cursor: データベースカーソル
+        name (str): 準備済み文の名前
+        sql (str): 実行するSQL (パラメータは $1, $2, ... で指定)
+        params (tuple, optional): パラメータ
+    """
+    connection = cursor.connection
+    prepared = _prepared_statements.setdefault((id(connection), connection.get_backend_pid()), set())
+    if name not in prepared:
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        prepared.add(name)
+
+    with timer('sql', statement=name):
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+
+class CsvCopyStream:
+    """
+    行データのイテレータを COPY FROM STDIN 用の CSV ストリームとして読み出すファイルライクオブジェクト。
+    ファイル全体をメモリに保持せず、read で要求されたサイズ分だけ逐次 CSV に変換します。
+    None は COPY_NULL (NULL) として、空文字は空文字のまま出力します。
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._pending = ''
+        self.row_count = 0
+
+    def read(self, size=-1):
+        # 要求サイズに達するまで行を CSV に変換してバッファへ追加
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow([COPY_NULL if value is None else value for value in row])
+            self.row_count += 1
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+
+        if size < 0:
+            data, self._pending = self._pending, ''
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    行データを COPY FROM STDIN でテーブルへ一括登録します。
+
+    Args:
+        cursor: データベースカーソル
+        table (str): 登録先テーブル名
+        columns (list): 登録先カラム名のリスト
+        rows (iterable): 登録する行データ (タプル) のイテレータ
+
+    Returns:
+        int: 登録した行数
+    """
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+    stream = CsvCopyStream(rows)
+    with timer('sql', statement=f'copy_{table}'):
+        cursor.copy_expert(sql, stream)
+    increment('rows_copied', stream.row_count, table=table)
+    return stream.row_count
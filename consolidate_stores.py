@@ -0,0 +1,183 @@
+import sys
+import argparse
+import traceback
+from logzero import logger
+import common
+from merchant_normalizer import MerchantNormalizer
+
+# --- 定数 ---
+MERGE_TABLE = 'tmp_store_merge'
+# store_cd を参照するテーブルとカラム (統合した店舗の店舗コードを付け替える)
+STORE_REFERENCES = [
+    ('household_account_book', 'store_cd'),
+    ('recurring_config', 'store_cd'),
+]
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析します。
+
+    Returns:
+        argparse.Namespace: 解析結果
+    """
+    parser = argparse.ArgumentParser(
+        description='storeテーブルの正規化キーを設定し、表記の揺れで重複した店舗を1つに統合します。')
+    parser.add_argument('--dry-run', action='store_true', help='統合内容をログに出力し、DBは更新しません。')
+    return parser.parse_args()
+
+
+def load_stores(cursor):
+    """
+    storeテーブルの全店舗を取得します。
+
+    Args:
+        cursor: データベースカーソル
+
+    Returns:
+        list: (store_cd, store_nm, normalized_key) のリスト (店舗コード順)
+    """
+    cursor.execute("SELECT store_cd, store_nm, normalized_key FROM store ORDER BY store_cd")
+    return cursor.fetchall()
+
+
+def plan_consolidation(stores, normalizer):
+    """
+    店舗名から正規化キーを求め、同じキーの店舗を店舗コードが最小の店舗へ統合する計画を作成します。
+
+    Args:
+        stores (list): (store_cd, store_nm, normalized_key) のリスト (店舗コード順)
+        normalizer (MerchantNormalizer): 利用店名・商品名の正規化クラス
+
+    Returns:
+        tuple: (正規化キーを更新する (store_cd, normalized_key) のリスト,
+                統合元の店舗コードをキー、統合先の店舗コードを値とする辞書)
+    """
+    canonical = {}
+    key_updates = []
+    merges = {}
+    for store_cd, store_nm, normalized_key in stores:
+        key = normalizer.normalize(store_nm)
+        if key not in canonical:
+            canonical[key] = store_cd
+            if key != normalized_key:
+                key_updates.append((store_cd, key))
+        else:
+            merges[store_cd] = canonical[key]
+    return key_updates, merges
+
+
+def update_normalized_keys(cursor, key_updates):
+    """
+    統合後に残る店舗の正規化キーを更新します。
+    正規化キーの一意制約 (migration/009) がある場合も店舗間でキーを入れ替えられるよう、対象の店舗のキーを一度NULLにしてから更新します。
+
+    Args:
+        cursor: データベースカーソル
+        key_updates (list): (store_cd, normalized_key) のリスト
+    """
+    if not key_updates:
+        return
+    from psycopg2.extras import execute_values
+
+    cursor.execute("UPDATE store SET normalized_key = NULL WHERE store_cd = ANY(%s)",
+                   ([store_cd for store_cd, _ in key_updates],))
+    execute_values(cursor, """
+        UPDATE store s
+        SET normalized_key = v.normalized_key
+        FROM (VALUES %s) AS v(store_cd, normalized_key)
+        WHERE s.store_cd = v.store_cd
+    """, key_updates)
+    logger.info(f"{len(key_updates)} normalized keys updated.")
+
+
+def merge_stores(cursor, merges):
+    """
+    統合元の店舗を参照する行の店舗コードを統合先に付け替え、統合元の店舗を削除します。
+
+    Args:
+        cursor: データベースカーソル
+        merges (dict): 統合元の店舗コードをキー、統合先の店舗コードを値とする辞書
+    """
+    if not merges:
+        return
+
+    cursor.execute(f"""
+        CREATE TEMP TABLE {MERGE_TABLE} (
+            old_store_cd integer PRIMARY KEY,
+            new_store_cd integer NOT NULL
+        ) ON COMMIT DROP
+    """)
+    common.copy_rows(cursor, MERGE_TABLE, ['old_store_cd', 'new_store_cd'], merges.items())
+    cursor.execute(f"ANALYZE {MERGE_TABLE}")
+
+    for table, column in STORE_REFERENCES:
+        cursor.execute(f"""
+            UPDATE {table} t
+            SET {column} = m.new_store_cd
+            FROM {MERGE_TABLE} m
+            WHERE t.{column} = m.old_store_cd
+        """)
+        logger.info(f"{cursor.rowcount} rows of {table}.{column} remapped.")
+
+    cursor.execute(f"DELETE FROM store s USING {MERGE_TABLE} m WHERE s.store_cd = m.old_store_cd")
+    logger.info(f"{cursor.rowcount} duplicate stores deleted.")
+
+
+def run(config, connection, dry_run=False):
+    """
+    storeテーブルの正規化キーを設定し、重複した店舗を統合します。コミットは呼び出し元で行います。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+        connection: データベース接続
+        dry_run (bool, optional): Trueの場合は統合内容をログに出力するのみでDBを更新しない
+    """
+    normalizer = MerchantNormalizer.from_config(config)
+    with connection.cursor() as cursor:
+        stores = load_stores(cursor)
+        key_updates, merges = plan_consolidation(stores, normalizer)
+        logger.info(f"{len(stores)} stores loaded. {len(merges)} duplicates will be merged "
+                    f"into {len(set(merges.values()))} stores.")
+
+        if dry_run:
+            store_names = {store_cd: store_nm for store_cd, store_nm, _ in stores}
+            for old_store_cd, new_store_cd in merges.items():
+                logger.info(f"  {store_names[old_store_cd]} ({old_store_cd}) -> "
+                            f"{store_names[new_store_cd]} ({new_store_cd})")
+            return
+
+        # --- 重複した店舗を削除してから、残る店舗の正規化キーを設定 ---
+        merge_stores(cursor, merges)
+        update_normalized_keys(cursor, key_updates)
+
+
+def main():
+    """
+    メイン処理
+    """
+    try:
+        # --- 初期設定 ---
+        config = common.load_config()
+        common.setup_logger(config["LOG"]["path"])
+        args = parse_args()
+
+        logger.info('*** consolidate_stores START ***')
+
+        # --- DB接続・トランザクション (正常終了時にコミット、例外発生時にロールバック) ---
+        with common.db_transaction(config) as connection:
+            run(config, connection, args.dry_run)
+
+    except Exception as e:
+        if common.is_database_error(e):
+            logger.error(f'Database error occurred: {e}')
+        else:
+            logger.error(f'An unexpected error occurred: {e}')
+        logger.error(traceback.format_exc())
+        sys.exit(1)
+    finally:
+        common.close_db_pool()
+        logger.info('*** consolidate_stores END ***')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import errno
+import select
+import ctypes
+import ctypes.util
+import fnmatch
+
+# --- 定数 ---
+DEFAULT_PATTERN = 'enavi*.csv'
+TEMP_SUFFIXES = ('.crdownload', '.tmp', '.part')
+POLL_INTERVAL = 0.1
+STABLE_INTERVAL = 0.1
+
+# inotify (Linux) のイベント定義
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+INOTIFY_READ_SIZE = 4096
+
+
+def _load_libc():
+    """
+    inotify を利用できる場合は libc を読み込みます。
+
+    Returns:
+        ctypes.CDLL or None: libc。inotify を利用できない環境ではNone
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    libc_name = ctypes.util.find_library('c')
+    if not libc_name:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class DownloadWatcher:
+    """
+    専用のダウンロードディレクトリを監視し、ダウンロードが完了したファイルのパスを返します。
+
+    Linux では inotify でディレクトリの変更を待ち受け、それ以外の環境ではディレクトリをポーリングします。
+    一時ファイル (.crdownload など) は無視し、ファイルサイズが変化しなくなったことを確認してから完了とみなします。
+    """
+
+    def __init__(self, directory, pattern=DEFAULT_PATTERN):
+        """
+        Args:
+            directory (str): 監視するダウンロードディレクトリ
+            pattern (str, optional): 完了ファイルとみなすファイル名のパターン
+        """
+        self.directory = directory
+        self.pattern = pattern
+        self._fd = self._open_inotify(directory)
+
+    @staticmethod
+    def _open_inotify(directory):
+        libc = _load_libc()
+        if libc is None:
+            return None
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_MODIFY
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    @property
+    def uses_inotify(self):
+        return self._fd is not None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _find_candidate(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(TEMP_SUFFIXES) or not fnmatch.fnmatch(entry.name, self.pattern):
+                    continue
+                if entry.is_file():
+                    return entry.path
+        return None
+
+    def _has_started(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(TEMP_SUFFIXES) or fnmatch.fnmatch(entry.name, self.pattern):
+                    return True
+        return False
+
+    @staticmethod
+    def _is_stable(path):
+        try:
+            size = os.path.getsize(path)
+            time.sleep(STABLE_INTERVAL)
+            return os.path.getsize(path) == size
+        except FileNotFoundError:
+            return False
+
+    def _wait_for_change(self, timeout):
+        if self._fd is None:
+            time.sleep(min(timeout, POLL_INTERVAL))
+            return
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return
+        # 発生したイベントは読み捨てる (ディレクトリを再走査して判定する)
+        while True:
+            try:
+                os.read(self._fd, INOTIFY_READ_SIZE)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+
+    def wait(self, timeout):
+        """
+        ダウンロードが完了するまで待機します。
+
+        Args:
+            timeout (float): 最大待機時間 (秒)
+
+        Returns:
+            str or None: ダウンロードが完了したファイルのパス。タイムアウトした場合はNone
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            path = self._find_candidate()
+            if path and self._is_stable(path):
+                return path
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # 書き込み中のファイルがある場合は、サイズの変化を再確認するため短い間隔で待機する
+            self._wait_for_change(min(remaining, POLL_INTERVAL) if path else remaining)
+
+    def wait_started(self, timeout):
+        """
+        ダウンロードが開始され、一時ファイル (.crdownload など) または完了ファイルが作成されるまで待機します。
+
+        Args:
+            timeout (float): 最大待機時間 (秒)
+
+        Returns:
+            bool: ダウンロードが開始された場合はTrue。タイムアウトした場合はFalse
+        """
+        deadline = time.monotonic() + timeout
+        while not self._has_started():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._wait_for_change(remaining)
+        return True
@@ -0,0 +1,139 @@
+import queue
+import threading
+import importlib
+from logzero import logger
+import common
+from run_manifest import file_sha256
+
+# --- 定数 ---
+DEFAULT_QUEUE_SIZE = 2
+# 取込側の失敗を待つ間隔 (秒)。キューが満杯の場合に、ダウンロード側はこの間隔で中断の要否を確認する
+PUT_INTERVAL = 0.5
+# ダウンロードの終了を示す番兵
+_DONE = object()
+
+
+def is_enabled(config):
+    """
+    ダウンロードと取込を並行して行うパイプライン方式が有効かを判定します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        bool: [IMPORT] pipeline が true の場合はTrue
+    """
+    return config.getboolean("IMPORT", "pipeline", fallback=False)
+
+
+class _DownloadThread(threading.Thread):
+    """
+    10のダウンロードを実行し、完了したタブのCSVを上限付きのキューへ渡すスレッド。
+    キューが満杯の場合は取込側が取り出すまで待機し、取込側が失敗した場合はダウンロードを中断します。
+    """
+
+    def __init__(self, download_module, config, csv_queue):
+        super().__init__(name='download', daemon=True)
+        self.download_module = download_module
+        self.config = config
+        self.csv_queue = csv_queue
+        self.cancelled = threading.Event()
+        self.error = None
+
+    def _put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.csv_queue.put(item, timeout=PUT_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError('Import failed. Download cancelled.')
+
+    def run(self):
+        try:
+            self.download_module.run(self.config, lambda tab_no, csv_file_path: self._put((tab_no, csv_file_path)))
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self._put(_DONE)
+            except RuntimeError:
+                # 取込側が中断した場合は、番兵を渡さずに終了する
+                pass
+
+
+def run(config, connection, manifest=None):
+    """
+    明細CSVのダウンロード (10) とif_rakuten_cardへの取込 (11) をパイプラインで実行します。
+    ダウンロードは別スレッドで行い、完了したタブのCSVから順に、他のタブのダウンロード中に取込を開始します。
+    同一内容の行の出現回数 (行フィンガープリント) が従来の処理と一致するよう、取込は設定のタブ順で行います。
+    取込先のテーブルの準備 (table方式ではアカウントの行の削除) は最初のCSVを受け取ってから行い、
+    ログイン・ダウンロードの間に行ロックを保持したままトランザクションを待機させないようにします。
+    コミットは呼び出し元で行います。
+    タブの取込はダウンロード完了前に開始するため、内容が変わっていないタブの再取込の省略は行いません。
+    実行マニフェストを指定した場合は、取り込んだタブの内容と件数を記録します (保存はコミット後に呼び出し元で行います)。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト (common.get_account_configで生成したもの)
+        connection: データベース接続
+        manifest (run_manifest.RunManifest, optional): 実行マニフェスト
+
+    Raises:
+        Exception: ダウンロードで例外が発生した場合は、取込を確定せずにその例外を送出します
+    """
+    download_module = importlib.import_module('10createRakutenCardCsv')
+    import_module = importlib.import_module('11importCsvToIfRakutenCard')
+
+    tab_nos = common.get_tab_nos(config)
+    queue_size = config.getint("IMPORT", "pipeline_queue_size", fallback=DEFAULT_QUEUE_SIZE)
+    csv_queue = queue.Queue(maxsize=max(queue_size, 1))
+
+    downloader = _DownloadThread(download_module, config, csv_queue)
+    downloader.start()
+    try:
+        with connection.cursor() as cursor:
+            # --- ダウンロードが完了したタブから、タブ順に取込 ---
+            target_table = None
+            occurrences = {}
+            imported = {}
+            downloaded = {}
+            next_index = 0
+            while True:
+                item = csv_queue.get()
+                if item is _DONE:
+                    break
+                tab_no, csv_file_path = item
+                logger.info(f'Pipeline received tabNo={tab_no}: {csv_file_path}')
+                downloaded[tab_no] = csv_file_path
+                if target_table is None:
+                    # 最初のCSVを受け取ってから取込先のテーブルを準備する
+                    target_table = import_module.prepare_import(cursor, config)
+                while next_index < len(tab_nos) and tab_nos[next_index] in downloaded:
+                    tab_no = tab_nos[next_index]
+                    csv_file_path = downloaded.pop(tab_no)
+                    row_count = import_module.import_tab(cursor, config, tab_no, csv_file_path, target_table, occurrences)
+                    imported[tab_no] = (file_sha256(csv_file_path), row_count)
+                    next_index += 1
+
+            if downloader.error is not None:
+                raise downloader.error
+            if target_table is None:
+                target_table = import_module.prepare_import(cursor, config)
+
+            # --- ダウンロードできなかったタブを除き、残りのタブを取込 ---
+            for tab_no in tab_nos[next_index:]:
+                if tab_no not in downloaded:
+                    logger.warning(f'CSV for tabNo={tab_no} was not downloaded, skipping.')
+                    continue
+                csv_file_path = downloaded.pop(tab_no)
+                row_count = import_module.import_tab(cursor, config, tab_no, csv_file_path, target_table, occurrences)
+                imported[tab_no] = (file_sha256(csv_file_path), row_count)
+
+            # --- 差分反映 ---
+            import_module.finish_import(cursor, config, target_table)
+
+        if manifest is not None:
+            import_module.update_manifest_imports(manifest, config, imported)
+    finally:
+        downloader.cancelled.set()
+        downloader.join()
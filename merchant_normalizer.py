@@ -0,0 +1,81 @@
+import re
+import unicodedata
+
+# --- 定数 ---
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def get_suffix_patterns(config):
+    """
+    設定ファイルから、正規化時に末尾から除去する接尾辞の正規表現を取得します。
+    [STORE] suffix_patterns に1行に1つずつ指定します (NFKC・小文字化・空白除去後の文字列に対して適用します)。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        list: 正規表現の文字列のリスト
+    """
+    patterns = config.get("STORE", "suffix_patterns", fallback='')
+    return [pattern.strip() for pattern in patterns.splitlines() if pattern.strip()]
+
+
+class MerchantNormalizer:
+    """
+    利用店名・商品名から、表記の揺れを吸収した店舗の正規化キーを生成するクラス。
+
+    次の順で正規化します。
+        1. NFKC正規化 (全角英数字・記号を半角に、半角カナを全角に統一)
+        2. 小文字化 (casefold)
+        3. 空白の除去
+        4. 設定された接尾辞の除去 (一致しなくなるまで繰り返し、キーが空になる場合は除去しない)
+    """
+
+    def __init__(self, suffix_patterns=()):
+        """
+        Args:
+            suffix_patterns (iterable, optional): 末尾から除去する接尾辞の正規表現
+        """
+        self._suffix_patterns = [re.compile(f'(?:{pattern})$') for pattern in suffix_patterns]
+        self._cache = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Args:
+            config (configparser.ConfigParser): 設定オブジェクト
+
+        Returns:
+            MerchantNormalizer: 設定の接尾辞を除去する正規化クラス
+        """
+        return cls(get_suffix_patterns(config))
+
+    def normalize(self, name):
+        """
+        利用店名・商品名の正規化キーを返します。同じ店舗名は繰り返し出現するため、結果をキャッシュします。
+
+        Args:
+            name (str or None): 利用店名・商品名
+
+        Returns:
+            str or None: 正規化キー
+        """
+        if name is None:
+            return None
+        key = self._cache.get(name)
+        if key is None:
+            key = self._normalize(name)
+            self._cache[name] = key
+        return key
+
+    def _normalize(self, name):
+        key = WHITESPACE_PATTERN.sub('', unicodedata.normalize('NFKC', name).casefold())
+        stripped = True
+        while stripped:
+            stripped = False
+            for pattern in self._suffix_patterns:
+                candidate = pattern.sub('', key, count=1)
+                if candidate != key and candidate:
+                    key = candidate
+                    stripped = True
+        return key
@@ -0,0 +1,12 @@
+-- =============================================================
+-- 001 if_rakuten_card 差分取込用カラムの追加
+--   row_fingerprint : 明細1行を一意に識別する SHA-256
+--   delta_status    : '1' 未連携 / '0' 連携済み / '9' 明細から消失
+-- =============================================================
+ALTER TABLE if_rakuten_card ADD COLUMN IF NOT EXISTS row_fingerprint varchar(64);
+ALTER TABLE if_rakuten_card ADD COLUMN IF NOT EXISTS delta_status char(1) NOT NULL DEFAULT '1';
+
+CREATE UNIQUE INDEX IF NOT EXISTS if_rakuten_card_row_fingerprint_uidx
+    ON if_rakuten_card (row_fingerprint);
+CREATE INDEX IF NOT EXISTS if_rakuten_card_delta_status_idx
+    ON if_rakuten_card (delta_status);
@@ -0,0 +1,34 @@
+-- =============================================================
+-- 002 household_account_book 取引フィンガープリントの追加
+--   linking_fingerprint : 楽天カード連携 (linking_data_type = 1) の取引を一意に識別する MD5
+--   算出式は 12ifRakutenCardToRecsav.py の insert_account_book_data と一致させること
+-- =============================================================
+ALTER TABLE household_account_book ADD COLUMN IF NOT EXISTS linking_fingerprint varchar(32);
+
+-- 既存の連携済みデータのフィンガープリントをバックフィル
+WITH fp AS (
+  SELECT
+      hab.ctid AS row_id
+    , md5(
+        to_char(hab.actual_date, 'YYYY-MM-DD')
+        || '|' || s.store_nm
+        || '|' || hab.amount::bigint::text
+        || '|' || row_number() OVER (
+            PARTITION BY hab.actual_date, s.store_nm, hab.amount
+            ORDER BY hab.ctid
+          )
+      ) AS linking_fingerprint
+  FROM
+    household_account_book hab
+    INNER JOIN store s
+      ON s.store_cd = hab.store_cd
+  WHERE
+    hab.linking_data_type = 1
+)
+UPDATE household_account_book hab
+SET linking_fingerprint = fp.linking_fingerprint
+FROM fp
+WHERE hab.ctid = fp.row_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS household_account_book_linking_fingerprint_uidx
+    ON household_account_book (linking_fingerprint);
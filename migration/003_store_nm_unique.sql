@@ -0,0 +1,7 @@
+-- =============================================================
+-- 003 store 店舗名の一意インデックス
+--   12ifRakutenCardToRecsav.py の店舗登録 (INSERT ... ON CONFLICT (store_nm)) で使用
+--   既に同名の店舗が重複して登録されている場合は、統合してから適用すること
+-- =============================================================
+CREATE UNIQUE INDEX IF NOT EXISTS store_store_nm_uidx
+    ON store (store_nm);
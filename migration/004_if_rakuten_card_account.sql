@@ -0,0 +1,14 @@
+-- =============================================================
+-- 004 if_rakuten_card アカウント別の取込領域
+--   account_cd : settings.ini の [RAKUTEN:xxx] の xxx ([RAKUTEN] のみの場合は 'default')
+--   取込・削除・差分反映・連携はアカウント単位で行うため、行フィンガープリントの一意性もアカウント単位とする
+-- =============================================================
+ALTER TABLE if_rakuten_card ADD COLUMN IF NOT EXISTS account_cd varchar(32) NOT NULL DEFAULT 'default';
+
+DROP INDEX IF EXISTS if_rakuten_card_row_fingerprint_uidx;
+CREATE UNIQUE INDEX IF NOT EXISTS if_rakuten_card_account_row_fingerprint_uidx
+    ON if_rakuten_card (account_cd, row_fingerprint);
+
+DROP INDEX IF EXISTS if_rakuten_card_delta_status_idx;
+CREATE INDEX IF NOT EXISTS if_rakuten_card_account_delta_status_idx
+    ON if_rakuten_card (account_cd, delta_status);
@@ -0,0 +1,7 @@
+-- =============================================================
+-- 005 asset 年月・口座の一意インデックス
+--   90RecsavRecurringInput.py の資産データの繰り越し (INSERT ... ON CONFLICT (asset_year_month, deposit_account_cd)) で使用
+--   既に同じ年月・口座の行が重複して登録されている場合は、統合してから適用すること
+-- =============================================================
+CREATE UNIQUE INDEX IF NOT EXISTS asset_year_month_deposit_account_uidx
+    ON asset (asset_year_month, deposit_account_cd);
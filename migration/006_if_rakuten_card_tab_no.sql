@@ -0,0 +1,11 @@
+-- =============================================================
+-- 006 if_rakuten_card 取込元のタブ番号
+--   tab_no : 明細 CSV のタブ番号 (rakuten_card_tab{N}.csv の N)
+--   11importCsvToIfRakutenCard.py は、前回の取込から内容が変わっていないタブの行を削除・再取込せずに残すため、
+--   タブ単位で行を削除・件数を確認する
+--   既存の行は NULL のまま (次回の取込で全件再登録、または差分取込時に設定される)
+-- =============================================================
+ALTER TABLE if_rakuten_card ADD COLUMN IF NOT EXISTS tab_no smallint;
+
+CREATE INDEX IF NOT EXISTS if_rakuten_card_account_tab_no_idx
+    ON if_rakuten_card (account_cd, tab_no);
@@ -0,0 +1,14 @@
+-- =============================================================
+-- 007 merchant_classification_memo 利用店名・商品名ごとのカテゴリ分類結果のメモ
+--   merchant_key    : 前後の半角・全角スペースを除去した利用店名・商品名
+--   category_cd / linking_excluded_flg : 分類結果 (一致するマッピングキーがない場合は NULL)
+--   mapping_version : 分類に使用した category_mapping_config 全体の MD5
+--   12ifRakutenCardToRecsav.py は、category_mapping_config のチェックサムが異なる行を削除してから参照する
+-- =============================================================
+CREATE TABLE IF NOT EXISTS merchant_classification_memo (
+    merchant_key          varchar(256) PRIMARY KEY,
+    category_cd           integer,
+    linking_excluded_flg  char(1),
+    mapping_version       varchar(32) NOT NULL,
+    created_at            timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,12 @@
+-- =============================================================
+-- 008 store 正規化キーの追加
+--   normalized_key : 店舗名を merchant_normalizer.py で正規化したキー
+--                    (NFKC・小文字化・空白除去・[STORE] suffix_patterns の接尾辞除去)
+--   12ifRakutenCardToRecsav.py は正規化キーで店舗を検索・登録し、表記の揺れによる重複した店舗を登録しない
+--   既存の店舗のキーの設定と重複した店舗の統合は consolidate_stores.py で行うこと
+--   (正規化は Python で行うため、この SQL ではキーを設定しない)
+-- =============================================================
+ALTER TABLE store ADD COLUMN IF NOT EXISTS normalized_key varchar(256);
+
+CREATE INDEX IF NOT EXISTS store_normalized_key_idx
+    ON store (normalized_key);
@@ -0,0 +1,10 @@
+-- =============================================================
+-- 009 store 正規化キーの一意制約
+--   008 の適用後、consolidate_stores.py で既存の店舗の正規化キーを設定し、重複した店舗を統合してから適用すること
+--   (統合前に適用すると、同じキーの店舗が残っている場合に失敗する)
+--   12ifRakutenCardToRecsav.py は ON CONFLICT (normalized_key) で登録するため、
+--   複数のアカウントを並行して連携しても、表記の揺れが異なる同じ店舗を重複して登録しない
+-- =============================================================
+DROP INDEX IF EXISTS store_normalized_key_idx;
+CREATE UNIQUE INDEX IF NOT EXISTS store_normalized_key_uidx
+    ON store (normalized_key);
@@ -0,0 +1,284 @@
+import os
+import re
+import csv
+import codecs
+from datetime import date
+from logzero import logger
+
+# --- 定数 ---
+ENCODING_SAMPLE_SIZE = 64 * 1024
+FALLBACK_ENCODING = 'cp932'
+DEFAULT_BATCH_SIZE = 5000
+# 明細CSVのヘッダー名 (正規表現) → if_rakuten_card のカラム名
+# 支払金額・繰越残高のヘッダーは「10月支払金額」のように月を含むため、末尾で判定する
+HEADER_PATTERNS = [
+    ('usage_date', re.compile(r'^利用日$')),
+    ('merchant_product_name', re.compile(r'^利用店名・商品名?$')),
+    ('customer_nm', re.compile(r'^利用者$')),
+    ('payment_method', re.compile(r'^支払方法$')),
+    ('usage_amount', re.compile(r'^利用金額$')),
+    ('payment_fee', re.compile(r'^支払手数料$')),
+    ('total_payment_amount', re.compile(r'^支払総額$')),
+    ('payment_month', re.compile(r'^支払月$')),
+    ('monthly_payment_amount', re.compile(r'支払金額$')),
+    ('monthly_carryover_balance', re.compile(r'繰越残高$')),
+    ('new_signup_flag', re.compile(r'^新規サイン$')),
+]
+REQUIRED_COLUMNS = ('usage_date', 'merchant_product_name', 'total_payment_amount')
+# ヘッダーから列を判定できない場合に使用する、タブ番号ごとの従来の列位置
+LEGACY_LAYOUTS = {
+    0: ('usage_date', 'merchant_product_name', 'customer_nm', 'payment_method', 'usage_amount',
+        'payment_fee', 'total_payment_amount', 'payment_month'),
+    1: ('usage_date', 'merchant_product_name', 'customer_nm', 'payment_method', 'usage_amount',
+        'payment_fee', 'total_payment_amount', 'monthly_payment_amount', 'monthly_carryover_balance',
+        'new_signup_flag'),
+}
+DATE_PATTERN = re.compile(r'^\s*(\d{4})\s*[/\-.年]\s*(\d{1,2})\s*[/\-.月]\s*(\d{1,2})\s*日?\s*$')
+AMOUNT_STRIP_TABLE = str.maketrans('', '', ',，¥￥円 　')
+DATE_COLUMNS = frozenset(['usage_date'])
+AMOUNT_COLUMNS = frozenset([
+    'usage_amount', 'payment_fee', 'total_payment_amount', 'monthly_payment_amount', 'monthly_carryover_balance',
+])
+# 値が空の場合にNULLとするカラム。それ以外の文字列のカラムは、CSVに列がある場合は空文字のまま登録する
+NULL_IF_EMPTY_COLUMNS = DATE_COLUMNS | AMOUNT_COLUMNS | frozenset(['payment_month', 'new_signup_flag'])
+
+
+class CardRecord:
+    """
+    明細CSVの1行を型変換済みの値で保持するレコード。
+    __slots__ により1行あたりのメモリを抑えます。
+
+    source_key は変換前の各列の値を if_rakuten_card のカラム順に区切り文字で連結した文字列で、
+    行フィンガープリントの算出に使用します (存在しない列は空文字)。
+    """
+
+    __slots__ = (
+        'usage_date', 'merchant_product_name', 'customer_nm', 'payment_method',
+        'usage_amount', 'payment_fee', 'total_payment_amount', 'payment_month',
+        'monthly_payment_amount', 'monthly_carryover_balance', 'new_signup_flag',
+        'source_key',
+    )
+
+    # source_key を除く、if_rakuten_card の登録カラム順のフィールド
+    FIELDS = __slots__[:-1]
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def as_tuple(self):
+        """
+        Returns:
+            tuple: if_rakuten_card の登録カラム順の値
+        """
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+
+def detect_encoding(csv_file_path, sample_size=ENCODING_SAMPLE_SIZE):
+    """
+    CSVファイルの先頭を読み込み、文字コードを判定します。
+    BOM付きUTF-8、UTF-8として復号できる場合はUTF-8、それ以外はCP932 (Shift_JIS) と判定します。
+
+    Args:
+        csv_file_path (str): CSVファイルのパス
+        sample_size (int, optional): 判定に使用するバイト数
+
+    Returns:
+        str: Pythonのエンコーディング名
+    """
+    with open(csv_file_path, 'rb') as f:
+        sample = f.read(sample_size)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # 読み込み範囲の末尾で文字が途切れている場合を許容するため、インクリメンタルデコーダで判定する
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=len(sample) < sample_size)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+def map_columns(header, tab_no=None):
+    """
+    ヘッダー行から、if_rakuten_card のカラム名と列位置の対応を求めます。
+    必須の列が見つからない場合は、タブ番号に応じた従来の列位置を使用します。
+
+    Args:
+        header (list): ヘッダー行
+        tab_no (int, optional): CSVの種別を示すタブ番号
+
+    Returns:
+        dict: カラム名をキー、列位置を値とする辞書
+
+    Raises:
+        ValueError: ヘッダーから必須の列を判定できず、タブ番号も指定されていない場合
+    """
+    mapping = {}
+    for index, name in enumerate(header):
+        name = name.strip().lstrip('\ufeff')
+        for column, pattern in HEADER_PATTERNS:
+            if column not in mapping and pattern.search(name):
+                mapping[column] = index
+                break
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in mapping]
+    if not missing:
+        return mapping
+    if tab_no is None:
+        raise ValueError(f"Required columns not found in CSV header: {', '.join(missing)}")
+
+    logger.warning(f"Could not map CSV header ({', '.join(missing)} not found). Using the legacy layout for tabNo={tab_no}.")
+    layout = LEGACY_LAYOUTS[0 if tab_no == 0 else 1]
+    return {column: index for index, column in enumerate(layout)}
+
+
+def parse_amount(value):
+    """
+    金額の文字列を整数に変換します。桁区切りのカンマや円記号は除去します。
+
+    Args:
+        value (str): 金額の文字列
+
+    Returns:
+        int or None: 金額。空文字の場合はNone
+
+    Raises:
+        ValueError: 金額として解釈できない場合
+    """
+    value = value.translate(AMOUNT_STRIP_TABLE)
+    if not value:
+        return None
+    return int(value)
+
+
+class RakutenCardCsvParser:
+    """
+    楽天カードの明細CSVを逐次読み込み、型変換済みの CardRecord を一定件数ごとのバッチで返すパーサー。
+    列はヘッダー名から判定し、文字コードは UTF-8 / CP932 を自動判定します。
+    変換できない行はリジェクトファイルへ出力して読み飛ばします。
+    """
+
+    def __init__(self, csv_file_path, tab_no=None, encoding=None, reject_file_path=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            csv_file_path (str): CSVファイルのパス
+            tab_no (int, optional): CSVの種別を示すタブ番号 (ヘッダーから列を判定できない場合に使用)
+            encoding (str, optional): 文字コード。省略時は自動判定します。
+            reject_file_path (str, optional): リジェクトファイルのパス。省略時は変換できない行をログ出力のみ行います。
+            batch_size (int, optional): 1バッチあたりの最大件数
+        """
+        self.csv_file_path = csv_file_path
+        self.tab_no = tab_no
+        self.encoding = encoding or detect_encoding(csv_file_path)
+        self.reject_file_path = reject_file_path
+        self.batch_size = batch_size
+        self.row_count = 0
+        self.reject_count = 0
+        self._header = None
+        self._date_cache = {}
+        self._reject_file = None
+        self._reject_writer = None
+
+        # 前回実行時のリジェクトファイルが残っている場合は削除
+        if reject_file_path and os.path.exists(reject_file_path):
+            os.remove(reject_file_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        """
+        リジェクトファイルを閉じます。
+        """
+        if self._reject_file is not None:
+            self._reject_file.close()
+            self._reject_file = None
+            self._reject_writer = None
+
+    def _parse_date(self, value):
+        # 明細の利用日は重複が多いため、変換結果をキャッシュする
+        parsed = self._date_cache.get(value)
+        if parsed is None:
+            match = DATE_PATTERN.match(value)
+            if match is None:
+                raise ValueError(f"invalid date: {value!r}")
+            parsed = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+            self._date_cache[value] = parsed
+        return parsed
+
+    def _reject(self, line_no, row, reason):
+        self.reject_count += 1
+        logger.warning(f"Rejected line {line_no} of {self.csv_file_path}: {reason}")
+        if not self.reject_file_path:
+            return
+        if self._reject_writer is None:
+            self._reject_file = open(self.reject_file_path, 'w', encoding='utf-8-sig', newline='')
+            self._reject_writer = csv.writer(self._reject_file)
+            self._reject_writer.writerow(['line_no', 'reason'] + (self._header or []))
+        self._reject_writer.writerow([line_no, reason] + row)
+
+    def records(self):
+        """
+        CSVファイルを1行ずつ読み込み、型変換済みのレコードを返します。
+        利用日が空の行 (合計行など) は読み飛ばします。
+
+        Yields:
+            CardRecord: 明細1行のレコード
+        """
+        self._header = None
+        with open(self.csv_file_path, mode='r', encoding=self.encoding, newline='') as f:
+            reader = csv.reader(f)
+            self._header = next(reader, None)
+            if self._header is None:
+                return
+            mapping = map_columns(self._header, self.tab_no)
+            # 変換処理をループの外で決めておき、1行あたりの判定を減らす
+            converters = [
+                (column, mapping.get(column), self._parse_date if column in DATE_COLUMNS
+                 else parse_amount if column in AMOUNT_COLUMNS else None)
+                for column in CardRecord.FIELDS
+            ]
+            usage_date_index = mapping['usage_date']
+
+            for row in reader:
+                if len(row) <= usage_date_index or not row[usage_date_index]:
+                    continue
+
+                record = CardRecord()
+                raw_values = []
+                try:
+                    for column, index, converter in converters:
+                        raw = row[index] if index is not None and index < len(row) else ''
+                        raw_values.append(raw)
+                        if raw == '':
+                            if index is not None and column not in NULL_IF_EMPTY_COLUMNS:
+                                setattr(record, column, raw)
+                            continue
+                        setattr(record, column, converter(raw) if converter else raw)
+                except ValueError as e:
+                    self._reject(reader.line_num, row, str(e))
+                    continue
+
+                record.source_key = '\x1f'.join(raw_values)
+                self.row_count += 1
+                yield record
+
+    def batches(self):
+        """
+        レコードを batch_size 件ずつのリストにまとめて返します。
+
+        Yields:
+            list: CardRecord のリスト
+        """
+        batch = []
+        for record in self.records():
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
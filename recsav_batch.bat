@@ -4,28 +4,15 @@ REM カレントディレクトリへ移動
 pushd %~dp0
 
 REM =============================================================
-REM 00 Webドライバーを最新化
-REM =============================================================
-python 00updateWebDriver.py
-
-REM =============================================================
-REM 10 楽天カードから情報を取得してCSVに出力
-REM =============================================================
-python 10createRakutenCardCsv.py
-
-REM =============================================================
-REM 11 if_rakuten_cardテーブルへCSVをインポート
-REM =============================================================
-python 11importCsvToIfRakutenCard.py
-
-REM =============================================================
-REM 12 if_rakuten_card → household_account_bookへのデータ連携
-REM =============================================================
-python 12ifRakutenCardToRecsav.py
-
-REM =============================================================
-REM 99 毎月1日に繰り返し入力設定の内容をhousehold_account_bookへ反映
-REM =============================================================
-python 90RecsavRecurringInput.py
+REM 00 → 10 → 11 → 12 → 90 を1プロセスで順番に実行
+REM   00 Webドライバーを最新化
+REM   10 楽天カードから情報を取得してCSVに出力
+REM   11 if_rakuten_cardテーブルへCSVをインポート
+REM   12 if_rakuten_card → household_account_bookへのデータ連携
+REM   90 毎月1日に繰り返し入力設定の内容をhousehold_account_bookへ反映
+REM =============================================================
+python recsav_batch.py
+set EXIT_CODE=%ERRORLEVEL%
 
-exit 0
+popd
+exit /b %EXIT_CODE%
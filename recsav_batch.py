@@ -0,0 +1,377 @@
+import os
+import sys
+import argparse
+import importlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from logzero import logger
+import common
+import import_pipeline
+from run_manifest import RunManifest
+
+# --- 定数 ---
+# ステージ番号 → (モジュール名, DB接続を使用するか)
+STAGES = {
+    '00': ('00updateWebDriver', False),
+    '10': ('10createRakutenCardCsv', False),
+    '11': ('11importCsvToIfRakutenCard', True),
+    '12': ('12ifRakutenCardToRecsav', True),
+    '90': ('90RecsavRecurringInput', True),
+}
+# アカウントごとに実行するステージ
+ACCOUNT_STAGES = ('10', '11', '12')
+# ステージ番号 → 再実行した場合に結果が古くなる (再実行が必要な) 後続のステージ
+STAGE_DEPENDENTS = {
+    '10': ('11', '12'),
+    '11': ('12',),
+}
+
+
+def parse_args(argv=None):
+    """
+    コマンドライン引数を解析します。
+
+    Args:
+        argv (list, optional): 引数のリスト。省略時はsys.argvを使用します。
+
+    Returns:
+        argparse.Namespace: 解析結果
+    """
+    parser = argparse.ArgumentParser(description='recsavへのデータ連携バッチを1プロセスで実行します。')
+    parser.add_argument('--only', nargs='+', choices=STAGES.keys(), help='指定したステージのみ実行します。例: --only 11 12')
+    parser.add_argument('--skip', nargs='+', choices=STAGES.keys(), default=[], help='指定したステージを実行しません。例: --skip 00 10')
+    parser.add_argument('--date', type=str, help='90で使用する実行日をYYYY-MM-DD形式で指定します。')
+    parser.add_argument('--account', nargs='+', help='10〜12を実行するアカウントコード ([RAKUTEN:xxx] の xxx) を指定します。')
+    parser.add_argument('--force', action='store_true', help='同じ実行日に完了済みのステージも省略せずに実行します。')
+    return parser.parse_args(argv)
+
+
+def select_stages(only, skip):
+    """
+    実行対象のステージ番号を実行順に返します。
+
+    Args:
+        only (list or None): 実行するステージ番号。Noneの場合は全ステージ
+        skip (list): 実行しないステージ番号
+
+    Returns:
+        list: 実行対象のステージ番号
+    """
+    return [stage_no for stage_no in STAGES if (only is None or stage_no in only) and stage_no not in skip]
+
+
+def run_stage(stage_no, config, connection, execution_date, manifest=None):
+    """
+    指定されたステージを実行します。
+
+    Args:
+        stage_no (str): ステージ番号
+        config (configparser.ConfigParser): 設定オブジェクト
+        connection: データベース接続 (DBを使用しないステージではNone)
+        execution_date (datetime.date): 90で使用する実行日
+        manifest (run_manifest.RunManifest, optional): 11で内容が変わっていないタブの再取込を省略するための実行マニフェスト
+    """
+    module_name, _ = STAGES[stage_no]
+    module = importlib.import_module(module_name)
+
+    if stage_no == '90':
+        module.run(config, connection, execution_date)
+    elif stage_no == '11':
+        module.run(config, connection, manifest)
+    elif connection is not None:
+        module.run(config, connection)
+    else:
+        module.run(config)
+
+
+def is_skippable(manifest, config, stage_no):
+    """
+    同じ実行日に完了済みで、再実行を省略できるステージかを判定します。
+    一時テーブル方式の11は、取込先の一時テーブルが実行したプロセスの終了とともに削除されるため、12も完了している場合のみ省略できます。
+
+    Args:
+        manifest (run_manifest.RunManifest): 実行マニフェスト
+        config (configparser.ConfigParser): 設定オブジェクト
+        stage_no (str): ステージ番号
+
+    Returns:
+        bool: 省略できる場合はTrue
+    """
+    if not manifest.is_completed(stage_no):
+        return False
+    if stage_no == '11' and common.get_staging_mode(config) == common.STAGING_MODE_TEMP:
+        return manifest.is_completed('12')
+    return True
+
+
+def record_stage_completion(manifest, config, stage_no):
+    """
+    ステージの完了を実行マニフェストに記録して保存します。10の場合は、ダウンロードしたCSVのSHA-256も記録します。
+    10で一部のタブのCSVをダウンロードできなかった場合は、再実行時にダウンロードし直すよう完了を記録しません。
+
+    Args:
+        manifest (run_manifest.RunManifest): 実行マニフェスト
+        config (configparser.ConfigParser): 設定オブジェクト
+        stage_no (str): ステージ番号
+    """
+    if stage_no == '10':
+        csv_prefix = config["RAKUTEN"]["csv_file_nm_prefix"]
+        csv_file_paths = {
+            tab_no: os.path.join(config["OUTPUT"]["dir"], f'{csv_prefix}_tab{tab_no}.csv')
+            for tab_no in common.get_tab_nos(config)
+        }
+        manifest.record_downloads(csv_file_paths)
+        missing = [str(tab_no) for tab_no, path in csv_file_paths.items() if not os.path.exists(path)]
+        if missing:
+            logger.warning(f"CSV for tabNo={', '.join(missing)} was not downloaded. Stage 10 will run again on rerun.")
+            manifest.save()
+            return
+    manifest.complete_stage(stage_no, STAGE_DEPENDENTS.get(stage_no, ()))
+    manifest.save()
+
+
+def run_stages(stage_nos, config, execution_date, force=False):
+    """
+    指定されたステージを順番に実行します。DBを使用するステージは1つの接続を共有し、ステージごとに1トランザクションで実行します。
+    いずれかのステージが失敗した場合は、以降のステージを実行せずに終了します。
+    [IMPORT] pipeline が有効で10と11を実行する場合は、10のダウンロードと並行して11の取込を1トランザクションで実行します。
+
+    各ステージの完了は [OUTPUT] dir の実行マニフェストに記録し、同じ実行日の再実行では、
+    先頭から続く完了済みのステージを省略します (途中のステージを実行した場合、以降のステージはすべて実行します)。
+
+    Args:
+        stage_nos (list): 実行するステージ番号
+        config (configparser.ConfigParser): 設定オブジェクト
+        execution_date (datetime.date): 90で使用する実行日
+        force (bool, optional): Trueの場合は完了済みのステージも省略しない
+
+    Returns:
+        bool: 全ステージが正常終了した場合はTrue
+    """
+    manifest = RunManifest.load(config, execution_date.isoformat())
+    stage_nos = list(stage_nos)
+    while stage_nos and not force and is_skippable(manifest, config, stage_nos[0]):
+        logger.info(f'Stage {stage_nos[0]} already completed on {manifest.run_key}, skipping.')
+        common.increment('stages_skipped', stage=stage_nos[0])
+        stage_nos.pop(0)
+
+    pipelined = '10' in stage_nos and '11' in stage_nos and import_pipeline.is_enabled(config)
+    with ExitStack() as stack:
+        connection = None
+        for stage_no in stage_nos:
+            module_name, uses_db = STAGES[stage_no]
+            if pipelined and stage_no == '11':
+                # 10と合わせてパイプラインで実行済み
+                continue
+            if pipelined and stage_no == '10':
+                module_name, uses_db = 'import_pipeline (10 + 11)', True
+            logger.info(f'*** {module_name} START ***')
+            try:
+                with common.timer('stage', stage=stage_no):
+                    if not uses_db:
+                        run_stage(stage_no, config, None, execution_date)
+                        record_stage_completion(manifest, config, stage_no)
+                        continue
+
+                    # --- DB接続 (最初にDBを使用するステージでプールから1度だけ取得し、以降のステージで共有) ---
+                    if connection is None:
+                        connection = stack.enter_context(common.pooled_connection(config))
+
+                    # --- ステージごとに1トランザクションで実行 ---
+                    with common.transaction(connection):
+                        if pipelined and stage_no == '10':
+                            import_pipeline.run(config, connection, manifest)
+                        else:
+                            run_stage(stage_no, config, connection, execution_date, manifest)
+
+                    # --- コミット後に完了を記録 ---
+                    record_stage_completion(manifest, config, stage_no)
+                    if pipelined and stage_no == '10':
+                        record_stage_completion(manifest, config, '11')
+
+            except Exception as e:
+                logger.error(f'Stage {stage_no} failed: {e}')
+                logger.error(traceback.format_exc())
+                common.increment('stage_failures', stage=stage_no)
+                return False
+            finally:
+                logger.info(f'*** {module_name} END ***')
+    return True
+
+
+def run_account_stages(account_cd, stage_nos, execution_date, force=False):
+    """
+    1アカウント分のステージ (10〜12) を実行します。プロセスプールのワーカープロセスで実行するため、
+    設定の読み込み・ログ設定・DB接続プールの生成をプロセスごとに行います。
+    ログはアカウントごとのログファイルに出力し、計測値は呼び出し元のプロセスで集計するため戻り値で返します。
+
+    Args:
+        account_cd (str): アカウントコード
+        stage_nos (list): 実行するステージ番号
+        execution_date (datetime.date): 90で使用する実行日
+        force (bool, optional): Trueの場合は完了済みのステージも省略しない
+
+    Returns:
+        tuple: (全ステージが正常終了した場合はTrue, common.get_metricsの計測値)
+    """
+    config = common.get_account_config(common.load_config(), account_cd)
+    common.setup_logger(common.get_account_log_path(config["LOG"]["path"], account_cd))
+    common.reset_metrics()
+    common.set_default_labels(account=account_cd)
+    logger.info(f'*** account {account_cd} START ***')
+    try:
+        return run_stages(stage_nos, config, execution_date, force), common.get_metrics()
+    except Exception as e:
+        logger.error(f'An unexpected error occurred for account {account_cd}: {e}')
+        logger.error(traceback.format_exc())
+        return False, common.get_metrics()
+    finally:
+        common.close_db_pool()
+        logger.info(f'*** account {account_cd} END ***')
+
+
+def run_accounts(account_cds, stage_nos, config, execution_date, force=False, in_process=False):
+    """
+    各アカウントのステージを実行します。複数のアカウントがある場合はプロセスプールで並行して実行し、
+    1つのアカウントの失敗が他のアカウントの処理を止めないようにします。
+    in_process を指定した場合は、このプロセスの接続プールを使用して1アカウントずつ順番に実行します。
+
+    Args:
+        account_cds (list): アカウントコードのリスト
+        stage_nos (list): 実行するステージ番号
+        config (configparser.ConfigParser): 設定オブジェクト
+        execution_date (datetime.date): 90で使用する実行日
+        force (bool, optional): Trueの場合は完了済みのステージも省略しない
+        in_process (bool, optional): Trueの場合はプロセスプールを使用せずに順番に実行する
+
+    Returns:
+        list: 失敗したアカウントコードのリスト
+    """
+    if len(account_cds) == 1 or in_process:
+        # 1アカウントのみの場合は、プロセスを起動せずにこのプロセスで実行する
+        failed_accounts = []
+        for account_cd in account_cds:
+            account_config = common.get_account_config(config, account_cd)
+            common.set_default_labels(account=account_cd)
+            try:
+                if not run_stages(stage_nos, account_config, execution_date, force):
+                    failed_accounts.append(account_cd)
+            finally:
+                common.set_default_labels()
+        return failed_accounts
+
+    max_workers = config.getint("RAKUTEN", "account_workers", fallback=len(account_cds))
+    logger.info(f'Running {len(account_cds)} accounts in parallel (workers: {max_workers}).')
+    failed_accounts = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            account_cd: executor.submit(run_account_stages, account_cd, stage_nos, execution_date, force)
+            for account_cd in account_cds
+        }
+        for account_cd, future in futures.items():
+            try:
+                succeeded, metrics = future.result()
+                common.merge_metrics(metrics)
+            except Exception as e:
+                logger.error(f'Worker process for account {account_cd} failed: {e}')
+                succeeded = False
+            if succeeded:
+                logger.info(f'Account {account_cd} completed.')
+            else:
+                logger.error(f'Account {account_cd} failed. See: {common.get_account_log_path(config["LOG"]["path"], account_cd)}')
+                failed_accounts.append(account_cd)
+    return failed_accounts
+
+
+def run_batch(config, stage_nos, account_cds, execution_date, force=False, in_process=False):
+    """
+    00 → アカウントごとの 10〜12 → 90 の順に、指定されたステージを実行します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+        stage_nos (list): 実行するステージ番号 (select_stagesの戻り値)
+        account_cds (list): 10〜12を実行するアカウントコードのリスト
+        execution_date (datetime.date): 90で使用する実行日
+        force (bool, optional): Trueの場合は完了済みのステージも省略しない
+        in_process (bool, optional): Trueの場合はアカウントをプロセスプールを使用せずに順番に実行する
+
+    Returns:
+        tuple: (全ステージが正常終了した場合はTrue, 10〜12が正常終了したアカウントコードのset)
+    """
+    pre_stages = [stage_no for stage_no in stage_nos if stage_no < ACCOUNT_STAGES[0]]
+    account_stages = [stage_no for stage_no in stage_nos if stage_no in ACCOUNT_STAGES]
+    post_stages = [stage_no for stage_no in stage_nos if stage_no > ACCOUNT_STAGES[-1]]
+
+    if not run_stages(pre_stages, config, execution_date, force):
+        return False, set()
+
+    failed_accounts = (run_accounts(account_cds, account_stages, config, execution_date, force, in_process)
+                       if account_stages else [])
+    completed_accounts = set(account_cds) - set(failed_accounts) if account_stages else set()
+
+    # --- アカウント単位の失敗は他の処理に影響しないため、90は継続して実行する ---
+    if not run_stages(post_stages, config, execution_date, force):
+        return False, completed_accounts
+
+    if failed_accounts:
+        logger.error(f"Failed accounts: {', '.join(failed_accounts)}")
+        return False, completed_accounts
+    return True, completed_accounts
+
+
+def main(argv=None):
+    """
+    メイン処理
+    00 → アカウントごとの 10〜12 → 90 の順に実行します。
+
+    Returns:
+        int: 終了コード (正常終了時は0、いずれかのステージが失敗した場合は1)
+    """
+    args = parse_args(argv)
+    config = None
+    exit_code = 1
+    try:
+        # --- 初期設定 ---
+        config = common.load_config()
+        common.setup_logger(config["LOG"]["path"])
+        common.reset_metrics()
+
+        if args.date:
+            try:
+                execution_date = datetime.strptime(args.date, '%Y-%m-%d').date()
+            except ValueError:
+                logger.error("Invalid date format. Please use YYYY-MM-DD.")
+                return 1
+        else:
+            execution_date = datetime.today().date()
+
+        account_cds = common.get_account_cds(config)
+        if args.account:
+            unknown = [account_cd for account_cd in args.account if account_cd not in account_cds]
+            if unknown:
+                logger.error(f"Unknown account: {', '.join(unknown)}")
+                return 1
+            account_cds = [account_cd for account_cd in account_cds if account_cd in args.account]
+
+        logger.info('*** recsav_batch START ***')
+
+        stage_nos = select_stages(args.only, args.skip)
+        succeeded, _ = run_batch(config, stage_nos, account_cds, execution_date, args.force)
+        if succeeded:
+            exit_code = 0
+        return exit_code
+
+    except Exception as e:
+        logger.error(f'An unexpected error occurred: {e}')
+        logger.error(traceback.format_exc())
+        return 1
+    finally:
+        common.close_db_pool()
+        if config is not None:
+            common.write_run_report(config, 'recsav_batch', exit_code == 0)
+        logger.info('*** recsav_batch END ***')
+
+if __name__ == "__main__":
+    sys.exit(main())
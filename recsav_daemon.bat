@@ -0,0 +1,17 @@
+@echo off
+
+REM カレントディレクトリへ移動
+pushd %~dp0
+
+REM =============================================================
+REM recsav_batch を常駐して実行 (タスクスケジューラの代わりにログオン時などに1回起動)
+REM   [DAEMON] run_time       に 00 → 10 → 11 → 12 を実行
+REM   [DAEMON] recurring_time に 90 を実行
+REM   [OUTPUT] dir の rakuten_card_tab*.csv が更新されたら 11 → 12 を実行
+REM 停止: python recsav_daemon.py --send stop
+REM =============================================================
+python recsav_daemon.py
+set EXIT_CODE=%ERRORLEVEL%
+
+popd
+exit /b %EXIT_CODE%
@@ -0,0 +1,520 @@
+import gc
+import os
+import sys
+import json
+import glob
+import queue
+import signal
+import socket
+import argparse
+import importlib
+import threading
+import traceback
+import socketserver
+import ctypes
+import ctypes.util
+from datetime import datetime, timedelta
+from logzero import logger
+import common
+import recsav_batch
+
+# --- 定数 ---
+DEFAULT_RUN_TIME = '06:00'
+DEFAULT_RECURRING_TIME = '00:10'
+DEFAULT_WATCH_INTERVAL = 5
+DEFAULT_CONTROL_PORT = 50025
+CONTROL_HOST = '127.0.0.1'
+CONTROL_TIMEOUT = 10
+RUN_NAME = 'recsav_daemon'
+# ジョブの種類
+JOB_RUN = 'run'
+JOB_IMPORT = 'import'
+JOB_RECURRING = 'recurring'
+# 制御ソケットで受け付けるコマンド
+COMMANDS = (JOB_RUN, JOB_IMPORT, JOB_RECURRING, 'status', 'stop')
+
+
+def parse_args(argv=None):
+    """
+    コマンドライン引数を解析します。
+
+    Args:
+        argv (list, optional): 引数のリスト。省略時はsys.argvを使用します。
+
+    Returns:
+        argparse.Namespace: 解析結果
+    """
+    parser = argparse.ArgumentParser(
+        description='recsavへのデータ連携バッチを常駐して実行します (スケジュール実行・CSVの監視・制御ソケット)。')
+    parser.add_argument('--send', nargs='+', metavar='COMMAND',
+                        help=f"起動中のデーモンへコマンドを送信し、結果を表示します ({' / '.join(COMMANDS)})。"
+                             "run は --force を付けると完了済みのステージも再実行します。例: --send run --force")
+    return parser.parse_args(argv)
+
+
+def parse_time(value):
+    """
+    HH:MM形式の時刻を解析します。
+
+    Args:
+        value (str): 時刻の文字列
+
+    Returns:
+        datetime.time: 時刻
+    """
+    return datetime.strptime(value.strip(), '%H:%M').time()
+
+
+def get_next_time(scheduled_time, now):
+    """
+    現在日時より後で、最初に指定した時刻となる日時を返します。
+
+    Args:
+        scheduled_time (datetime.time): 実行時刻
+        now (datetime.datetime): 現在日時
+
+    Returns:
+        datetime.datetime: 次回の実行日時
+    """
+    next_time = datetime.combine(now.date(), scheduled_time)
+    if next_time <= now:
+        next_time += timedelta(days=1)
+    return next_time
+
+
+def get_control_port(config):
+    """
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        int: 制御ソケットのポート番号 ([DAEMON] control_port)
+    """
+    return config.getint("DAEMON", "control_port", fallback=DEFAULT_CONTROL_PORT)
+
+
+def release_memory():
+    """
+    1回の実行で確保したメモリを解放します。
+    計測値・店舗キャッシュを破棄してガベージコレクションを行い、Linux (glibc) では空きヒープをOSへ返却します。
+    """
+    common.reset_metrics()
+    if '12ifRakutenCardToRecsav' in sys.modules:
+        sys.modules['12ifRakutenCardToRecsav'].clear_store_cache()
+    gc.collect()
+    if sys.platform.startswith('linux'):
+        libc_name = ctypes.util.find_library('c')
+        try:
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError, TypeError):
+            pass
+
+
+class CsvWatcher:
+    """
+    各アカウントの [OUTPUT] dir の明細CSV (rakuten_card_tab*.csv) を定期的に確認し、
+    新しく出力された、または更新されたCSVのアカウントを返すクラス。
+    書き込み中のCSVを取り込まないよう、更新日時とサイズが2回続けて変わらなかった場合に変更とみなします。
+    """
+
+    def __init__(self, config, account_cds):
+        """
+        Args:
+            config (configparser.ConfigParser): 設定オブジェクト
+            account_cds (list): 監視するアカウントコードのリスト
+        """
+        self.patterns = {}
+        for account_cd in account_cds:
+            account_config = common.get_account_config(config, account_cd)
+            csv_prefix = account_config["RAKUTEN"]["csv_file_nm_prefix"]
+            self.patterns[account_cd] = os.path.join(glob.escape(account_config["OUTPUT"]["dir"]),
+                                                      f'{glob.escape(csv_prefix)}_tab*.csv')
+        self.baseline = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def _snapshot(self, account_cd):
+        snapshot = {}
+        for path in glob.glob(self.patterns[account_cd]):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def reset(self, account_cds=None):
+        """
+        現在のCSVの状態を基準とします。バッチ自身がダウンロードしたCSVを再度取り込まないよう、
+        ダウンロードを行うジョブの終了後に、そのジョブが取込まで正常終了したアカウントについて呼び出します。
+
+        Args:
+            account_cds (iterable, optional): 基準を更新するアカウントコード。省略時は全アカウント
+        """
+        with self.lock:
+            for account_cd in (self.patterns if account_cds is None else account_cds):
+                self.baseline[account_cd] = self._snapshot(account_cd)
+                self.pending.pop(account_cd, None)
+
+    def scan(self):
+        """
+        CSVの状態を確認します。
+
+        Returns:
+            list: 前回の基準からCSVが変更され、書き込みが完了したアカウントコードのリスト
+        """
+        changed = []
+        with self.lock:
+            for account_cd in self.patterns:
+                snapshot = self._snapshot(account_cd)
+                if snapshot == self.baseline[account_cd]:
+                    self.pending.pop(account_cd, None)
+                    continue
+                if self.pending.get(account_cd) == snapshot:
+                    changed.append(account_cd)
+                    self.baseline[account_cd] = snapshot
+                    del self.pending[account_cd]
+                else:
+                    self.pending[account_cd] = snapshot
+        return changed
+
+
+class RecsavDaemon:
+    """
+    接続プールを保持したまま常駐し、ジョブを1つずつ順番に実行するデーモン。
+
+    ジョブは次の契機で登録し、同じジョブが実行待ちの場合は重複して登録しません。
+        - run       : [DAEMON] run_time に 00・10・11・12 を実行
+        - import    : 明細CSVの更新を検知したアカウントの 11・12 を実行
+        - recurring : [DAEMON] recurring_time に 90 を実行 (月初に実行できなかった月もまとめて登録)
+    """
+
+    def __init__(self, config):
+        """
+        Args:
+            config (configparser.ConfigParser): 設定オブジェクト
+        """
+        self.config = config
+        self.account_cds = common.get_account_cds(config)
+        self.watch_interval = config.getfloat("DAEMON", "watch_interval", fallback=DEFAULT_WATCH_INTERVAL)
+        self.watcher = CsvWatcher(config, self.account_cds) if config.getboolean("DAEMON", "watch", fallback=True) else None
+
+        now = datetime.now()
+        self.schedules = {}
+        for job_type, option, default in ((JOB_RUN, 'run_time', DEFAULT_RUN_TIME),
+                                          (JOB_RECURRING, 'recurring_time', DEFAULT_RECURRING_TIME)):
+            value = config.get("DAEMON", option, fallback=default)
+            if value.strip():
+                scheduled_time = parse_time(value)
+                self.schedules[job_type] = (scheduled_time, get_next_time(scheduled_time, now))
+
+        self.stop_event = threading.Event()
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.queued = []
+        self.current_job = None
+        self.last_results = {}
+        self.started_at = now
+
+    # --- ジョブの登録・状態 ---
+
+    def submit(self, job_type, account_cd=None, force=False):
+        """
+        ジョブを登録します。同じジョブが実行待ちの場合は登録しません。
+
+        Args:
+            job_type (str): ジョブの種類 (run / import / recurring)
+            account_cd (str, optional): import の対象アカウントコード。省略時は全アカウント
+            force (bool, optional): run で完了済みのステージも再実行する場合はTrue
+
+        Returns:
+            bool: 登録した場合はTrue
+        """
+        job = (job_type, account_cd, force)
+        with self.lock:
+            if job in self.queued:
+                return False
+            self.queued.append(job)
+        self.jobs.put(job)
+        logger.info(f"Job queued: {self._describe(job)}")
+        return True
+
+    def get_status(self):
+        """
+        Returns:
+            dict: 実行中・実行待ちのジョブ、ジョブごとの最終結果、次回の実行予定
+        """
+        with self.lock:
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'state': 'running' if self.current_job else 'idle',
+                'current_job': self._describe(self.current_job) if self.current_job else None,
+                'queued': [self._describe(job) for job in self.queued],
+                'last_results': dict(self.last_results),
+                'next_scheduled': {job_type: next_time.isoformat(timespec='seconds')
+                                   for job_type, (_, next_time) in self.schedules.items()},
+            }
+
+    @staticmethod
+    def _describe(job):
+        job_type, account_cd, force = job
+        description = job_type if account_cd is None else f'{job_type}:{account_cd}'
+        return f'{description} (force)' if force else description
+
+    # --- ジョブの実行 ---
+
+    def run_job(self, job):
+        """
+        ジョブを実行します。
+
+        Args:
+            job (tuple): (ジョブの種類, アカウントコード, force)
+
+        Returns:
+            bool: 正常終了した場合はTrue
+        """
+        job_type, account_cd, force = job
+        execution_date = datetime.today().date()
+        if job_type == JOB_RUN:
+            stage_nos = recsav_batch.select_stages(None, ['90'])
+            succeeded, completed_accounts = recsav_batch.run_batch(self.config, stage_nos, self.account_cds,
+                                                                   execution_date, force, in_process=True)
+            if self.watcher is not None:
+                # 10〜12が正常終了したアカウントのみ基準とする
+                # (失敗したアカウントのCSVや、他のジョブの実行中に出力されたCSVは、次の監視で取り込む)
+                self.watcher.reset(completed_accounts)
+            return succeeded
+        if job_type == JOB_IMPORT:
+            account_cds = [account_cd] if account_cd else self.account_cds
+            # 内容が変わっていないタブは実行マニフェストにより再取込を省略するため、常に11から実行する
+            return not recsav_batch.run_accounts(account_cds, ['11', '12'], self.config, execution_date,
+                                                 force=True, in_process=True)
+        if job_type == JOB_RECURRING:
+            return self.run_recurring(execution_date)
+        raise ValueError(f'Unknown job: {job_type}')
+
+    def run_recurring(self, execution_date):
+        """
+        90を実行します。前回の登録日以降の未登録の月初をまとめて登録し、登録日が未設定の場合は実行日のみ処理します。
+
+        Args:
+            execution_date (datetime.date): 実行日
+
+        Returns:
+            bool: 正常終了した場合はTrue
+        """
+        module = importlib.import_module(recsav_batch.STAGES['90'][0])
+        logger.info('*** 90 RecsavRecurringInput START ***')
+        try:
+            with common.timer('stage', stage='90'):
+                with common.db_transaction(self.config) as connection:
+                    try:
+                        module.run_backfill(self.config, connection, date_to=execution_date)
+                    except ValueError as e:
+                        logger.warning(f'{e} Running for the execution date only.')
+                        module.run(self.config, connection, execution_date)
+            return True
+        except Exception as e:
+            logger.error(f'Stage 90 failed: {e}')
+            logger.error(traceback.format_exc())
+            common.increment('stage_failures', stage='90')
+            return False
+        finally:
+            logger.info('*** 90 RecsavRecurringInput END ***')
+
+    def work(self):
+        """
+        実行待ちのジョブを1つずつ実行するワーカースレッドの処理。
+        ジョブごとに実行レポートを出力し、計測値・キャッシュを破棄して待機中のメモリ使用量を抑えます。
+        """
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            with self.lock:
+                self.queued.remove(job)
+                self.current_job = job
+            description = self._describe(job)
+            logger.info(f'*** {RUN_NAME} job {description} START ***')
+            started = datetime.now()
+            succeeded = False
+            try:
+                succeeded = self.run_job(job)
+            except Exception as e:
+                logger.error(f'An unexpected error occurred: {e}')
+                logger.error(traceback.format_exc())
+            finally:
+                if not succeeded:
+                    # 切断された接続を使い続けないよう、失敗時は接続プールを作り直す
+                    common.close_db_pool()
+                common.write_run_report(self.config, RUN_NAME, succeeded)
+                release_memory()
+                with self.lock:
+                    self.current_job = None
+                    self.last_results[description] = {
+                        'started_at': started.isoformat(timespec='seconds'),
+                        'finished_at': datetime.now().isoformat(timespec='seconds'),
+                        'succeeded': succeeded,
+                    }
+                logger.info(f'*** {RUN_NAME} job {description} END ***')
+
+    # --- スケジュール・監視 ---
+
+    def tick(self, now):
+        """
+        実行時刻を過ぎたスケジュールと、明細CSVの更新を確認してジョブを登録します。
+
+        Args:
+            now (datetime.datetime): 現在日時
+        """
+        for job_type, (scheduled_time, next_time) in list(self.schedules.items()):
+            if now >= next_time:
+                self.submit(job_type)
+                self.schedules[job_type] = (scheduled_time, get_next_time(scheduled_time, now))
+
+        if self.watcher is not None and self.current_job is None and self.jobs.empty():
+            for account_cd in self.watcher.scan():
+                logger.info(f'New statement CSV detected for account {account_cd}.')
+                self.submit(JOB_IMPORT, account_cd)
+
+    def serve_forever(self):
+        """
+        停止するまでスケジュールと明細CSVを確認し、ジョブを実行します。
+        """
+        worker = threading.Thread(target=self.work, name='worker', daemon=True)
+        worker.start()
+        try:
+            while not self.stop_event.is_set():
+                self.tick(datetime.now())
+                self.stop_event.wait(self.watch_interval)
+        finally:
+            # --- 実行中のジョブの終了を待ち、実行待ちのジョブは破棄 ---
+            with self.lock:
+                self.queued.clear()
+            while True:
+                try:
+                    self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+            self.jobs.put(None)
+            worker.join()
+
+    def stop(self):
+        """
+        デーモンを停止します。実行中のジョブは終了まで待機します。
+        """
+        self.stop_event.set()
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """
+    制御ソケットのリクエストを処理するハンドラー。
+    1行のコマンド (例: "run --force") を受け取り、結果をJSONの1行で返します。
+    """
+
+    def handle(self):
+        daemon = self.server.recsav_daemon
+        words = self.rfile.readline(1024).decode('utf-8', errors='replace').split()
+        command = words[0] if words else ''
+        if command == 'status':
+            response = daemon.get_status()
+        elif command == 'stop':
+            daemon.stop()
+            response = {'stopping': True}
+        elif command in (JOB_RUN, JOB_IMPORT, JOB_RECURRING):
+            account_cd = words[1] if command == JOB_IMPORT and len(words) > 1 else None
+            if account_cd is not None and account_cd not in daemon.account_cds:
+                response = {'error': f'Unknown account: {account_cd}'}
+            else:
+                response = {'queued': daemon.submit(command, account_cd, command == JOB_RUN and '--force' in words)}
+        else:
+            response = {'error': f"Unknown command: {command!r}. Use one of: {', '.join(COMMANDS)}"}
+        self.wfile.write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    """
+    ローカルホストのみで待ち受ける制御ソケット。
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, daemon, port):
+        """
+        Args:
+            daemon (RecsavDaemon): 制御するデーモン
+            port (int): ポート番号
+        """
+        self.recsav_daemon = daemon
+        super().__init__((CONTROL_HOST, port), _ControlHandler)
+
+
+def send_command(config, words):
+    """
+    起動中のデーモンへコマンドを送信します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+        words (list): コマンドと引数
+
+    Returns:
+        dict: デーモンからの応答
+    """
+    with socket.create_connection((CONTROL_HOST, get_control_port(config)), timeout=CONTROL_TIMEOUT) as sock:
+        sock.sendall((' '.join(words) + '\n').encode('utf-8'))
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline().decode('utf-8'))
+
+
+def main(argv=None):
+    """
+    メイン処理
+
+    Returns:
+        int: 終了コード
+    """
+    args = parse_args(argv)
+    config = common.load_config()
+
+    # --- コマンド送信 ---
+    if args.send:
+        try:
+            response = send_command(config, args.send)
+        except OSError as e:
+            print(f'Could not connect to {RUN_NAME}: {e}', file=sys.stderr)
+            return 1
+        print(json.dumps(response, ensure_ascii=False, indent=2))
+        return 1 if 'error' in response else 0
+
+    common.setup_logger(config["LOG"]["path"])
+    logger.info(f'*** {RUN_NAME} START ***')
+    try:
+        common.reset_metrics()
+        daemon = RecsavDaemon(config)
+        server = ControlServer(daemon, get_control_port(config))
+        threading.Thread(target=server.serve_forever, name='control', daemon=True).start()
+        logger.info(f'Control socket listening on {CONTROL_HOST}:{get_control_port(config)}')
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: daemon.stop())
+
+        # --- 接続プールを起動時に作成し、停止まで保持 ---
+        common.get_db_pool(config)
+        try:
+            daemon.serve_forever()
+        finally:
+            server.shutdown()
+            server.server_close()
+        return 0
+
+    except Exception as e:
+        logger.error(f'An unexpected error occurred: {e}')
+        logger.error(traceback.format_exc())
+        return 1
+    finally:
+        common.close_db_pool()
+        logger.info(f'*** {RUN_NAME} END ***')
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+from logzero import logger
+
+# --- 定数 ---
+MANIFEST_FILE = 'run_manifest.json'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_manifest_path(config):
+    """
+    実行マニフェストのパスを返します。マニフェストは [OUTPUT] dir (アカウントごとの出力ディレクトリ) に保存します。
+
+    Args:
+        config (configparser.ConfigParser): 設定オブジェクト
+
+    Returns:
+        str: 実行マニフェストのパス
+    """
+    return os.path.join(config["OUTPUT"]["dir"], MANIFEST_FILE)
+
+
+def file_sha256(file_path):
+    """
+    ファイルの内容のSHA-256を求めます。
+
+    Args:
+        file_path (str): ファイルのパス
+
+    Returns:
+        str: SHA-256の16進文字列
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunManifest:
+    """
+    ステージの完了状況、ダウンロードしたCSVのSHA-256、取込件数を記録する実行マニフェスト。
+    再実行時に完了済みのステージと、内容が変わっていないタブの再取込を省略するために使用します。
+
+    ステージの完了状況とダウンロード結果は実行キー (実行日) ごとに記録し、実行キーが変わるとリセットします。
+    取込結果は最後に正常終了した取込の内容として、実行キーにかかわらず保持します。
+    """
+
+    def __init__(self, path, run_key):
+        """
+        Args:
+            path (str): 実行マニフェストのパス
+            run_key (str): 実行キー (実行日のYYYY-MM-DD)
+        """
+        self.path = path
+        self.run_key = run_key
+        self.stages = {}
+        self.downloads = {}
+        self.imports = {}
+
+    @classmethod
+    def load(cls, config, run_key):
+        """
+        実行マニフェストを読み込みます。ファイルがない場合や読み込めない場合は空のマニフェストを返します。
+
+        Args:
+            config (configparser.ConfigParser): 設定オブジェクト
+            run_key (str): 実行キー (実行日のYYYY-MM-DD)
+
+        Returns:
+            RunManifest: 実行マニフェスト
+        """
+        manifest = cls(get_manifest_path(config), run_key)
+        if not os.path.exists(manifest.path):
+            return manifest
+        try:
+            with open(manifest.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read run manifest {manifest.path}, starting fresh: {e}")
+            return manifest
+
+        manifest.imports = data.get('imports', {})
+        if data.get('run_key') == run_key:
+            manifest.stages = data.get('stages', {})
+            manifest.downloads = data.get('downloads', {})
+        return manifest
+
+    def save(self):
+        """
+        実行マニフェストを保存します。書き込み途中で中断しても壊れないよう、一時ファイルから置き換えます。
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        data = {
+            'run_key': self.run_key,
+            'stages': self.stages,
+            'downloads': self.downloads,
+            'imports': self.imports,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_completed(self, stage_no):
+        """
+        Args:
+            stage_no (str): ステージ番号
+
+        Returns:
+            bool: 同じ実行キーでステージが正常終了している場合はTrue
+        """
+        return stage_no in self.stages
+
+    def complete_stage(self, stage_no, later_stage_nos=()):
+        """
+        ステージの完了を記録します。ステージを再実行した場合、後続のステージの結果は古くなるため完了を取り消します。
+
+        Args:
+            stage_no (str): ステージ番号
+            later_stage_nos (iterable, optional): 完了を取り消す後続のステージ番号
+        """
+        self.stages[stage_no] = {'completed_at': datetime.now().isoformat(timespec='seconds')}
+        for later_stage_no in later_stage_nos:
+            self.stages.pop(later_stage_no, None)
+
+    def record_downloads(self, csv_file_paths):
+        """
+        ダウンロードしたCSVのSHA-256とサイズを記録します。
+
+        Args:
+            csv_file_paths (dict): タブ番号をキー、CSVファイルのパスを値とする辞書 (存在しないファイルは記録しません)
+        """
+        self.downloads = {
+            str(tab_no): {'sha256': file_sha256(path), 'size': os.path.getsize(path)}
+            for tab_no, path in csv_file_paths.items() if os.path.exists(path)
+        }
+
+    def get_import(self, tab_no):
+        """
+        Args:
+            tab_no (int): タブ番号
+
+        Returns:
+            dict or None: 最後に正常終了した取込の sha256・rows。記録がない場合はNone
+        """
+        return self.imports.get(str(tab_no))
+
+    def record_import(self, tab_no, sha256, rows):
+        """
+        タブの取込結果を記録します。取込のトランザクションをコミットしてから保存してください。
+
+        Args:
+            tab_no (int): タブ番号
+            sha256 (str): 取り込んだCSVのSHA-256
+            rows (int): 登録した行数
+        """
+        self.imports[str(tab_no)] = {
+            'sha256': sha256,
+            'rows': rows,
+            'imported_at': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    def clear_imports(self):
+        """
+        取込結果の記録を削除します。取込先のテーブルを実行ごとに作り直す場合など、次回の取込を省略できない場合に使用します。
+        """
+        self.imports = {}
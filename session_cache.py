@@ -0,0 +1,112 @@
+import os
+import json
+import base64
+import hashlib
+import requests
+from cryptography.fernet import Fernet, InvalidToken
+from logzero import logger
+
+# --- 定数 ---
+SALT_SIZE = 16
+KDF_ITERATIONS = 200000
+PROBE_TIMEOUT = 5
+
+
+def _derive_key(secret, salt):
+    """
+    パスフレーズと salt から Fernet の暗号鍵を導出します。
+
+    Args:
+        secret (str): パスフレーズ
+        salt (bytes): salt
+
+    Returns:
+        bytes: Fernet の暗号鍵
+    """
+    key = hashlib.pbkdf2_hmac('sha256', secret.encode('utf-8'), salt, KDF_ITERATIONS)
+    return base64.urlsafe_b64encode(key)
+
+
+def save_session(path, secret, cookies, user_agent=None):
+    """
+    ログイン済みセッションのCookieを暗号化してファイルに保存します。
+
+    Args:
+        path (str): 保存先ファイルのパス
+        secret (str): 暗号化に使用するパスフレーズ
+        cookies (list): WebDriverのget_cookiesで取得したCookieのリスト
+        user_agent (str, optional): ログインに使用したブラウザのUser-Agent
+    """
+    salt = os.urandom(SALT_SIZE)
+    payload = json.dumps({'cookies': cookies, 'user_agent': user_agent}).encode('utf-8')
+    token = Fernet(_derive_key(secret, salt)).encrypt(payload)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(salt + token)
+    os.replace(tmp_path, path)
+    logger.info(f'Login session saved to: {path}')
+
+
+def load_session(path, secret):
+    """
+    保存済みのセッションを読み込み、復号します。
+
+    Args:
+        path (str): 保存先ファイルのパス
+        secret (str): 暗号化に使用したパスフレーズ
+
+    Returns:
+        tuple or None: (Cookieのリスト, User-Agent)。保存されていない、または復号できない場合はNone
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        payload = Fernet(_derive_key(secret, data[:SALT_SIZE])).decrypt(data[SALT_SIZE:])
+    except (InvalidToken, ValueError):
+        logger.warning(f'Could not decrypt saved login session: {path}')
+        return None
+
+    session = json.loads(payload)
+    return session['cookies'], session.get('user_agent')
+
+
+def clear_session(path):
+    """
+    保存済みのセッションを削除します。
+
+    Args:
+        path (str): 保存先ファイルのパス
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def is_session_valid(cookies, probe_url, user_agent=None):
+    """
+    Cookieでログイン後のページにアクセスし、セッションが有効かを確認します。
+    ログインページへリダイレクトされた場合は無効と判定します。
+
+    Args:
+        cookies (list): Cookieのリスト
+        probe_url (str): ログイン後にのみ表示できるページのURL
+        user_agent (str, optional): リクエストに使用するUser-Agent
+
+    Returns:
+        bool: セッションが有効な場合はTrue
+    """
+    headers = {'User-Agent': user_agent} if user_agent else {}
+    jar = requests.cookies.RequestsCookieJar()
+    for cookie in cookies:
+        jar.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+
+    try:
+        response = requests.get(probe_url, cookies=jar, headers=headers, allow_redirects=False, timeout=PROBE_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f'Could not probe saved login session: {e}')
+        return False
+    return response.status_code == 200
@@ -0,0 +1,200 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from logzero import logger
+import common
+
+# --- 定数 ---
+CSV_BUTTON_SELECTOR = ".stmt-c-btn-dl.stmt-csv-btn"
+REQUEST_TIMEOUT = (10, 60)  # (接続, 読み込み) タイムアウト秒
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5
+CHUNK_SIZE = 64 * 1024
+CSV_CONTENT_TYPES = ('text/csv', 'application/octet-stream', 'application/vnd.ms-excel')
+
+
+def create_http_session(cookies, user_agent=None, pool_size=4):
+    """
+    ブラウザのログイン済みセッションのCookieを引き継いだHTTPセッションを生成します。
+
+    Args:
+        cookies (list): WebDriverのget_cookiesで取得したCookieのリスト
+        user_agent (str, optional): ブラウザのUser-Agent
+        pool_size (int, optional): 接続プールの最大接続数
+
+    Returns:
+        requests.Session: 生成したHTTPセッション
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST']),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    if user_agent:
+        session.headers['User-Agent'] = user_agent
+    for cookie in cookies:
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+    return session
+
+
+def get_field_values(field):
+    """
+    ブラウザがフォームを送信する場合と同様に、フォームの入力項目の送信値を求めます。
+
+    Args:
+        field (bs4.element.Tag): input・select・textarea要素
+
+    Returns:
+        list: 送信値のリスト (送信しない項目の場合は空のリスト)
+    """
+    if field.name == 'textarea':
+        return [field.get_text()]
+
+    if field.name == 'select':
+        options = field.find_all('option')
+        selected = [option for option in options if option.has_attr('selected') and not option.has_attr('disabled')]
+        if not field.has_attr('multiple'):
+            # 単一選択では最後に選択された項目、選択がない場合は先頭の項目を送信する
+            selected = selected[-1:] or options[:1]
+        return [option.get('value', option.get_text(strip=True)) for option in selected]
+
+    field_type = (field.get('type') or 'text').lower()
+    if field_type in ('submit', 'button', 'image', 'reset', 'file'):
+        return []
+    if field_type in ('checkbox', 'radio'):
+        return [field.get('value', 'on')] if field.has_attr('checked') else []
+    return [field.get('value', '')]
+
+
+def build_download_request(page_url, html):
+    """
+    明細ページのHTMLからCSVダウンロードのリクエスト内容を組み立てます。
+    ボタンがリンクの場合はそのURLへのGET、フォームの送信ボタンの場合はフォームのPOSTとします。
+
+    Args:
+        page_url (str): 明細ページのURL
+        html (str): 明細ページのHTML
+
+    Returns:
+        tuple or None: (メソッド, URL, 送信データ ((名前, 値) のリスト))。ボタンが見つからない場合はNone
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    button = soup.select_one(CSV_BUTTON_SELECTOR)
+    if button is None:
+        return None
+
+    href = button.get('href')
+    if href and not href.startswith(('#', 'javascript:')):
+        return 'GET', urljoin(page_url, href), None
+
+    form = button.find_parent('form')
+    if form is None:
+        return None
+
+    data = []
+    for field in form.find_all(['input', 'select', 'textarea']):
+        name = field.get('name')
+        if not name or field.has_attr('disabled'):
+            continue
+        data.extend((name, value) for value in get_field_values(field))
+
+    # 押下したボタンを送信データに含める (JSFのcommandLinkはidを名前・値として送信する)
+    button_name = button.get('name') or button.get('id')
+    if button_name:
+        data.append((button_name, button.get('value') or button_name))
+
+    return 'POST', urljoin(page_url, form.get('action') or page_url), data
+
+
+def fetch_statement_csv(session, statement_url, output_dir, file_prefix, tab_no):
+    """
+    指定されたタブの明細CSVをHTTPで取得し、ストリーミングでファイルに保存します。
+
+    Args:
+        session (requests.Session): ログイン済みのHTTPセッション
+        statement_url (str): 明細ページのURL ({tab_no} をタブ番号に置換します)
+        output_dir (str): 出力ディレクトリ
+        file_prefix (str): ファイル名の接頭辞
+        tab_no (int): タブ番号
+
+    Returns:
+        str or None: 保存したファイルのパス。取得できなかった場合はNone
+    """
+    page_url = statement_url.format(tab_no=tab_no)
+    logger.info(f'Fetching statement page for tabNo={tab_no}')
+    with common.timer('download', tab_no=tab_no):
+        output_file = _fetch_statement_csv(session, page_url, output_dir, file_prefix, tab_no)
+    common.increment('downloaded_files' if output_file else 'download_failures', tab_no=tab_no)
+    return output_file
+
+
+def _fetch_statement_csv(session, page_url, output_dir, file_prefix, tab_no):
+    response = session.get(page_url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+
+    download_request = build_download_request(response.url, response.text)
+    if download_request is None:
+        logger.warning(f"Could not find CSV download button for tabNo={tab_no}.")
+        return None
+
+    method, url, data = download_request
+    output_file = os.path.join(output_dir, f"{file_prefix}_tab{tab_no}.csv")
+    part_file = f"{output_file}.part"
+    with session.request(method, url, data=data, timeout=REQUEST_TIMEOUT, stream=True) as download:
+        download.raise_for_status()
+        content_type = download.headers.get('Content-Type', '')
+        if not content_type.startswith(CSV_CONTENT_TYPES) and 'attachment' not in download.headers.get('Content-Disposition', ''):
+            logger.warning(f"Unexpected response for tabNo={tab_no} (Content-Type: {content_type}). The session may have expired.")
+            return None
+
+        with open(part_file, 'wb') as f:
+            for chunk in download.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+
+    os.replace(part_file, output_file)
+    logger.info(f'Successfully downloaded to: {output_file}')
+    return output_file
+
+
+def fetch_statement_csvs(session, statement_url, output_dir, file_prefix, tab_nos, on_downloaded=None):
+    """
+    各タブの明細CSVをHTTPで並行して取得します。
+
+    Args:
+        session (requests.Session): ログイン済みのHTTPセッション
+        statement_url (str): 明細ページのURL ({tab_no} をタブ番号に置換します)
+        output_dir (str): 出力ディレクトリ
+        file_prefix (str): ファイル名の接頭辞
+        tab_nos (list): 取得対象のタブ番号のリスト
+        on_downloaded (callable, optional): 取得が完了したタブから順に (タブ番号, ファイルのパス) で呼び出す関数
+
+    Returns:
+        dict: タブ番号をキー、保存したファイルのパス (取得できなかった場合はNone) を値とする辞書
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(len(tab_nos), 1)) as executor:
+        futures = {
+            executor.submit(fetch_statement_csv, session, statement_url, output_dir, file_prefix, tab_no): tab_no
+            for tab_no in tab_nos
+        }
+        for future in as_completed(futures):
+            tab_no = futures[future]
+            try:
+                results[tab_no] = future.result()
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Could not download CSV file for tabNo={tab_no}: {e}")
+                common.increment('download_failures', tab_no=tab_no)
+                results[tab_no] = None
+            if on_downloaded and results[tab_no]:
+                on_downloaded(tab_no, results[tab_no])
+    return {tab_no: results[tab_no] for tab_no in tab_nos}
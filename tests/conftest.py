@@ -0,0 +1,74 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+import pytest
+
+# リポジトリ直下のモジュール (common.py など) を読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FixtureServer:
+    """
+    テスト用のローカルHTTPサーバー。e-NAVIやWebDriverのバージョン情報エンドポイントの代わりに使用します。
+
+    routes に (メソッド, パス) をキー、応答を返す関数を値として登録します。
+    関数は受け取ったリクエストの辞書を引数に呼び出され、(ステータス, ヘッダーの辞書, 本文のbytes) を返します。
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8') if length else ''
+                request = {
+                    'method': method,
+                    'path': self.path,
+                    'headers': dict(self.headers),
+                    'form': parse_qsl(body, keep_blank_values=True),
+                }
+                server.requests.append(request)
+                route = server.routes.get((method, self.path))
+                status, headers, content = route(request) if route else (404, {}, b'not found')
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._httpd.server_address[1]}'
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def count(self, method, path):
+        return sum(1 for request in self.requests if request['method'] == method and request['path'] == path)
+
+
+@pytest.fixture
+def fixture_server():
+    server = FixtureServer()
+    server.start()
+    yield server
+    server.stop()
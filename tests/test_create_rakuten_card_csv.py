@@ -0,0 +1,63 @@
+import os
+import threading
+import importlib
+
+create_csv = importlib.import_module('10createRakutenCardCsv')
+
+
+class FakeDriver:
+    """
+    ダウンロード先がウィンドウ単位ではなく、ブラウザのセッション全体に適用されるChromeの動作を再現するドライバー。
+    CSVボタンのクリック後、少し遅れてその時点のダウンロード先にファイルを作成します。
+    """
+
+    def __init__(self, start_delay):
+        self.start_delay = start_delay
+        self.download_path = None
+        self.window_handles = ['main']
+        self.current_window_handle = 'main'
+        self.threads = []
+        self.switch_to = self
+
+    def execute_script(self, script, url):
+        self.window_handles.append(url)
+
+    def window(self, handle):
+        self.current_window_handle = handle
+
+    def close(self):
+        pass
+
+    def execute_cdp_cmd(self, command, params):
+        assert command == 'Page.setDownloadBehavior'
+        self.download_path = params['downloadPath']
+
+    def click(self, tab_no):
+        def download():
+            # ダウンロードの開始時点のダウンロード先に保存される
+            download_path = self.download_path
+            partial = os.path.join(download_path, 'enavi.csv.crdownload')
+            with open(partial, 'w', encoding='utf-8') as f:
+                f.write(f'tab{tab_no}')
+            os.replace(partial, os.path.join(download_path, 'enavi.csv'))
+
+        thread = threading.Timer(self.start_delay, download)
+        thread.start()
+        self.threads.append(thread)
+
+
+def test_download_tabs_concurrently_keeps_each_file_in_its_tab(tmp_path, monkeypatch):
+    driver = FakeDriver(start_delay=0.3)
+    monkeypatch.setattr(create_csv, 'click_csv_download', lambda wait, tab_no: driver.click(tab_no))
+    downloaded = {}
+
+    create_csv.download_tabs_concurrently(
+        driver, None, str(tmp_path), 'rakuten_card', [0, 1, 2], statement_url='https://example.com/?tabNo={tab_no}',
+        on_downloaded=lambda tab_no, path: downloaded.update({tab_no: path}))
+    for thread in driver.threads:
+        thread.join()
+
+    assert sorted(downloaded) == [0, 1, 2]
+    for tab_no in (0, 1, 2):
+        assert (tmp_path / f'rakuten_card_tab{tab_no}.csv').read_text(encoding='utf-8') == f'tab{tab_no}'
+    assert driver.current_window_handle == 'main'
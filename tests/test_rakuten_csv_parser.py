@@ -0,0 +1,16 @@
+from datetime import date
+from rakuten_csv_parser import RakutenCardCsvParser
+
+
+def test_empty_text_columns_stay_empty_strings(tmp_path):
+    csv_file = tmp_path / 'rakuten_card_tab0.csv'
+    csv_file.write_text(
+        '利用日,利用店名・商品名,利用者,支払方法,利用金額,支払手数料,支払総額,支払月\n'
+        '2024/01/05,,,1回払い,100,0,100,\n',
+        encoding='utf-8')
+
+    with RakutenCardCsvParser(str(csv_file), 0) as parser:
+        records = [record.as_tuple() for record in parser.records()]
+
+    # 利用店名・利用者は空文字、支払月 (NULLIF) とCSVにない列はNULL
+    assert records == [(date(2024, 1, 5), '', '', '1回払い', 100, 0, 100, None, None, None, None)]
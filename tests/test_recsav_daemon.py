@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+import configparser
+import pytest
+import recsav_daemon
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    config = configparser.ConfigParser()
+    config.read_dict({
+        'RAKUTEN': {'csv_file_nm_prefix': 'rakuten_card'},
+        'OUTPUT': {'dir': str(tmp_path)},
+        'LOG': {'path': str(tmp_path / 'log' / 'app.log')},
+        'DAEMON': {'watch_interval': '0.05', 'run_time': '', 'recurring_time': ''},
+    })
+    return recsav_daemon.RecsavDaemon(config)
+
+
+def _write_csv(path, content):
+    # 更新日時の分解能が粗い環境でも変更を検知できるよう、呼び出し側で内容の長さを変える
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.utime(path, None)
+
+
+def _run_until(daemon, predicate, timeout=5):
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    try:
+        deadline = time.monotonic() + timeout
+        while not predicate() and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        daemon.stop()
+        thread.join()
+
+
+def test_csv_written_during_import_job_is_imported_afterwards(daemon, tmp_path):
+    csv_path = tmp_path / 'rakuten_card_tab0.csv'
+    jobs = []
+
+    def run_job(job):
+        jobs.append(job)
+        if len(jobs) == 1:
+            # 取込中に次の明細CSVが出力される
+            _write_csv(csv_path, 'second download, longer content')
+        return True
+
+    daemon.run_job = run_job
+    _write_csv(csv_path, 'first')
+    _run_until(daemon, lambda: len(jobs) >= 2)
+
+    assert jobs == [('import', 'default', False), ('import', 'default', False)]
+
+
+def _stub_run_batch(monkeypatch, csv_path, result):
+    calls = []
+
+    def run_batch(config, stage_nos, account_cds, execution_date, force=False, in_process=False):
+        calls.append(account_cds)
+        _write_csv(csv_path, 'downloaded by stage 10')
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(recsav_daemon.recsav_batch, 'run_batch', run_batch)
+    return calls
+
+
+def test_csv_downloaded_by_run_job_is_not_imported_again(daemon, tmp_path, monkeypatch):
+    calls = _stub_run_batch(monkeypatch, tmp_path / 'rakuten_card_tab0.csv', (True, {'default'}))
+
+    assert daemon.run_job(('run', None, False)) is True
+    assert calls == [['default']]
+    assert daemon.watcher.scan() == []
+    assert daemon.watcher.scan() == []
+
+
+@pytest.mark.parametrize('result', [(False, set()), RuntimeError('stage 11 failed')])
+def test_csv_of_failed_run_job_is_imported_by_next_scan(daemon, tmp_path, monkeypatch, result):
+    _stub_run_batch(monkeypatch, tmp_path / 'rakuten_card_tab0.csv', result)
+
+    if isinstance(result, Exception):
+        with pytest.raises(RuntimeError):
+            daemon.run_job(('run', None, False))
+    else:
+        assert daemon.run_job(('run', None, False)) is False
+
+    # 書き込みの完了を確認するため、2回目の監視で検知される
+    assert daemon.watcher.scan() == []
+    assert daemon.watcher.scan() == ['default']
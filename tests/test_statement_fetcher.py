@@ -0,0 +1,141 @@
+import statement_fetcher
+
+CSV_CONTENT = '利用日,利用店名・商品名,利用金額\n2024/01/05,テスト商店,1200\n'.encode('utf-8')
+CSV_HEADERS = {'Content-Type': 'text/csv; charset=utf-8'}
+STATEMENT_PATH = '/e-navi/members/statement/index.xhtml?tabNo={tab_no}'
+
+LINK_PAGE = """
+<html><body>
+  <a class="stmt-c-btn-dl stmt-csv-btn" href="/e-navi/members/statement/csv?tabNo={tab_no}">CSV</a>
+</body></html>
+"""
+
+FORM_PAGE = """
+<html><body>
+  <form id="statementForm" action="/e-navi/members/statement/download.xhtml" method="post">
+    <input type="hidden" name="javax.faces.ViewState" value="state-{tab_no}">
+    <input type="text" name="keyword" value="">
+    <input type="text" name="disabled_field" value="x" disabled>
+    <select name="month">
+      <option value="202312">2023/12</option>
+      <option value="202401" selected>2024/01</option>
+    </select>
+    <select name="cards" multiple>
+      <option value="a" selected>A</option>
+      <option value="b">B</option>
+      <option value="c" selected>C</option>
+    </select>
+    <input type="checkbox" name="detail" value="1" checked>
+    <input type="checkbox" name="unchecked" value="1">
+    <input type="radio" name="format" value="csv" checked>
+    <input type="radio" name="format" value="pdf">
+    <textarea name="memo">note</textarea>
+    <input type="submit" name="other" value="Other">
+    <a class="stmt-c-btn-dl stmt-csv-btn" id="statementForm:csvButton" href="#">CSV</a>
+  </form>
+</body></html>
+"""
+
+
+def test_build_download_request_serializes_form_like_a_browser():
+    method, url, data = statement_fetcher.build_download_request(
+        'https://example.com/e-navi/members/statement/index.xhtml', FORM_PAGE.format(tab_no=0))
+
+    assert method == 'POST'
+    assert url == 'https://example.com/e-navi/members/statement/download.xhtml'
+    assert data == [
+        ('javax.faces.ViewState', 'state-0'),
+        ('keyword', ''),
+        ('month', '202401'),
+        ('cards', 'a'),
+        ('cards', 'c'),
+        ('detail', '1'),
+        ('format', 'csv'),
+        ('memo', 'note'),
+        ('statementForm:csvButton', 'statementForm:csvButton'),
+    ]
+
+
+def test_build_download_request_uses_first_option_when_nothing_selected():
+    html = """
+    <form action="/download">
+      <select name="month"><option value="202312">2023/12</option><option value="202401">2024/01</option></select>
+      <button class="stmt-c-btn-dl stmt-csv-btn" name="csv" value="go">CSV</button>
+    </form>
+    """
+    _, _, data = statement_fetcher.build_download_request('https://example.com/page', html)
+
+    assert data == [('month', '202312'), ('csv', 'go')]
+
+
+def _page(html):
+    return lambda request: (200, {'Content-Type': 'text/html; charset=utf-8'}, html.encode('utf-8'))
+
+
+def _csv(request):
+    return 200, CSV_HEADERS, CSV_CONTENT
+
+
+def test_fetch_statement_csv_follows_link(fixture_server, tmp_path):
+    fixture_server.routes[('GET', STATEMENT_PATH.format(tab_no=0))] = _page(LINK_PAGE.format(tab_no=0))
+    fixture_server.routes[('GET', '/e-navi/members/statement/csv?tabNo=0')] = _csv
+    session = statement_fetcher.create_http_session([{'name': 'JSESSIONID', 'value': 'abc'}])
+
+    output_file = statement_fetcher.fetch_statement_csv(
+        session, fixture_server.url + STATEMENT_PATH, str(tmp_path), 'rakuten_card', 0)
+
+    assert output_file == str(tmp_path / 'rakuten_card_tab0.csv')
+    assert (tmp_path / 'rakuten_card_tab0.csv').read_bytes() == CSV_CONTENT
+    assert not (tmp_path / 'rakuten_card_tab0.csv.part').exists()
+    assert 'JSESSIONID=abc' in fixture_server.requests[-1]['headers'].get('Cookie', '')
+
+
+def test_fetch_statement_csvs_posts_form(fixture_server, tmp_path):
+    downloaded = []
+    for tab_no in (0, 1):
+        fixture_server.routes[('GET', STATEMENT_PATH.format(tab_no=tab_no))] = _page(FORM_PAGE.format(tab_no=tab_no))
+    fixture_server.routes[('POST', '/e-navi/members/statement/download.xhtml')] = _csv
+    session = statement_fetcher.create_http_session([])
+
+    results = statement_fetcher.fetch_statement_csvs(
+        session, fixture_server.url + STATEMENT_PATH, str(tmp_path), 'rakuten_card', [0, 1],
+        on_downloaded=lambda tab_no, path: downloaded.append(tab_no))
+
+    assert results == {tab_no: str(tmp_path / f'rakuten_card_tab{tab_no}.csv') for tab_no in (0, 1)}
+    assert sorted(downloaded) == [0, 1]
+    posts = [request for request in fixture_server.requests if request['method'] == 'POST']
+    assert sorted(dict(request['form'])['javax.faces.ViewState'] for request in posts) == ['state-0', 'state-1']
+    assert all(('cards', 'c') in request['form'] and ('detail', '1') in request['form'] for request in posts)
+
+
+def test_fetch_statement_csv_retries_server_errors(fixture_server, tmp_path):
+    attempts = []
+
+    def flaky_csv(request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            return 503, {}, b'unavailable'
+        return _csv(request)
+
+    fixture_server.routes[('GET', STATEMENT_PATH.format(tab_no=2))] = _page(FORM_PAGE.format(tab_no=2))
+    fixture_server.routes[('POST', '/e-navi/members/statement/download.xhtml')] = flaky_csv
+    session = statement_fetcher.create_http_session([])
+
+    output_file = statement_fetcher.fetch_statement_csv(
+        session, fixture_server.url + STATEMENT_PATH, str(tmp_path), 'rakuten_card', 2)
+
+    assert output_file == str(tmp_path / 'rakuten_card_tab2.csv')
+    assert len(attempts) == 3
+    assert (tmp_path / 'rakuten_card_tab2.csv').read_bytes() == CSV_CONTENT
+
+
+def test_fetch_statement_csv_rejects_html_response(fixture_server, tmp_path):
+    fixture_server.routes[('GET', STATEMENT_PATH.format(tab_no=0))] = _page(LINK_PAGE.format(tab_no=0))
+    fixture_server.routes[('GET', '/e-navi/members/statement/csv?tabNo=0')] = _page('<html>login</html>')
+    session = statement_fetcher.create_http_session([])
+
+    output_file = statement_fetcher.fetch_statement_csv(
+        session, fixture_server.url + STATEMENT_PATH, str(tmp_path), 'rakuten_card', 0)
+
+    assert output_file is None
+    assert not (tmp_path / 'rakuten_card_tab0.csv').exists()
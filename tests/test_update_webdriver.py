@@ -0,0 +1,126 @@
+import io
+import json
+import zipfile
+import importlib
+import pytest
+
+update_webdriver = importlib.import_module('00updateWebDriver')
+
+VERSIONS_PATH = '/last-known-good-versions-with-downloads.json'
+ZIP_PATH = '/120.0.6099.109/win32/chromedriver-win32.zip'
+
+
+def _versions_json(server_url, version='120.0.6099.109'):
+    return json.dumps({
+        'channels': {
+            'Stable': {
+                'version': version,
+                'downloads': {
+                    'chromedriver': [
+                        {'platform': 'linux64', 'url': f'{server_url}/linux64.zip'},
+                        {'platform': 'win32', 'url': f'{server_url}{ZIP_PATH}'},
+                    ],
+                },
+            },
+        },
+    }).encode('utf-8')
+
+
+def _driver_zip(content):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as obj_zip:
+        obj_zip.writestr(update_webdriver.EXTRACT_DRIVER_PATH, content)
+    return buffer.getvalue()
+
+
+def test_get_latest_webdriver_version_reads_json_endpoint(fixture_server):
+    fixture_server.routes[('GET', VERSIONS_PATH)] = lambda request: (
+        200, {'Content-Type': 'application/json'}, _versions_json(fixture_server.url))
+
+    resolved = update_webdriver.get_latest_webdriver_version(fixture_server.url + VERSIONS_PATH, '120.0.6099.71')
+
+    assert resolved == ('120.0.6099.109', fixture_server.url + ZIP_PATH)
+
+
+def test_get_latest_webdriver_version_uses_chrome_version_on_major_mismatch(fixture_server):
+    fixture_server.routes[('GET', VERSIONS_PATH)] = lambda request: (
+        200, {'Content-Type': 'application/json'}, _versions_json(fixture_server.url))
+
+    resolved = update_webdriver.get_latest_webdriver_version(fixture_server.url + VERSIONS_PATH, '119.0.6045.105')
+
+    assert resolved == ('119.0.6045.105', None)
+
+
+def test_get_latest_webdriver_version_handles_unexpected_format(fixture_server):
+    fixture_server.routes[('GET', VERSIONS_PATH)] = lambda request: (
+        200, {'Content-Type': 'application/json'}, b'{"channels": {}}')
+
+    assert update_webdriver.get_latest_webdriver_version(fixture_server.url + VERSIONS_PATH) is None
+
+
+def test_download_webdriver_replaces_driver(fixture_server, tmp_path):
+    fixture_server.routes[('GET', ZIP_PATH)] = lambda request: (
+        200, {'Content-Type': 'application/zip'}, _driver_zip(b'new driver'))
+    driver_path = tmp_path / 'chromedriver.exe'
+    driver_path.write_bytes(b'old driver')
+
+    downloaded = update_webdriver.download_webdriver(
+        '120.0.6099.109', fixture_server.url, chromedriver_path=str(driver_path))
+
+    assert downloaded is True
+    assert driver_path.read_bytes() == b'new driver'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['chromedriver.exe']
+
+
+def test_download_webdriver_keeps_driver_on_failure(fixture_server, tmp_path):
+    driver_path = tmp_path / 'chromedriver.exe'
+    driver_path.write_bytes(b'old driver')
+
+    downloaded = update_webdriver.download_webdriver(
+        '120.0.6099.109', fixture_server.url, chromedriver_path=str(driver_path))
+
+    assert downloaded is False
+    assert driver_path.read_bytes() == b'old driver'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['chromedriver.exe']
+
+
+@pytest.fixture
+def webdriver_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(update_webdriver.sys, 'platform', 'linux')
+    (tmp_path / update_webdriver.CHROMEDRIVER_PATH).write_bytes(b'driver')
+    chrome = tmp_path / 'google-chrome'
+    chrome.write_bytes(b'chrome')
+    monkeypatch.setattr(update_webdriver, 'find_chrome_binary', lambda: str(chrome))
+    return tmp_path
+
+
+def test_run_skips_version_checks_when_binaries_are_unchanged(webdriver_dir, monkeypatch):
+    config = {'WEBDRIVER': {'webdriver_base_url': 'http://127.0.0.1:9', 'latest_version_url': 'http://127.0.0.1:9'}}
+    calls = []
+    monkeypatch.setattr(update_webdriver, 'get_chrome_version', lambda: calls.append('chrome') or '120.0.6099.71')
+    monkeypatch.setattr(update_webdriver, 'get_chromedriver_version',
+                        lambda *args: calls.append('driver') or '120.0.6099.109')
+
+    update_webdriver.run(config)
+    assert calls == ['chrome', 'driver']
+
+    # --- バイナリが変わっていなければ、バージョンを取得しない ---
+    update_webdriver.run(config)
+    assert calls == ['chrome', 'driver']
+
+    # --- WebDriverが置き換えられた場合は、再度バージョンを確認する ---
+    (webdriver_dir / update_webdriver.CHROMEDRIVER_PATH).write_bytes(b'replaced driver')
+    update_webdriver.run(config)
+    assert calls == ['chrome', 'driver', 'chrome', 'driver']
+
+
+def test_run_raises_when_update_fails(webdriver_dir, monkeypatch):
+    config = {'WEBDRIVER': {'webdriver_base_url': 'http://127.0.0.1:9', 'latest_version_url': 'http://127.0.0.1:9'}}
+    monkeypatch.setattr(update_webdriver, 'get_chrome_version', lambda: '121.0.6167.85')
+    monkeypatch.setattr(update_webdriver, 'get_chromedriver_version', lambda *args: '120.0.6099.109')
+    monkeypatch.setattr(update_webdriver, 'update_and_relaunch_webdriver', lambda *args: False)
+
+    with pytest.raises(RuntimeError):
+        update_webdriver.run(config)
+    assert not (webdriver_dir / update_webdriver.VERSION_CACHE_PATH).exists()